@@ -5,7 +5,9 @@ from condoor.config import CONF
 from condoor.patterns import YPatternManager as PatternManager
 
 from condoor.exceptions import CommandTimeoutError, ConnectionError, ConnectionTimeoutError, CommandError, \
-    CommandSyntaxError, ConnectionAuthenticationError, GeneralError, InvalidHopInfoError
+    CommandSyntaxError, ConnectionAuthenticationError, GeneralError, InvalidHopInfoError, CircuitOpenError, \
+    CancelledError
+from condoor.scheduler import PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK
 from version import __version__
 
 from pexpect import TIMEOUT, EOF
@@ -20,4 +22,5 @@ This is a python module providing access to Cisco devices over Telnet and SSH.
 
 __all__ = ('Connection', 'TIMEOUT', 'EOF', 'pattern_manager', 'CONF', 'InvalidHopInfoError',
            'CommandTimeoutError', 'ConnectionError', 'ConnectionTimeoutError', 'CommandError',
-           'CommandSyntaxError', 'ConnectionAuthenticationError', 'GeneralError', '__version__')
+           'CommandSyntaxError', 'ConnectionAuthenticationError', 'GeneralError', 'CircuitOpenError', 'CancelledError',
+           '__version__', 'PRIORITY_INTERACTIVE', 'PRIORITY_NORMAL', 'PRIORITY_BULK')
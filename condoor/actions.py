@@ -1,8 +1,11 @@
 """Provides predefined actions for Finite State Machines."""
+import re
 import logging
 from condoor.fsm import action
 from condoor.exceptions import ConnectionAuthenticationError, ConnectionError, ConnectionTimeoutError
 
+logger = logging.getLogger(__name__)
+
 
 @action
 def a_send_line(text, ctx):
@@ -132,9 +135,7 @@ def a_connection_timeout(ctx):
 def a_expected_prompt(ctx):
     """Update driver, config mode and hostname when received an expected prompt."""
     prompt = ctx.ctrl.after
-    ctx.device.update_driver(prompt)
-    ctx.device.update_config_mode()
-    ctx.device.update_hostname()
+    ctx.device.update_prompt(prompt)
     ctx.finished = True
     return True
 
@@ -184,6 +185,27 @@ def a_store_cmd_result(ctx):
     return True
 
 
+@action
+def a_store_frame_result(ctx):
+    """Store the framed command output and exit status.
+
+    The output is the text between the start and end sentinels. The exit status follows the end sentinel.
+    """
+    ctx.device.last_command_result = ctx.ctrl.before
+    match = re.search(r'(\d+)\s*$', ctx.ctrl.after)
+    ctx.device.last_exit_status = int(match.group(1)) if match else None
+    return True
+
+
+@action
+def a_frame_not_supported(ctx):
+    """Disable the command framing if the prompt received before the start sentinel."""
+    logger.warning("Command framing not supported by the shell. Disabled.")
+    ctx.device.driver.framed_commands = False
+    ctx.finished = True
+    return True
+
+
 @action
 def a_message_callback(ctx):
     """Message the captured pattern."""
@@ -0,0 +1,159 @@
+"""Provides the circuit breaker failing fast the connections to the hosts which failed recently."""
+
+import re
+import logging
+from time import time
+
+from condoor.exceptions import ConnectionAuthenticationError, ConnectionTimeoutError, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Connection failure kinds
+FAILURE_TIMEOUT = 'timeout'
+FAILURE_AUTH = 'auth'
+FAILURE_REFUSED = 'refused'
+FAILURE_ERROR = 'error'
+
+_REFUSED_RE = re.compile("[Rr]efused|[Uu]nreachable|[Uu]nable to connect|[Nn]o route to host|[Uu]nknown host|"
+                         "not known|reset by peer|closed by foreign host")
+
+_KEY_PREFIX = "breaker:"
+
+
+def failure_kind(exception):
+    """Return the failure kind for the connection exception."""
+    if isinstance(exception, ConnectionAuthenticationError):
+        return FAILURE_AUTH
+    if isinstance(exception, ConnectionTimeoutError):
+        return FAILURE_TIMEOUT
+    if _REFUSED_RE.search(str(exception)):
+        return FAILURE_REFUSED
+    return FAILURE_ERROR
+
+
+def hop_keys(hops):
+    """Return the list of breaker keys for the hops on the connection path.
+
+    The key of the hop consists of all the hops on the path up to and including the hop, so the host behind
+    the jumphost is distinguished from the same address behind the other jumphost and the jumphost key is
+    shared by all the connections using it.
+
+    Args:
+        hops (list): The list of HopInfo objects of the connection chain.
+    """
+    keys = []
+    path = ""
+    for hop in hops:
+        path += "/{}:{}".format(hop.hostname, hop.port)
+        keys.append(_KEY_PREFIX + path)
+    return keys
+
+
+class CircuitBreaker(object):
+    """The per host circuit breaker with the state stored in the persistent cache.
+
+    The breaker opens after *threshold* consecutive connection failures within the *window* and the connections
+    fail fast with :class:`CircuitOpenError` for the *cooldown* time. After the cooldown the breaker is half-open
+    and the single trial is allowed. The trial success closes the breaker and the trial failure opens it again.
+    The recent failure kinds (``timeout``, ``auth``, ``refused`` or ``error``) are kept in the record.
+    """
+
+    def __init__(self, cache_open, threshold=3, window=3600, cooldown=300, history=10):
+        """Initialize the CircuitBreaker object.
+
+        Args:
+            cache_open (callable): The function called with the *mode* argument returning the open shelve
+                object or *None* if the cache is not available.
+            threshold (int): Number of consecutive failures opening the breaker. If 0 the breaker is disabled.
+            window (int): Time in seconds the failures are counted in.
+            cooldown (int): Time in seconds the breaker stays open.
+            history (int): Number of the recent failures kept in the record.
+        """
+        self._cache_open = cache_open
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.history = history
+
+    def _read(self, key):
+        """Return the breaker record for the key or None."""
+        # the cache file may not exist yet
+        cache = self._cache_open(mode='c')
+        if cache is None:
+            return None
+        try:
+            return cache.get(key, None)
+        finally:
+            cache.close()
+
+    def _update(self, func, keys):
+        """Call the function with the record for every key and store the returned records."""
+        cache = self._cache_open(mode='c')
+        if cache is None:
+            return
+        try:
+            for key in keys:
+                record = func(key, cache.get(key, None))
+                if record is None:
+                    if key in cache:
+                        del cache[key]
+                else:
+                    cache[key] = record
+        finally:
+            cache.close()
+
+    def state(self, key, now=None):
+        """Return the breaker state and the record for the key."""
+        record = self._read(key) if self.threshold else None
+        if record is None or record['opened'] is None:
+            return CLOSED, record
+        if (now or time()) - record['opened'] < self.cooldown:
+            return OPEN, record
+        return HALF_OPEN, record
+
+    def check(self, key):
+        """Check the breaker for the key.
+
+        Returns:
+            The breaker state: ``closed`` or ``half-open``. In the half-open state the caller makes the trial.
+
+        Raises:
+            CircuitOpenError: The breaker is open.
+        """
+        state, record = self.state(key)
+        if state == OPEN:
+            remaining = self.cooldown - (time() - record['opened'])
+            kinds = ", ".join(kind for _, kind in record['failures'])
+            raise CircuitOpenError("Circuit breaker open for {:.0f}s after failures: {}".format(remaining, kinds),
+                                   key[len(_KEY_PREFIX):])
+        return state
+
+    def failure(self, key, kind):
+        """Record the connection failure for the key. Open the breaker if needed."""
+        if not self.threshold:
+            return
+        now = time()
+
+        def update(_, record):
+            if record is None:
+                record = {'failures': [], 'opened': None}
+            half_open = record['opened'] is not None
+            record['failures'] = [failure for failure in record['failures'] if now - failure[0] < self.window]
+            record['failures'].append((now, kind))
+            if half_open or len(record['failures']) >= self.threshold:
+                logger.warning("Circuit breaker opened: {} ({})".format(key[len(_KEY_PREFIX):], kind))
+                record['opened'] = now
+            record['failures'] = record['failures'][-self.history:]
+            return record
+
+        self._update(update, [key])
+
+    def success(self, keys):
+        """Record the connection success and close the breakers for the keys."""
+        if self.threshold:
+            self._update(lambda key, record: None, keys)
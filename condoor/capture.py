@@ -0,0 +1,395 @@
+"""Provides the classes capturing the command output in chunks."""
+
+import re
+import sys
+import mmap
+import tempfile
+import threading
+from Queue import Queue, Full
+
+from pexpect.expect import searcher_re
+
+# Number of characters always kept in the session buffer after the consumed chunk. It allows the patterns
+# to match the text which started before the chunk end but was not fully received yet.
+CHUNK_TAIL_SIZE = 1024
+
+# The sequences erasing the pager prompt sent by the device after the page is answered: the backspaces
+# overwriting the prompt with spaces, the carriage return with spaces or the ANSI erase line sequence.
+_PAGER_ARTIFACTS_RE = re.compile(r'\A(?:[\x08 ]*\x08|\r *\r|\x1b\[K)+')
+
+
+class ChunkSearcher(searcher_re):
+    """The pexpect searcher consuming the complete lines when none of the patterns matches.
+
+    If none of the patterns matches, the search returns *chunk_index* with the zero length match placed after
+    the last complete line which is at least *tail_size* characters before the buffer end. The pexpect moves
+    the text up to this point to the ``before`` attribute and removes it from the session buffer, so the buffer
+    does not grow while receiving the long command output.
+    """
+
+    def __init__(self, patterns, tail_size=CHUNK_TAIL_SIZE):
+        """Initialize the ChunkSearcher object.
+
+        Args:
+            patterns (list): The list of compiled patterns, pexpect.EOF or pexpect.TIMEOUT.
+            tail_size (int): Number of characters kept in the buffer after the chunk.
+        """
+        super(ChunkSearcher, self).__init__(patterns)
+        self.chunk_index = len(patterns)
+        self.tail_size = tail_size
+
+    def search(self, buffer, freshlen, searchwindowsize=None):
+        """Search the patterns and return the pattern index or the chunk index if chunk can be consumed."""
+        index = super(ChunkSearcher, self).search(buffer, freshlen, searchwindowsize)
+        if index >= 0:
+            return index
+
+        end = len(buffer) - self.tail_size
+        if end <= 0:
+            return -1
+        cut = buffer.rfind('\n', 0, end) + 1
+        if cut == 0:
+            return -1
+
+        self.start = self.end = cut
+        self.match = None
+        return self.chunk_index
+
+
+class OutputCapture(object):
+    """Accumulate the session output in chunks with the carriage return characters removed.
+
+    The output is kept in the list of chunks and joined only once when requested, so the memory used is linear
+    with the output size. The capture keeps the output received before the last expected pattern. The new
+    expect call after the pattern match starts the new output segment.
+
+    If the *spill_threshold* is set and the output exceeds it, the output is moved to the temporary file.
+    Only the first line (the command echo) stays in memory.
+    """
+
+    def __init__(self, sink=None, spill_threshold=None):
+        """Initialize the OutputCapture object.
+
+        Args:
+            sink (callable): Optional function called with every chunk of the output. If set the output is passed
+                to the sink as it arrives and it is not stored in the capture object.
+            spill_threshold (int): Optional number of characters after which the output is stored
+                in the temporary file.
+        """
+        self._chunks = []
+        self._complete = False
+        self._sink = sink
+        self._spill_threshold = spill_threshold
+        self._file = None
+        self._head = ''
+        self.size = 0
+        self.pages = 0
+        self._page_start = False
+
+    @property
+    def spilled(self):
+        """Return True if the output is stored in the temporary file."""
+        return self._file is not None
+
+    def begin(self):
+        """Start the new output segment if the previous one is complete."""
+        if self._complete:
+            self._chunks = []
+            self.size = 0
+            self._complete = False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._head = ''
+
+    def write(self, text):
+        """Append the text to the current output segment."""
+        if self._page_start and text:
+            self._page_start = False
+            match = _PAGER_ARTIFACTS_RE.match(text)
+            if match:
+                text = text[match.end():]
+        chunk = text.replace('\r', '')
+        if chunk:
+            self.size += len(chunk)
+            if self._sink is not None:
+                self._sink(chunk)
+            elif self._file is not None:
+                self._file.write(chunk)
+            else:
+                self._chunks.append(chunk)
+                if self._spill_threshold is not None and self.size > self._spill_threshold:
+                    self._spill()
+
+    def _spill(self):
+        """Move the output except the first line to the temporary file."""
+        text = "".join(self._chunks)
+        position = text.find('\n')
+        if position < 0:
+            # wait for the complete first line
+            self._chunks = [text]
+            return
+        self._file = tempfile.TemporaryFile(prefix="condoor.")
+        self._file.write(text[position + 1:])
+        self._head = text[:position + 1]
+        self._chunks = []
+
+    def end(self):
+        """Mark the current output segment as complete."""
+        self._complete = True
+
+    def page(self):
+        """Count the answered pager prompt. The pager artifacts are removed from the following text."""
+        self.pages += 1
+        self._page_start = True
+
+    def text(self):
+        """Return the whole captured output as string."""
+        if self._file is not None:
+            self._file.seek(0)
+            text = self._head + self._file.read()
+            self._file.seek(0, 2)
+            return text
+        return "".join(self._chunks)
+
+    def getvalue(self, skip_first_line=False):
+        """Return the captured output.
+
+        If the output was spilled to the temporary file and the first line is skipped, the
+        :class:`MappedOutput` object is returned and the capture object passes the file ownership to it.
+
+        Args:
+            skip_first_line (bool): If True the text up to and including the first new line character
+                is removed. It is the command echo line.
+
+        Returns:
+            The captured text.
+        """
+        if self._file is not None:
+            if not skip_first_line:
+                return self.text()
+            result = MappedOutput(self._file)
+            self._file = None
+            self._head = ''
+            return result
+
+        chunks = self._chunks
+        if skip_first_line:
+            for index, chunk in enumerate(chunks):
+                position = chunk.find('\n')
+                if position >= 0:
+                    chunks = [chunk[position + 1:]] + chunks[index + 1:]
+                    break
+        return "".join(chunks)
+
+
+class MappedOutput(object):
+    """Command output stored in the temporary file and accessed with mmap.
+
+    The object provides the read only string like access to the output without loading it to the memory.
+    The temporary file is removed when the object is closed or garbage collected.
+
+    Example::
+
+        with conn.send("show bgp ipv4 unicast", spill_threshold=10 * 1024 * 1024) as output:
+            for line in output:
+                process(line)
+    """
+
+    def __init__(self, fileobj):
+        """Initialize the MappedOutput object.
+
+        Args:
+            fileobj (file): The file containing the output.
+        """
+        self._file = None
+        fileobj.flush()
+        fileobj.seek(0, 2)
+        self._size = fileobj.tell()
+        self._mmap = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) if self._size else ''
+        self._file = fileobj
+
+    def __len__(self):
+        """Return the output length."""
+        return self._size
+
+    def __getitem__(self, index):
+        """Return the character or the slice of the output as string."""
+        return self._mmap[index]
+
+    def __iter__(self):
+        """Return the iterator over the output lines."""
+        return self.splitlines()
+
+    def __str__(self):
+        """Return the whole output as string."""
+        return self._mmap[:]
+
+    def __repr__(self):
+        """Return the object representation."""
+        return "<{} size={}>".format(self.__class__.__name__, self._size)
+
+    def __enter__(self):
+        """Return the object for the context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Close the object on the context manager exit."""
+        self.close()
+
+    def __del__(self):
+        """Close the object when garbage collected."""
+        self.close()
+
+    def splitlines(self, keepends=False):
+        """Return the iterator over the output lines.
+
+        Args:
+            keepends (bool): If True the new line characters are included in the lines.
+        """
+        data = self._mmap
+        position = 0
+        while position < self._size:
+            end = data.find('\n', position)
+            if end < 0:
+                yield data[position:]
+                return
+            yield data[position:end + 1 if keepends else end]
+            position = end + 1
+
+    def find(self, sub, start=0, end=None):
+        """Return the lowest index where the substring is found or -1."""
+        if not self._size:
+            return -1
+        return self._mmap.find(sub, start, self._size if end is None else end)
+
+    def search(self, pattern, pos=0, endpos=None):
+        """Scan through the output looking for the regular expression match.
+
+        Args:
+            pattern: The regular expression string or compiled pattern.
+            pos (int): The position where the search starts.
+            endpos (int): The position where the search ends.
+
+        Returns:
+            The match object or None.
+        """
+        return re.compile(pattern).search(self._mmap, pos, self._size if endpos is None else endpos)
+
+    def finditer(self, pattern, pos=0, endpos=None):
+        """Return the iterator over all the regular expression matches in the output."""
+        return re.compile(pattern).finditer(self._mmap, pos, self._size if endpos is None else endpos)
+
+    def close(self):
+        """Release the memory map and remove the temporary file."""
+        if self._file is not None:
+            if self._size:
+                self._mmap.close()
+            self._mmap = ''
+            self._size = 0
+            self._file.close()
+            self._file = None
+
+
+_DATA, _DONE, _ERROR = range(3)
+
+
+class OutputStream(object):
+    """Iterator over the command output received by the function running in the background thread.
+
+    The function is called with the sink argument when the iteration starts. The output chunks passed to the sink
+    are queued and returned by the iterator with the command echo line removed. The queue size is limited,
+    so the function is blocked if the output is not consumed fast enough. If the iterator is closed before
+    the end of the output, the remaining output is discarded and the function continues until completed.
+    The exception raised by the function is raised by the iterator.
+    """
+
+    def __init__(self, func, lines=False, maxsize=64):
+        """Initialize the OutputStream object.
+
+        Args:
+            func (callable): The function called with the sink argument in the background thread.
+            lines (bool): If True the iterator returns the complete lines without the new line character.
+                Otherwise the chunks of text are returned as they arrive.
+            maxsize (int): Maximum number of chunks waiting for the consumer.
+        """
+        self._func = func
+        self._lines = lines
+        self._queue = Queue(maxsize)
+        self._cancelled = threading.Event()
+        self._iterator = self._generate()
+
+    def __iter__(self):
+        """Return the iterator."""
+        return self
+
+    def next(self):
+        """Return the next chunk or line of the output."""
+        return next(self._iterator)
+
+    __next__ = next
+
+    def close(self):
+        """Stop the iteration and discard the rest of the output."""
+        self._iterator.close()
+
+    def _put(self, item):
+        """Put the item in the queue unless iteration is cancelled."""
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def _run(self):
+        """Run the function in the background thread."""
+        try:
+            self._func(lambda chunk: self._put((_DATA, chunk)))
+        except Exception:  # pylint: disable=broad-except
+            self._put((_ERROR, sys.exc_info()[1]))
+        else:
+            self._put((_DONE, None))
+
+    def _generate(self):
+        """Generate the output chunks or lines."""
+        thread = threading.Thread(target=self._run, name="condoor-stream")
+        thread.daemon = True
+        thread.start()
+
+        echo = True
+        partial = ''
+        try:
+            while True:
+                kind, value = self._queue.get()
+                if kind == _DATA:
+                    if echo:
+                        index = value.find('\n')
+                        if index < 0:
+                            continue
+                        value = value[index + 1:]
+                        echo = False
+
+                    if not self._lines:
+                        if value:
+                            yield value
+                        continue
+
+                    value = partial + value
+                    index = value.rfind('\n')
+                    if index < 0:
+                        partial = value
+                        continue
+                    for line in value[:index].split('\n'):
+                        yield line
+                    partial = value[index + 1:]
+
+                elif kind == _DONE:
+                    if partial:
+                        yield partial
+                    return
+
+                else:
+                    raise value
+        finally:
+            self._cancelled.set()
@@ -1,12 +1,15 @@
 """Provides the Chain class keeping the information about intermediate devices (jumphosts) on the paths to target."""
 import re
 import logging
+from time import time
+
+import pexpect
 
 from condoor.device import Device
 from condoor.hopinfo import make_hop_info_from_url
 from condoor.controller import Controller
 from condoor.protocols import make_protocol
-from condoor.exceptions import ConnectionError
+from condoor.exceptions import ConnectionError, ConnectionTimeoutError, CommandTimeoutError, CancelledError
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +32,8 @@ class Chain(object):
         self.connection = connection
         self.ctrl = Controller(connection)
         self.devices = [device for device in device_gen(self, urls)]
+        # the device which failed during the last connect
+        self.failed_device = None
         self.target_device.driver_name = 'generic'
         self.target_device.is_target = True
 
@@ -39,28 +44,55 @@ class Chain(object):
             name += "->{}".format(str(device))
         return name[2:]
 
-    def connect(self):
-        """Connect to the target device using the intermediate jumphosts."""
+    def connect(self, deadline=None):
+        """Connect to the target device using the intermediate jumphosts.
+
+        Args:
+            deadline (float): Optional absolute time (as returned by time.time()) the connection must be
+                completed by. The timeout of every FSM state is limited to the time left.
+
+        Raises:
+            ConnectionTimeoutError: The deadline passed.
+            CancelledError: The connection was cancelled. The session is torn down.
+        """
         device = None
+        self.failed_device = None
         # logger.debug("Connecting to: {}".format(str(self)))
         for device in self.devices:
             if not device.connected:
                 self.connection.emit_message("Connecting {}".format(str(device)), log_level=logging.INFO)
-                protocol_name = device.get_protocol_name()
-                device.protocol = make_protocol(protocol_name, device)
-                self.ctrl.spawn_session(device.protocol.get_command())
-                if device.connect(self.ctrl):
-                    # logger.info("Connected to {}".format(device))
-                    self.connection.emit_message("Connected {}".format(device), log_level=logging.INFO)
-                else:
-                    if device.last_error_msg:
-                        message = device.last_error_msg
-                        device.last_error_msg = None
+                try:
+                    self.ctrl.check_cancelled()
+                    if deadline is not None and time() >= deadline:
+                        raise ConnectionTimeoutError("Connection deadline exceeded", host=str(device))
+                    protocol_name = device.get_protocol_name()
+                    device.protocol = make_protocol(protocol_name, device)
+                    self.ctrl.spawn_session(device.protocol.get_command())
+                    if device.connect(self.ctrl, deadline):
+                        # logger.info("Connected to {}".format(device))
+                        self.connection.emit_message("Connected {}".format(device), log_level=logging.INFO)
                     else:
-                        message = "Connection error"
-
-                    logger.error(message)
-                    raise ConnectionError(message)  # , host=str(device))
+                        if device.last_error_msg:
+                            message = device.last_error_msg
+                            device.last_error_msg = None
+                        else:
+                            message = "Connection error"
+
+                        logger.error(message)
+                        raise ConnectionError(message)  # , host=str(device))
+                except ConnectionError:
+                    self.failed_device = device
+                    raise
+                except CancelledError:
+                    # the session may be left at any hop prompt, i.e. waiting for the password
+                    self.ctrl.disconnect()
+                    self.tail_disconnect(-1)
+                    raise
+                except (pexpect.TIMEOUT, CommandTimeoutError):
+                    if deadline is None or time() < deadline:
+                        raise
+                    self.failed_device = device
+                    raise ConnectionTimeoutError("Connection deadline exceeded", host=str(device))
 
         if device is None:
             raise ConnectionError("No devices")
@@ -134,9 +166,25 @@ class Chain(object):
         except IndexError:
             pass
 
-    def send(self, cmd, timeout, wait_for_string):
+    def send(self, cmd, timeout, wait_for_string, priority, deadline, spill_threshold, command_result):
         """Send command to the target device."""
-        return self.target_device.send(cmd, timeout=timeout, wait_for_string=wait_for_string)
+        return self.target_device.send(cmd, timeout=timeout, wait_for_string=wait_for_string,
+                                       priority=priority, deadline=deadline, spill_threshold=spill_threshold,
+                                       command_result=command_result)
+
+    def query(self, cmd, filters, timeout, priority, deadline, command_result):
+        """Send command with the output filters to the target device."""
+        return self.target_device.query(cmd, filters, timeout=timeout, priority=priority, deadline=deadline,
+                                        command_result=command_result)
+
+    def admin_mode(self, timeout):
+        """Return the context manager entering the admin mode on the target device."""
+        return self.target_device.admin_mode(timeout=timeout)
+
+    def send_stream(self, cmd, timeout, wait_for_string, lines, priority, deadline):
+        """Send command to the target device and return the output iterator."""
+        return self.target_device.send_stream(cmd, timeout=timeout, wait_for_string=wait_for_string, lines=lines,
+                                              priority=priority, deadline=deadline)
 
     def update(self, data):
         """Update the chain object with the predefined data."""
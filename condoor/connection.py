@@ -7,13 +7,22 @@ import logging
 from hashlib import md5
 
 from collections import deque
+from contextlib import contextmanager
+from condoor.breaker import CircuitBreaker, HALF_OPEN, FAILURE_REFUSED, hop_keys, failure_kind
 from condoor.chain import Chain
-from condoor.exceptions import ConnectionError, ConnectionTimeoutError
-from condoor.utils import FilteredFile, normalize_urls, make_handler
+from condoor import latency
+from condoor.config import CONF
+from condoor.messages import Subscription
+from condoor.tap import TapConsumer, OVERFLOW_DROP
+from condoor.exceptions import ConnectionError, ConnectionTimeoutError, CircuitOpenError
+from condoor.utils import FilteredFile, normalize_urls, make_handler, is_port_open, probe_port, backoff_delays, \
+    probe_ports
+from condoor.scheduler import PRIORITY_NORMAL
 from condoor.version import __version__
 
 logger = logging.getLogger(__name__)
 
+_C = CONF['connection']
 
 _CACHE_FILE = "/tmp/condoor." + __version__ + ".shelve"
 
@@ -96,6 +105,8 @@ class Connection(object):
         top_logger.debug("Cache filename: {}".format(_CACHE_FILE))
 
         self.connection_chains = [Chain(self, url_list) for url_list in normalize_urls(urls)]
+        self._breaker = CircuitBreaker(self._cache_open, threshold=_C['breaker_threshold'],
+                                       window=_C['breaker_window'], cooldown=_C['breaker_cooldown'])
 
     def __del__(self):
         """Clean up the object."""
@@ -142,6 +153,26 @@ class Connection(object):
             cache.close()
             logger.info("Connection information cached: {}".format(key))
 
+    def _latency_keys(self):
+        """Return the latency history keys for all the hops and the target devices."""
+        keys = []
+        for chain in self.connection_chains:
+            hops = [device.node_info for device in chain.devices]
+            keys.extend(latency.hop_key(hops[:index + 1]) for index in range(len(hops)))
+            keys.append(chain.target_device._latency_key())
+        return keys
+
+    def _load_latency(self):
+        """Load the latency history used for the adaptive timeouts."""
+        latency.history.load(self._cache_open, self._latency_keys())
+
+    def _save_latency(self):
+        """Load the history for the devices discovered and store the new latency samples if any."""
+        if not latency.history.changed:
+            return
+        self._load_latency()
+        latency.history.save(self._cache_open)
+
     def _read_cache(self):
         key = self._get_key()
         cache = self._cache_open(mode='r')
@@ -161,15 +192,90 @@ class Connection(object):
         logger.debug("Description record: {}".format(self.description_record))
         self._write_cache()
 
+    def _check_breakers(self, chain, probe=True):
+        """Fail fast if the circuit breaker is open for any hop of the chain.
+
+        If the breaker for the first hop is half-open, its TCP port is probed before the real connection
+        attempt is made. The probe failure opens the breaker again.
+
+        Args:
+            chain (Chain): The connection chain.
+            probe (bool): If False the half-open probe is not made.
+
+        Raises:
+            CircuitOpenError: The breaker is open.
+        """
+        for index, key in enumerate(hop_keys([device.node_info for device in chain.devices])):
+            if self._breaker.check(key) == HALF_OPEN and index == 0 and probe:
+                node_info = chain.devices[0].node_info
+                if not is_port_open(node_info.hostname, node_info.port, timeout=_C['reachability_timeout']):
+                    self._breaker.failure(key, FAILURE_REFUSED)
+                    raise CircuitOpenError("Circuit breaker half-open probe failed", node_info)
+                self._wait_for_line_release([node_info])
+
+    def _record_failure(self, chain, exception):
+        """Record the connection failure for the chain hop which failed."""
+        if chain.failed_device is not None and not isinstance(exception, CircuitOpenError):
+            keys = hop_keys([device.node_info for device in chain.devices])
+            self._breaker.failure(keys[chain.devices.index(chain.failed_device)], failure_kind(exception))
+
+    def _record_success(self, chain):
+        """Close the circuit breakers for all the chain hops."""
+        self._breaker.success(hop_keys([device.node_info for device in chain.devices]))
+
     def _chain_indices(self):
-        """Get the deque of chain indices starting with last successful index."""
+        """Get the deque of chain indices starting with last successful index.
+
+        If there are multiple chains and the reachability check is enabled, the chains with the first hop
+        not reachable are moved to the end.
+        """
         chain_indices = deque(range(len(self.connection_chains)))
         chain_indices.rotate(self._last_chain_index)
+        if len(chain_indices) > 1 and _C['reachability_check']:
+            unreachable = self._unreachable_chains()
+            chain_indices = deque([index for index in chain_indices if index not in unreachable] +
+                                  [index for index in chain_indices if index in unreachable])
         return chain_indices
 
-    def connect(self, logfile=None, force_discovery=False):
+    def _unreachable_chains(self):
+        """Return the set of chain indices with the first hop not reachable.
+
+        The first hops of all the chains are probed in parallel. Only the first hop can be probed directly,
+        the next hops are reachable from the jumphosts only. The hop's *verify_reachability* callable is used
+        if provided. The hop with the hostname which could not be resolved is assumed to be reachable,
+        i.e. the host alias defined in the ssh configuration. The probe not completed within the timeout
+        is unknown and the hop is assumed to be reachable as well.
+        """
+        hops = [chain.devices[0].node_info for chain in self.connection_chains]
+        results = probe_ports([(hop.hostname, hop.port) for hop in hops if not hop.verify_reachability],
+                              timeout=_C['reachability_timeout'])
+        unreachable = set()
+        for index, hop in enumerate(hops):
+            if hop.verify_reachability:
+                reachable = hop.is_reachable()
+            else:
+                reachable = results[(hop.hostname, hop.port)] is not False
+            if not reachable:
+                self.emit_message("Connection chain {}: {} not reachable".format(index + 1, hop),
+                                  log_level=logging.INFO)
+                unreachable.add(index)
+        self._wait_for_line_release([hop for hop in hops
+                                     if not hop.verify_reachability and results[(hop.hostname, hop.port)] is True])
+        return unreachable
+
+    @staticmethod
+    def _wait_for_line_release(hops):
+        """Wait after the TELNET port of the hop accepted the probe, so the terminal server releases the line."""
+        if _C['probe_release_time'] and any(hop.protocol == 'telnet' for hop in hops):
+            time.sleep(_C['probe_release_time'])
+
+    def connect(self, logfile=None, force_discovery=False, deadline=None):
         """Connect to the device.
 
+        The connection failures are counted per device and jumphost by the circuit breaker kept in the persistent
+        cache. After the consecutive failures the breaker opens and the connections fail fast for the cooldown
+        time. Then the first hop TCP port is probed and the single trial connection is made.
+
         Args:
             logfile (file): Optional file descriptor for session logging. The file must be open for write.
                 The session is logged only if ``log_session=True`` was passed to the constructor.
@@ -177,6 +283,10 @@ class Connection(object):
 
             force_discovery (Bool): Optional. If True the device discover process will start after getting connected.
 
+            deadline (float): Optional absolute time (as returned by time.time()) the connection must be completed
+                by, including the discovery. The timeout of every state of the connection is limited to the time
+                left and no further chain is tried after the deadline.
+
         Raises:
             ConnectionError: If the discovery method was not called first or there was a problem with getting
                 the connection.
@@ -185,49 +295,69 @@ class Connection(object):
 
             ConnectionTimeoutError: If the connection timeout happened.
 
+            CircuitOpenError: If the circuit breaker is open for the device or jumphost after recent failures.
+
+            CancelledError: If the connection was cancelled with :meth:`cancel`. The session is torn down.
+
         """
         if logfile:
             self.session_fd = logfile
 
         self._clear_cache() if force_discovery else self._read_cache()
+        self._load_latency()
 
-        excpt = ConnectionError("Could not connect to the device.")
-
-        chains = len(self.connection_chains)
-        for index, chain in enumerate(self.connection_chains, start=1):
-            self.emit_message("Connection chain {}/{}: {}".format(index, chains, str(chain)), log_level=logging.INFO)
-
-        begin = time.time()
-        attempt = 1
-        for index in self._chain_indices():
-            self.emit_message("Connection chain/attempt [{}/{}]".format(index + 1, attempt), log_level=logging.INFO)
+        with self._operation(deadline):
+            excpt = ConnectionError("Could not connect to the device.")
 
-            chain = self.connection_chains[index]
-            self._last_chain_index = index
-            try:
-                if chain.connect():
-                    break
-            except (ConnectionTimeoutError, ConnectionError) as e:  # pylint: disable=invalid-name
-                self.emit_message("Connection error: {}".format(e), log_level=logging.ERROR)
-                excpt = e
+            chains = len(self.connection_chains)
+            for index, chain in enumerate(self.connection_chains, start=1):
+                self.emit_message("Connection chain {}/{}: {}".format(index, chains, str(chain)),
+                                  log_level=logging.INFO)
 
-            attempt += 1
-        else:
-            # invalidate cache
-            raise excpt
+            begin = time.time()
+            attempt = 1
+            for index in self._chain_indices():
+                self.emit_message("Connection chain/attempt [{}/{}]".format(index + 1, attempt),
+                                  log_level=logging.INFO)
 
-        self._write_cache()
-        elapsed = time.time() - begin
-        self.emit_message("Target device connected in {:.2f}s.".format(elapsed), log_level=logging.INFO)
-        logger.debug("-" * 20)
+                chain = self.connection_chains[index]
+                self._last_chain_index = index
+                if deadline is not None and time.time() >= deadline:
+                    raise ConnectionTimeoutError("Connection deadline exceeded", host=str(chain))
+                try:
+                    self._check_breakers(chain)
+                    if chain.connect(deadline):
+                        break
+                except (ConnectionTimeoutError, ConnectionError) as e:  # pylint: disable=invalid-name
+                    self.emit_message("Connection error: {}".format(e), log_level=logging.ERROR)
+                    self._record_failure(chain, e)
+                    excpt = e
+
+                attempt += 1
+            else:
+                # invalidate cache
+                raise excpt
+
+            self._record_success(chain)
+            self._write_cache()
+            elapsed = time.time() - begin
+            self.emit_message("Target device connected in {:.2f}s.".format(elapsed), log_level=logging.INFO)
+            logger.debug("-" * 20)
 
-    def reconnect(self, logfile=None, max_timeout=360, force_discovery=False):
+    def reconnect(self, logfile=None, max_timeout=360, force_discovery=False, deadline=None):
         """Reconnect to the device.
 
         It can be called when after device reloads or the session was
         disconnected either by device or jumphost. If multiple jumphosts are used then `reconnect` starts from
         the last valid connection.
 
+        The delay between the connection attempts grows exponentially with the random jitter. While waiting
+        the TCP port of the first hop is probed. If the port does not accept the connection the next attempt
+        is postponed until it does and starts immediately after, i.e. when the device comes back after reload.
+
+        The chains with the circuit breaker open are skipped. Only the final failure, when no attempt succeeded
+        within *max_timeout*, is counted by the circuit breaker.
+
         Args:
             logfile (file): Optional file descriptor for session logging. The file must be open for write.
                 The session is logged only if ``log_session=True`` was passed to the constructor.
@@ -238,6 +368,9 @@ class Connection(object):
 
             force_discovery (Bool): Optional. If True the device discover process will start after getting connected.
 
+            deadline (float): Optional absolute time (as returned by time.time()) the reconnection must be
+                completed by. It limits *max_timeout* and the timeout of every state of the connection.
+
         Raises:
             ConnectionError: If the discovery method was not called first or there was a problem with getting
              the connection.
@@ -246,6 +379,10 @@ class Connection(object):
 
             ConnectionTimeoutError: If the connection timeout happened.
 
+            CircuitOpenError: If the circuit breaker is open for the device or jumphost after recent failures.
+
+            CancelledError: If the connection was cancelled with :meth:`cancel`. The session is torn down.
+
         """
         if logfile:
             self.session_fd = logfile
@@ -255,85 +392,383 @@ class Connection(object):
             # self.disconnect()
         else:
             self._read_cache()
+        self._load_latency()
 
-        chain_indices = self._chain_indices()
-
-        excpt = ConnectionError("Could not (re)connect to the device")
-
-        chains = len(self.connection_chains)
-        for index, chain in enumerate(self.connection_chains, start=1):
-            self.emit_message("Connection chain {}/{}: {}".format(index, chains, str(chain)), log_level=logging.INFO)
+        with self._operation(deadline):
+            chain_indices = self._chain_indices()
 
-        self.emit_message("Trying to (re)connect within {} seconds".format(max_timeout), log_level=logging.INFO)
-        sleep_time = 0
-        begin = time.time()
-        attempt = 1
-        elapsed = 0
+            excpt = ConnectionError("Could not (re)connect to the device")
 
-        while max_timeout - elapsed > 0:
-            if sleep_time > 0:
-                self.emit_message("Waiting {:.0f}s before next connection attempt".format(sleep_time), log_level=logging.INFO)
-                time.sleep(sleep_time)
-
-            # up
-            elapsed = time.time() - begin
-            # logger.debug("Connection attempt {} Elapsed {:.1f}s".format(attempt, elapsed))
-            try:
-                index = chain_indices[0]
-                self.emit_message("Connection chain/attempt [{}/{}]".format(index + 1, attempt),
+            chains = len(self.connection_chains)
+            for index, chain in enumerate(self.connection_chains, start=1):
+                self.emit_message("Connection chain {}/{}: {}".format(index, chains, str(chain)),
                                   log_level=logging.INFO)
 
-                chain = self.connection_chains[index]
-                self._last_chain_index = index
-                if chain.connect():
-                    break
-            except (ConnectionTimeoutError, ConnectionError) as e:  # pylint: disable=invalid-name
-                if chain.ctrl.is_connected:
-                    prompt = chain.ctrl.detect_prompt()
-                    index = chain.get_device_index_based_on_prompt(prompt)
-                    chain.tail_disconnect(index)
-
-                self.emit_message("Connection error: {}".format(e), log_level=logging.ERROR)
-                chain_indices.rotate(-1)
-                excpt = e
-            finally:
-                # TODO: Make a configuration parameter
+            # the device may be still reloading, so the half-open breaker is not probed
+            for index, chain in enumerate(self.connection_chains):
+                try:
+                    self._check_breakers(chain, probe=False)
+                except CircuitOpenError as e:  # pylint: disable=invalid-name
+                    self.emit_message("Connection error: {}".format(e), log_level=logging.ERROR)
+                    chain_indices.remove(index)
+                    excpt = e
+            if not chain_indices:
+                raise excpt
+
+            if deadline is not None:
+                max_timeout = min(max_timeout, deadline - time.time())
+                if max_timeout <= 0:
+                    raise ConnectionTimeoutError("Connection deadline exceeded", host=str(self._chain))
+            self.emit_message("Trying to (re)connect within {:.0f} seconds".format(max_timeout),
+                              log_level=logging.INFO)
+            delays = backoff_delays(_C['reconnect_initial_delay'], _C['reconnect_backoff_factor'],
+                                    _C['reconnect_max_delay'], _C['reconnect_jitter'])
+            begin = time.time()
+            attempt = 1
+            elapsed = 0
+
+            while max_timeout - elapsed > 0:
+                if attempt > 1:
+                    self._wait_for_first_hop(self.connection_chains[chain_indices[0]], next(delays),
+                                             begin + max_timeout)
+
+                # up
                 elapsed = time.time() - begin
-                sleep_time = min(30, max_timeout - elapsed)
-                self.emit_message("Time elapsed {:.0f}s/{:.0f}s".format(elapsed, max_timeout), log_level=logging.INFO)
+                # logger.debug("Connection attempt {} Elapsed {:.1f}s".format(attempt, elapsed))
+                try:
+                    index = chain_indices[0]
+                    self.emit_message("Connection chain/attempt [{}/{}]".format(index + 1, attempt),
+                                      log_level=logging.INFO)
+
+                    chain = self.connection_chains[index]
+                    self._last_chain_index = index
+                    if chain.connect(deadline):
+                        break
+                except (ConnectionTimeoutError, ConnectionError) as e:  # pylint: disable=invalid-name
+                    if chain.ctrl.is_connected:
+                        prompt = chain.ctrl.detect_prompt()
+                        index = chain.get_device_index_based_on_prompt(prompt)
+                        chain.tail_disconnect(index)
+
+                    self.emit_message("Connection error: {}".format(e), log_level=logging.ERROR)
+                    chain_indices.rotate(-1)
+                    excpt = e
+                finally:
+                    elapsed = time.time() - begin
+                    self.emit_message("Time elapsed {:.0f}s/{:.0f}s".format(elapsed, max_timeout),
+                                      log_level=logging.INFO)
+
+                attempt += 1
+            else:
+                self.emit_message("Unable to (re)connect within {:.0f}s".format(elapsed), log_level=logging.ERROR)
+                self._record_failure(chain, excpt)
+                raise excpt
+
+            self._record_success(chain)
+            self._write_cache()
+            self.emit_message("Target device connected in {:.0f}s.".format(elapsed), log_level=logging.INFO)
+            logger.debug("-" * 20)
+
+    @contextmanager
+    def _operation(self, deadline):
+        """Run the connection as one operation of all the chain controllers.
+
+        The operation is in progress also between the connection attempts and hops, so it can be cancelled
+        with :meth:`cancel` at any time.
+        """
+        entered = []
+        try:
+            for chain in self.connection_chains:
+                budget = chain.ctrl.budget(deadline)
+                budget.__enter__()
+                entered.append(budget)
+            yield
+        finally:
+            for budget in reversed(entered):
+                budget.__exit__(None, None, None)
+
+    def _wait_for_first_hop(self, chain, delay, deadline):
+        """Wait before the next connection attempt.
+
+        The first hop TCP port is probed without spawning the ssh or telnet session. If the port accepts
+        the connection the delay is waited without further probing, i.e. the first hop is the jumphost.
+        If the connection is refused, times out or the host is unreachable, i.e. the device is reloading,
+        the probing continues until the port accepts the connection or until the deadline, ignoring the delay.
+        If the hostname can not be resolved, i.e. it is the ssh config alias, the plain delay is waited.
 
-            attempt += 1
-        else:
-            self.emit_message("Unable to (re)connect within {:.0f}s".format(elapsed), log_level=logging.ERROR)
-            raise excpt
+        Args:
+            chain (Chain): The chain used for the next connection attempt.
+            delay (float): The delay in seconds.
+            deadline (float): The absolute time the waiting ends anyway.
 
-        self._write_cache()
-        self.emit_message("Target device connected in {:.0f}s.".format(elapsed), log_level=logging.INFO)
-        logger.debug("-" * 20)
+        Raises:
+            CancelledError: The reconnection was cancelled.
+        """
+        node_info = chain.devices[0].node_info
+        interval = _C['reconnect_probe_interval']
+        delay_end = min(time.time() + delay, deadline)
+        self.emit_message("Waiting {:.0f}s before next connection attempt".format(delay), log_level=logging.INFO)
+        if node_info.port is None:
+            chain.ctrl.sleep(delay_end - time.time())
+            return
 
-    def send(self, cmd="", timeout=60, wait_for_string=None):
+        unreachable = False
+        while True:
+            probe_start = time.time()
+            state = probe_port(node_info.hostname, node_info.port, timeout=interval)
+            if state is None:
+                logger.debug("{} can not be resolved".format(node_info.hostname))
+                chain.ctrl.sleep(delay_end - time.time())
+                return
+            elif state:
+                if unreachable:
+                    self.emit_message("{}:{} accepts connection".format(node_info.hostname, node_info.port),
+                                      log_level=logging.INFO)
+                    self._wait_for_line_release([node_info])
+                else:
+                    chain.ctrl.sleep(delay_end - time.time())
+                return
+            elif not unreachable:
+                unreachable = True
+                self.emit_message("{}:{} not reachable. Probing every {}s".format(
+                    node_info.hostname, node_info.port, interval), log_level=logging.INFO)
+
+            now = time.time()
+            if now >= deadline:
+                return
+            chain.ctrl.sleep(min(probe_start + interval - now, deadline - now))
+
+    def send(self, cmd="", timeout=None, wait_for_string=None, priority=PRIORITY_NORMAL, deadline=None,
+             spill_threshold=None, command_result=False):
         """Send the command to the device and return the output.
 
         Args:
             cmd (str): Command string for execution. Defaults to empty string.
-            timeout (int): Timeout in seconds. Defaults to 60s
+            timeout (int): Timeout in seconds. If *None* the adaptive timeout is used. It is the 99th percentile
+            of the recent command execution times on the same platform and software version multiplied by
+            the factor and limited by the floor and the ceiling from the ``adaptive_timeout`` configuration.
+            Defaults to 60s until enough history is recorded.
             wait_for_string (str): This is optional string that driver
             waits for after command execution. If none the detected
             prompt will be used.
+            priority (int): The command priority class: ``PRIORITY_INTERACTIVE``, ``PRIORITY_NORMAL``
+            or ``PRIORITY_BULK``. Defaults to ``PRIORITY_NORMAL``.
+            deadline (float): Optional absolute time (as returned by ``time.time()``) the command must be
+            completed by. If the deadline passes while the command waits for the device session the command
+            is not sent and ``CommandTimeoutError`` is raised. The command timeout is limited to the time
+            left until the deadline.
+            spill_threshold (int): Optional output size in bytes. If the output is longer, it is stored
+            in the temporary file and the :class:`condoor.capture.MappedOutput` object is returned instead
+            of the string. The object supports ``len``, slicing, line iteration, ``find`` and regular expression
+            search without loading the output to the memory. The temporary file is removed when the object
+            is closed.
+            command_result (bool): If True the :class:`condoor.result.CommandResult` object is returned instead
+            of the string. The object is the string subclass, so it compares and behaves as the string. It
+            provides the line access by number, ``grep`` and ``section`` helpers using the line index built once
+            and the ``command``, ``prompt``, ``elapsed``, ``bytes`` and ``pages`` attributes.
+
+        The method can be called from multiple threads sharing the same connection. The commands are executed
+        one by one in the priority order and in the order of calls within the same priority class.
+        The number of waiting commands is limited by the ``device: command_queue_size`` configuration value.
+        If the queue is full the caller is blocked until there is a free slot. If the same command is requested
+        while it is already executed in the same device mode, the command is not sent again and all the callers
+        get the same output.
 
         Returns:
-            A string containing the command output.
+            A string containing the command output, :class:`condoor.result.CommandResult` object
+            or :class:`condoor.capture.MappedOutput` object if the output was spilled to the temporary file.
 
         Raises:
             ConnectionError: General connection error during command execution
             CommandSyntaxError: Command syntax error or unknown command.
             CommandTimeoutError: Timeout during command execution
         """
-        return self._chain.send(cmd, timeout, wait_for_string)
+        return self._chain.send(cmd, timeout, wait_for_string, priority, deadline, spill_threshold, command_result)
+
+    def query(self, cmd, include=None, exclude=None, begin=None, section=None, timeout=None, priority=PRIORITY_NORMAL,
+              deadline=None, command_result=False):
+        """Send the command and return the output filtered on the device side if possible.
+
+        The filters are translated to the platform native output filters, i.e. ``| include``, ``| exclude``,
+        ``| begin`` and ``| section`` on IOS, IOS XR and NX-OS or ``| grep`` on the Unix jumphost, so only
+        the filtered output is transferred from the device. The filters not supported by the platform
+        are applied locally to the received output. The patterns are the regular expressions.
+
+        Args:
+            cmd (str): Command string for execution.
+            include (str): Only the lines matching the pattern are returned.
+            exclude (str): The lines matching the pattern are removed.
+            begin (str): The output starts from the first line matching the pattern.
+            section (str): Only the sections starting with the line matching the pattern are returned.
+            The section contains the matching line and the following lines with the greater indentation.
+            timeout (int): Timeout in seconds. If *None* the adaptive timeout is used like in :meth:`send`.
+            priority (int): The command priority class. Refer to :meth:`send`.
+            deadline (float): Optional absolute time the command must be completed by. Refer to :meth:`send`.
+            command_result (bool): If True the :class:`condoor.result.CommandResult` object is returned.
+
+        The filters are applied in order: *begin*, *section*, *include* and *exclude*.
+
+        Example::
+
+            output = conn.query("show running-config", section="^router bgp", exclude="description")
+
+        Returns:
+            A string containing the filtered command output.
+
+        Raises:
+            ConnectionError: General connection error during command execution
+            CommandSyntaxError: Command syntax error or unknown command.
+            CommandTimeoutError: Timeout during command execution
+        """
+        filters = [(name, pattern) for name, pattern in (('begin', begin), ('section', section),
+                                                         ('include', include), ('exclude', exclude))
+                   if pattern is not None]
+        return self._chain.query(cmd, filters, timeout, priority, deadline, command_result)
+
+    def send_stream(self, cmd="", timeout=None, wait_for_string=None, lines=False, priority=PRIORITY_NORMAL,
+                    deadline=None):
+        """Send the command to the device and return the iterator over the output as it arrives.
+
+        Args:
+            cmd (str): Command string for execution. Defaults to empty string.
+            timeout (int): Timeout in seconds. If *None* the adaptive timeout is used. Refer to :meth:`send`.
+            The time while the output waits for the consumer is not counted.
+            wait_for_string (str): This is optional string that driver
+            waits for after command execution. If none the detected
+            prompt will be used.
+            lines (bool): If True the iterator returns the complete lines without the new line character.
+            Otherwise the chunks of text are returned as they arrive.
+            priority (int): The command priority class. Refer to :meth:`send`.
+            deadline (float): Optional absolute time the command must be completed by. Refer to :meth:`send`.
+
+        The command is executed in the background thread when the iteration starts. The output is returned
+        with the carriage return characters, command echo and trailing prompt removed. The ``--More--`` prompts
+        are handled while receiving the output. Only the limited number of chunks is buffered, so the memory
+        used does not depend on the output size. If the iteration is stopped before the end, the rest of the output
+        is discarded.
+
+        Example::
+
+            for line in conn.send_stream("show bgp ipv4 unicast", timeout=600, lines=True):
+                process(line)
+
+        Returns:
+            The iterator over the output chunks or lines.
+
+        Raises:
+            ConnectionError: General connection error during command execution
+            CommandSyntaxError: Command syntax error or unknown command.
+            CommandTimeoutError: Timeout during command execution
+            CommandError: The device session is held by the calling thread, i.e. in the admin mode.
+        """
+        return self._chain.send_stream(cmd, timeout, wait_for_string, lines, priority, deadline)
+
+    def admin_mode(self, timeout=None):
+        """Return the context manager executing the commands in the admin mode.
+
+        The admin mode is entered once at the beginning of the context and left at the end, so the admin commands
+        do not need the ``admin`` prefix and do not enter and leave the admin mode every time.
+        On IOS XR 64 bit the commands are executed natively in Calvados. The other threads sharing the connection
+        wait until the context ends. If the device is already in the admin mode the context does nothing.
+
+        Args:
+            timeout (int): Timeout in seconds for entering and leaving the admin mode. If *None* the adaptive
+                timeout is used. Refer to :meth:`send`.
+
+        Example::
+
+            with conn.admin_mode():
+                inventory = conn.send("show inventory chassis")
+                packages = conn.send("show install active")
+
+        Raises:
+            ConnectionError: Device not connected.
+            CommandError: The admin mode not supported by the platform or not entered.
+        """
+        return self._chain.admin_mode(timeout)
 
     def disconnect(self):
         """Disconnect the session from the device and all the jumphosts in the path."""
         self._chain.disconnect()
+        self._save_latency()
+
+    def subscribe_messages(self, callback, pattern=None):
+        """Subscribe to the asynchronous console messages of the target device, i.e. syslog messages.
+
+        The messages are separated from the session output only if ``demux_messages`` is enabled in the controller
+        configuration. The message is the complete line matching the ``async_message`` pattern of the platform.
+        The callback is called with the message text as it is received, in the thread reading the session
+        output, so it should return quickly.
+
+        Args:
+            callback (callable): The function called with the message string.
+            pattern: Optional regular expression string or compiled pattern. If set only the matching messages
+                are delivered.
+
+        Returns:
+            The :class:`condoor.messages.Subscription` object passed to :meth:`unsubscribe_messages`.
+        """
+        subscription = Subscription(callback, pattern)
+        for chain in self.connection_chains:
+            chain.ctrl.demux.subscribe(subscription)
+        return subscription
+
+    def unsubscribe_messages(self, subscription):
+        """Cancel the subscription to the asynchronous console messages."""
+        for chain in self.connection_chains:
+            chain.ctrl.demux.unsubscribe(subscription)
+
+    def tap(self, maxsize=1024, overflow=OVERFLOW_DROP):
+        """Return the consumer of the raw session stream.
+
+        The consumer iterates over the session output chunks as received from the device and the jumphosts,
+        i.e. for the session recording or the live terminal view, independently of the session log.
+        The chunks are not copied for the consumers. If the consumer queue is full the chunk is dropped or
+        the consumer is detached, so the slow consumer never slows down the session. The consumer stays attached
+        after reconnect until closed.
+
+        Args:
+            maxsize (int): Maximum number of chunks waiting in the consumer queue.
+            overflow (str): The queue overflow policy: ``drop`` the chunk or ``detach`` the consumer.
+
+        Returns:
+            The :class:`condoor.tap.TapConsumer` object. Call its *close* method to stop consuming.
+        """
+        consumer = TapConsumer(maxsize, overflow)
+        for chain in self.connection_chains:
+            chain.ctrl.tap(consumer)
+        return consumer
+
+    def cancel(self, timeout=None):
+        """Cancel the operation in progress.
+
+        The method is thread safe and it is meant to be called from the other thread than the one blocked
+        in the :meth:`send`, :meth:`query`, :meth:`connect`, :meth:`reconnect` or :meth:`reload` call.
+        The break sequence of the platform (i.e. Ctrl-C or Ctrl-^ on IOS) is sent to the device and the blocked
+        call raises :class:`CancelledError` after the prompt is received. If the prompt is not received within
+        the timeout, the session process is killed and the blocked call raises :class:`CancelledError`
+        immediately after tearing down the session to the device and all the jumphosts. Then the :meth:`reconnect`
+        is required.
+
+        If no operation is in progress the method has no effect.
+
+        Args:
+            timeout (float): Optional time in seconds to wait for the prompt after the break sequence is sent.
+                If *None* the ``cancel_timeout`` from the configuration is used.
+
+        Returns:
+            True if the session is still connected. False if it was torn down.
+        """
+        chain = self._chain
+        driver = chain.target_device.driver
+        for other in self.connection_chains:
+            # the connection in progress may move to the next chain
+            if other is not chain:
+                other.ctrl.request_cancel()
+        if chain.ctrl.cancel(driver.break_sequence, _C['cancel_timeout'] if timeout is None else timeout):
+            return True
+        self.emit_message("Operation not cancelled on time. Session killed", log_level=logging.WARNING)
+        return False
 
     def discovery(self, logfile=None):
         """Discover the device details.
@@ -362,10 +797,20 @@ class Connection(object):
         """
         self._chain.target_device.enable(enable_password)
 
-    def reload(self, reload_timeout=300, save_config=True, no_reload_cmd=False):
-        """Reload the device and wait for device to boot up."""
+    def reload(self, reload_timeout=300, save_config=True, no_reload_cmd=False, deadline=None):
+        """Reload the device and wait for device to boot up.
+
+        Args:
+            reload_timeout (int): The maximum time in seconds for the device to boot up.
+            save_config (bool): If True the configuration is saved before reload.
+            no_reload_cmd (bool): If True the reload command is not sent, i.e. it was already sent by the caller.
+            deadline (float): Optional absolute time (as returned by time.time()) the reload must be completed by.
+
+        Raises:
+            ConnectionTimeoutError: If the deadline passed.
+        """
         self._clear_cache()
-        self._chain.target_device.reload(reload_timeout, save_config, no_reload_cmd)
+        self._chain.target_device.reload(reload_timeout, save_config, no_reload_cmd, deadline)
 
     def run_fsm(self, name, command, events, transitions, timeout, max_transitions=20):
         """Instantiate and run the Finite State Machine for the current device connection.
@@ -476,6 +921,11 @@ class Connection(object):
         """Return if target device is discovered."""
         return self._chain.is_discovered
 
+    @property
+    def reader_stats(self):
+        """Return the background reader statistics of the session or *None* if the reader is not used."""
+        return self._chain.ctrl.reader_stats
+
     @property
     def is_console(self):
         """Return if target device is connected via console."""
@@ -1,18 +1,30 @@
 """Provides the Controller class which is a wrapper to the pyexpect.spawn class."""
 
+import os
 import re
+import signal
 import logging
+import threading
 import pexpect
+from pexpect.expect import Expecter
+from contextlib import contextmanager
 from time import time
 
+from condoor.config import CONF
 from condoor.utils import delegate, levenshtein_distance
-from condoor.exceptions import ConnectionError, ConnectionTimeoutError
+from condoor.exceptions import ConnectionError, ConnectionTimeoutError, CancelledError
+from condoor.capture import ChunkSearcher, OutputCapture
+from condoor.reader import ReaderSpawn
+from condoor.messages import MessageDemux
+from condoor.tap import SessionTap, TapConsumer, OVERFLOW_DROP
 
 logger = logging.getLogger(__name__)
 
+_C = CONF['controller']
+
 
 # Delegate following methods to _session class
-@delegate("_session", ("expect", "expect_exact", "expect_list", "compile_pattern_list", "sendline",
+@delegate("_session", ("expect_exact", "expect_list", "compile_pattern_list", "sendline",
                        "isalive", "sendcontrol", "send", "read_nonblocking", "setecho", "delaybeforesend"))
 class Controller(object):
     """Controller class which wraps the pyexpect.spawn class."""
@@ -24,10 +36,31 @@ class Controller(object):
         self._connection = connection
 
         self._logfile_fd = connection.session_fd
+        # the session log and the raw session stream consumers
+        self._tap = SessionTap(self._logfile_fd)
         self.connected = False
         self.authenticated = False
         self.last_hop = 0
 
+        # active output capture
+        self._capture = None
+        # pager prompt answered while capturing the output
+        self._pager = None
+        # absolute time the expect calls must complete by
+        self.deadline = None
+        # number of nested operations in progress, the no operation event and the cancel request event
+        self._operations = 0
+        # guards the deadline, the operation counter and the cancel request against the cancelling thread
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._cancelled = threading.Event()
+        # drain the session output with the background reader thread
+        self.background_reader = _C['background_reader']
+        # separate the asynchronous messages from the session output
+        self.demux_messages = _C['demux_messages']
+        self.demux = MessageDemux()
+
     @property
     def hostname(self):
         """Return the hostname."""
@@ -35,6 +68,8 @@ class Controller(object):
 
     def spawn_session(self, command):
         """Spawn the session using proper command."""
+        # the messages of the target device are separated once connected to it
+        self.demux.reset()
         if self._session and self.isalive():  # pylint: disable=no-member
             logger.debug("Executing command: '{}'".format(command))
             try:
@@ -50,13 +85,21 @@ class Controller(object):
         else:
             logger.debug("Spawning command: '{}'".format(command))
             try:
-                self._session = pexpect.spawn(
-                    command,
+                kwargs = dict(
                     maxread=65536,
                     searchwindowsize=4000,
                     env={"TERM": "VT100"},  # to avoid color control characters
                     echo=False  # KEEP YOUR DIRTY HANDS OFF FROM ECHO!
                 )
+                text_filter = self.demux.feed if self.demux_messages else None
+                if self.background_reader:
+                    self._session = ReaderSpawn(command, buffer_size=_C['reader_buffer_size'],
+                                                overflow=_C['reader_overflow'], text_filter=text_filter, **kwargs)
+                else:
+                    self._session = pexpect.spawn(command, **kwargs)
+                    if text_filter is not None:
+                        self._session.read_nonblocking = self._filtered_reader(self._session.read_nonblocking,
+                                                                               text_filter)
                 self._session.delaybeforesend = 0.3
                 rows, cols = self._session.getwinsize()
                 if cols < 160:
@@ -72,13 +115,239 @@ class Controller(object):
             except pexpect.TIMEOUT:
                 raise ConnectionTimeoutError("Timeout", self.hostname)
 
-            self._session.logfile_read = self._logfile_fd
+            self._session.logfile_read = self._tap
             self.connected = True
 
+    def expect(self, pattern, timeout=-1, searchwindowsize=-1):
+        """Seek through the stream until a pattern is matched.
+
+        The method has the same semantic as pexpect.spawn.expect. If the output capture is active the text received
+        before the pattern is stored in the capture object in chunks, so the session buffer does not grow.
+        If the pager prompt is set, it is answered without returning from the method.
+
+        Raises:
+            CancelledError: The operation was cancelled with :meth:`cancel` before the pattern was matched.
+        """
+        try:
+            index = self._expect(pattern, timeout, searchwindowsize)
+        except (pexpect.EOF, pexpect.TIMEOUT):
+            self.check_cancelled()
+            raise
+        self.check_cancelled()
+        return index
+
+    def _expect(self, pattern, timeout, searchwindowsize):
+        """Seek through the stream until a pattern is matched capturing the output."""
+        timeout = self._clamp_timeout(timeout)
+        if self._capture is None:
+            return self._session.expect(pattern, timeout=timeout, searchwindowsize=searchwindowsize)
+
+        patterns = self._session.compile_pattern_list(pattern)
+        pager_index = None
+        if self._pager is not None:
+            # the pager pattern expected by the caller, i.e. the FSM event, is answered here as well
+            pager_index = next((index for index, item in enumerate(patterns)
+                                if getattr(item, 'pattern', None) == self._pager.pattern), None)
+            if pager_index is None:
+                pager_index = len(patterns)
+                patterns.append(self._pager)
+        searcher = ChunkSearcher(patterns)
+        if timeout == -1:
+            timeout = self._session.timeout
+        page_timeout = timeout
+        end_time = None if timeout is None else time() + timeout
+
+        self._capture.begin()
+        try:
+            while True:
+                index = Expecter(self._session, searcher, searchwindowsize).expect_loop(timeout)
+                if index == pager_index:
+                    self._capture.write(self._session.before)
+                    self._capture.page()
+                    self._send_page()
+                    if end_time is not None:
+                        # each page has the full timeout as it had when answered by the FSM
+                        timeout = self._clamp_timeout(page_timeout)
+                        end_time = time() + timeout
+                    continue
+
+                if index != searcher.chunk_index:
+                    break
+                start_time = time()
+                self._capture.write(self._session.before)
+                if end_time is not None:
+                    # the time spent by the output consumer does not count to the timeout
+                    end_time += time() - start_time
+                    timeout = self._clamp_timeout(max(0, end_time - time()))
+
+        except pexpect.EOF:
+            self._capture.write(self._session.before)
+            self._capture.end()
+            raise
+
+        # on timeout the text stays in the session buffer
+        if self._session.after is not pexpect.TIMEOUT:
+            self._capture.write(self._session.before)
+            self._capture.end()
+        return index
+
+    @staticmethod
+    def _filtered_reader(read_nonblocking, text_filter):
+        """Return the session read method passing the text through the filter.
+
+        If the whole text is removed the empty string is returned and the expect loop continues reading
+        until its timeout.
+        """
+        def read(size=1, timeout=-1):
+            return text_filter(read_nonblocking(size, timeout))
+        return read
+
+    def _clamp_timeout(self, timeout):
+        """Return the expect timeout limited to the time left until the deadline.
+
+        Raises:
+            pexpect.TIMEOUT: The deadline passed.
+        """
+        if self.deadline is None:
+            return timeout
+        remaining = self.deadline - time()
+        if remaining <= 0:
+            raise pexpect.TIMEOUT("Deadline exceeded")
+        if timeout == -1:
+            timeout = self._session.timeout
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def check_cancelled(self):
+        """Raise CancelledError if the operation was cancelled."""
+        if self._cancelled.is_set():
+            raise CancelledError("Operation cancelled", self.hostname)
+
+    def sleep(self, seconds):
+        """Sleep for the number of seconds or until the operation is cancelled.
+
+        Raises:
+            CancelledError: The operation was cancelled.
+        """
+        if self._cancelled.wait(max(0, seconds)):
+            raise CancelledError("Operation cancelled", self.hostname)
+
+    @contextmanager
+    def budget(self, deadline):
+        """Limit all the expect calls in the context, including every FSM state, to the deadline.
+
+        The nested budget can only shorten the deadline. If the deadline passes, the expect call raises
+        pexpect.TIMEOUT even if the TIMEOUT is one of the expected patterns, so no FSM can extend the budget.
+        The outermost context is the operation in progress which can be cancelled with :meth:`cancel`.
+
+        Args:
+            deadline (float): The absolute time (as returned by time.time()) or *None* if not limited.
+        """
+        with self._lock:
+            previous = self.deadline
+            if deadline is not None and (previous is None or deadline < previous):
+                self.deadline = deadline
+            if not self._operations:
+                self._cancelled.clear()
+                self._idle.clear()
+            self._operations += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.deadline = previous
+                self._operations -= 1
+                if not self._operations:
+                    self._idle.set()
+
+    def cancel(self, break_sequence, timeout):
+        """Cancel the operation in progress in the other thread.
+
+        The method is called from the other thread than the one running the operation. The break sequence
+        is sent to the device and the operation raises :class:`CancelledError` when the next expected pattern,
+        usually the prompt printed after the break, is received, so the session stays synchronized.
+        If the operation does not end within the timeout the session process is killed and the operation raises
+        :class:`CancelledError` on the session end. The session is torn down by the thread running the operation.
+
+        Args:
+            break_sequence (str): The characters interrupting the command on the device, i.e. Ctrl-C.
+            timeout (float): Time in seconds to wait for the operation to end after the break sequence is sent.
+
+        Returns:
+            True if no operation was in progress or the operation ended. False if the session was killed.
+        """
+        if not self.request_cancel():
+            return True
+        logger.debug("Cancelling the operation in progress")
+        if self._session is not None and self._session.isalive():
+            try:
+                self._session.send(break_sequence)
+            except OSError:
+                pass
+        if self._idle.wait(timeout):
+            return True
+
+        logger.warning("Operation not ended within {}s after the break. Killing the session".format(timeout))
+        if self._session is not None:
+            try:
+                os.kill(self._session.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self._idle.wait(timeout)
+        return False
+
+    def request_cancel(self):
+        """Mark the operation in progress cancelled without sending the break sequence and waiting.
+
+        The operation raises :class:`CancelledError` on the next expect call or cancellation check.
+
+        Returns:
+            False if no operation was in progress.
+        """
+        with self._lock:
+            if self._idle.is_set():
+                return False
+            self._cancelled.set()
+            return True
+
+    def _send_page(self):
+        """Answer the pager prompt without the delay before send."""
+        delay = self._session.delaybeforesend
+        self._session.delaybeforesend = None
+        try:
+            self._session.send(" ")
+        finally:
+            self._session.delaybeforesend = delay
+
+    @contextmanager
+    def capture_output(self, sink=None, spill_threshold=None, pager=None):
+        """Capture the output received by the expect calls in the context.
+
+        Args:
+            sink (callable): Optional function called with every output chunk as it arrives.
+            spill_threshold (int): Optional output size after which the output is stored in the temporary file.
+            pager (re): Optional compiled pager prompt pattern, i.e. ``--More--``. The pager prompt is answered
+                and the pager artifacts are removed from the output.
+
+        Yields:
+            The :class:`condoor.capture.OutputCapture` object.
+        """
+        previous = self._capture, self._pager
+        self._capture = OutputCapture(sink, spill_threshold)
+        self._pager = pager
+        try:
+            yield self._capture
+        finally:
+            self._capture, self._pager = previous
+
     def send_command(self, cmd):
-        """Send command."""
+        """Send command. The echo of the last command line is waited."""
         self.send(cmd)  # pylint: disable=no-member
-        self.expect_exact([cmd, pexpect.TIMEOUT], timeout=15)  # pylint: disable=no-member
+        try:
+            self.expect_exact([cmd.split('\n')[-1], pexpect.TIMEOUT], timeout=15)  # pylint: disable=no-member
+        except pexpect.EOF:
+            # the session killed on cancel
+            self.check_cancelled()
+            raise
         self.sendline()  # pylint: disable=no-member
 
     def disconnect(self):
@@ -175,6 +444,35 @@ class Controller(object):
 
         return None
 
+    def tap(self, consumer=None, maxsize=1024, overflow=OVERFLOW_DROP):
+        """Add the consumer of the raw session stream.
+
+        Args:
+            consumer (TapConsumer): Optional consumer, i.e. already tapping the other session. If *None* the new
+                consumer is created with the *maxsize* and *overflow* arguments.
+            maxsize (int): Maximum number of chunks waiting in the consumer queue.
+            overflow (str): The queue overflow policy: ``drop`` the chunk or ``detach`` the consumer.
+
+        Returns:
+            The :class:`condoor.tap.TapConsumer` object.
+        """
+        if consumer is None:
+            consumer = TapConsumer(maxsize, overflow)
+        self._tap.add(consumer)
+        return consumer
+
+    @property
+    def reader_stats(self):
+        """Return the background reader ring buffer statistics or *None* if the reader is not used.
+
+        The statistics dictionary contains the number of characters received, the buffer peak size,
+        the number of overflows and the characters dropped and the number of waits for the free space
+        (back-pressure) and the total wait time in seconds.
+        """
+        if isinstance(self._session, ReaderSpawn):
+            return dict(self._session.ring_buffer.stats, size=len(self._session.ring_buffer))
+        return None
+
     @property
     def is_connected(self):
         """Return the session state regardless of device connection state."""
@@ -182,7 +480,12 @@ class Controller(object):
 
     @property
     def before(self):
-        """Return text up to the expected string pattern."""
+        """Return text up to the expected string pattern.
+
+        If the output capture is active the captured text is returned with the carriage return characters removed.
+        """
+        if self._capture is not None:
+            return self._capture.text()
         return self._session.before if self._session else None
 
     @property
@@ -2,14 +2,29 @@
 
 import sys
 import logging
+import threading
 import pexpect
+from functools import partial
+from contextlib import contextmanager
+from time import time
 
-from condoor.exceptions import ConnectionError, CommandSyntaxError, CommandTimeoutError
+from condoor.exceptions import ConnectionError, CommandError, CommandSyntaxError, CommandTimeoutError, \
+    ConnectionTimeoutError, CancelledError, GeneralError
 from condoor.utils import parse_inventory
+from condoor import latency
 from condoor.fsm import FSM
+from condoor.scheduler import CommandQueue, SingleFlight, normalize_command, PRIORITY_NORMAL
+from condoor.config import CONF
+from condoor.capture import OutputStream, MappedOutput
+from condoor.result import CommandResult, filter_output
 
 logger = logging.getLogger(__name__)
 
+_C = CONF['device']
+
+# the command timeout used if not given and there is no latency history
+DEFAULT_COMMAND_TIMEOUT = 60
+
 
 class Device(object):
     """Device class representing physical device for both target and jumphost."""
@@ -32,6 +47,9 @@ class Device(object):
         self.prompt = None
         self.prompt_re = None
 
+        # the last prompt and driver platform for which the driver, mode and hostname were evaluated
+        self._prompt_state = None
+
         # properties with getter to collect in case None
         # version_text
         self._version_text = None
@@ -60,10 +78,18 @@ class Device(object):
         self.udi = None
         self.is_console = None
 
+        self.last_command = None
         self.last_command_result = None
+        self.last_exit_status = None
 
         self.last_error_msg = None
 
+        # serialize the concurrent callers and coalesce the identical commands
+        self.command_queue = CommandQueue(maxsize=_C['command_queue_size'])
+        self.command_flight = SingleFlight()
+        # the thread holding the device session in the admin mode
+        self._admin_owner = None
+
     @property
     def device_info(self):
         """Return device info dict."""
@@ -105,17 +131,31 @@ class Device(object):
         # self.is_console = None
         self.prompt = None
         self.prompt_re = None
+        self._prompt_state = None
+
+    def connect(self, ctrl, deadline=None):
+        """Connect to the device.
 
-    def connect(self, ctrl):
-        """Connect to the device."""
+        Args:
+            ctrl (Controller): The controller of the session.
+            deadline (float): Optional absolute time (as returned by time.time()) the connection must be
+                completed by. The timeout of every FSM state is limited to the time left.
+        """
+        with ctrl.budget(deadline):
+            return self._connect(ctrl)
+
+    def _connect(self, ctrl):
+        """Connect to the device using the protocol and discover it if it is the target."""
         if self.prompt:
             self.prompt_re = self.driver.make_dynamic_prompt(self.prompt)
         else:
             self.prompt_re = self.driver.prompt_re
 
         self.ctrl = ctrl
+        start = time()
         if self.protocol.connect(self.driver):
             if self.protocol.authenticate(self.driver):
+                latency.history.record(self._hop_latency_key(), latency.CONNECT, time() - start)
                 self.ctrl.try_read_prompt(1)
                 if not self.prompt:
                     self.prompt = self.ctrl.detect_prompt()
@@ -131,6 +171,7 @@ class Device(object):
                 self.connected = True
 
                 if self.is_target is False:
+                    self.after_connect()
                     if self.os_version is None:
                         self.update_os_version()
 
@@ -145,12 +186,9 @@ class Device(object):
 
     def _connected_to_target(self):
         self.update_driver(self.prompt)
+        self._update_message_pattern()
         self.after_connect()
-
-        try:
-            self.prepare_terminal_session()
-        except CommandSyntaxError:
-            pass
+        self.prepare_terminal_session()
 
         if self.os_type is None:
             self.update_os_type()
@@ -191,18 +229,27 @@ class Device(object):
             if self.ctrl:
                 self.ctrl = None
 
-    def send(self, cmd="", timeout=60, wait_for_string=None):
+    def send(self, cmd="", timeout=None, wait_for_string=None, priority=PRIORITY_NORMAL, deadline=None,
+             spill_threshold=None, command_result=False):
         """Send the command to the device and return the output.
 
         Args:
             cmd (str): Command string for execution. Defaults to empty string.
-            timeout (int): Timeout in seconds. Defaults to 60s
+            timeout (int): Timeout in seconds. If *None* the adaptive timeout derived from the command latency
+                history is used or 60s if there is not enough history.
             wait_for_string (str): This is optional string that driver
                 waits for after command execution. If none the detected
                 prompt will be used.
+            priority (int): The command priority class used when waiting for the device session.
+            deadline (float): Optional absolute time (as returned by time.time()) the command must be
+                completed by. The command is dropped if the deadline passes while waiting in the queue.
+            spill_threshold (int): Optional output size in bytes after which the output is stored
+                in the temporary file.
+            command_result (bool): If True the :class:`condoor.result.CommandResult` object is returned.
 
         Returns:
-            A string containing the command output.
+            A string containing the command output, :class:`condoor.result.CommandResult` object
+            or :class:`condoor.capture.MappedOutput` object if the output was spilled to the temporary file.
 
         Raises:
             ConnectionError: General connection error during command execution
@@ -212,9 +259,15 @@ class Device(object):
         if self.connected:
             output = ''
             logger.debug("Sending command: '{}'".format(cmd))
+            if timeout is None:
+                timeout = self._command_timeout(cmd)
 
             try:
-                output = self.execute_command(cmd, timeout, wait_for_string)
+                output = self.command_flight.do(self._command_key(cmd, wait_for_string, priority, deadline,
+                                                                  spill_threshold, command_result),
+                                                self._execute_queued, cmd, timeout, wait_for_string,
+                                                priority, deadline, spill_threshold=spill_threshold,
+                                                command_result=command_result)
             except ConnectionError:
                 logger.error("Connection lost. Disconnecting.")
                 # self.disconnect()
@@ -226,26 +279,254 @@ class Device(object):
         else:
             raise ConnectionError("Device not connected", host=self.hostname)
 
-    def execute_command(self, cmd, timeout, wait_for_string):
-        """Execute command."""
+    def query(self, cmd, filters, timeout=None, priority=PRIORITY_NORMAL, deadline=None, command_result=False):
+        """Send the command with the output filters and return the filtered output.
+
+        The filters supported by the driver are appended to the command and applied by the device.
+        The remaining filters are applied locally. If the device rejects the filtered command,
+        the command is sent again without the filters and all the filters are applied locally.
+
+        Args:
+            cmd (str): Command string for execution.
+            filters (list): The list of (filter name, pattern) tuples applied in order.
+            timeout (int): Timeout in seconds. If *None* the adaptive timeout is used.
+            priority (int): The command priority class used when waiting for the device session.
+            deadline (float): Optional absolute time (as returned by time.time()) the command must be
+                completed by.
+            command_result (bool): If True the :class:`condoor.result.CommandResult` object is returned.
+
+        Returns:
+            A string containing the filtered command output or :class:`condoor.result.CommandResult` object.
+        """
+        device_cmd, remaining = self.driver.filter_command(cmd, filters)
+        try:
+            output = self.send(device_cmd, timeout=timeout, priority=priority, deadline=deadline,
+                               command_result=command_result)
+        except CommandSyntaxError:
+            if len(remaining) == len(filters):
+                raise
+            logger.warning("Output filters not accepted: '{}'. Filtering the output locally.".format(device_cmd))
+            remaining = filters
+            output = self.send(cmd, timeout=timeout, priority=priority, deadline=deadline,
+                               command_result=command_result)
+
+        if remaining:
+            logger.debug("Filtering the output locally: {}".format(remaining))
+            filtered = filter_output(output, remaining)
+            if command_result:
+                filtered = CommandResult(filtered, command=output.command, prompt=output.prompt,
+                                         elapsed=output.elapsed, pages=output.pages)
+            output = filtered
+        return output
+
+    def _command_timeout(self, cmd):
+        """Return the adaptive command timeout derived from the command latency history."""
+        return latency.history.timeout(self._latency_key(), normalize_command(cmd), DEFAULT_COMMAND_TIMEOUT)
+
+    def _command_key(self, cmd, wait_for_string, priority=PRIORITY_NORMAL, deadline=None, spill_threshold=None,
+                     command_result=False):
+        """Return the key used to coalesce the concurrent identical commands or None if not allowed.
+
+        The caller waiting for the in-flight command does not wait in the queue itself, so only the commands
+        with the same priority are coalesced and the command with the deadline is never coalesced. The key
+        contains the prompt and the mode at the call time, so no command is coalesced while the other thread
+        holds the device session in the admin mode.
+        """
+        if wait_for_string is not None or spill_threshold is not None:
+            # the spilled output object owns the temporary file and can't be shared
+            return None
+        if deadline is not None:
+            return None
+        cmd = normalize_command(cmd)
+        if not cmd:
+            return None
+        key = cmd, self.prompt, self.mode, priority, command_result
+        # the prompt and mode of the other thread's admin mode context do not apply to this command
+        if self._admin_owner not in (None, threading.current_thread()):
+            return None
+        return key
+
+    def send_stream(self, cmd="", timeout=None, wait_for_string=None, lines=False, priority=PRIORITY_NORMAL,
+                    deadline=None):
+        """Send the command to the device and return the iterator over the output.
+
+        Args:
+            cmd (str): Command string for execution. Defaults to empty string.
+            timeout (int): Timeout in seconds. If *None* the adaptive timeout is used. The time while the output
+                waits for the consumer is not counted.
+            wait_for_string (str): This is optional string that driver
+                waits for after command execution. If none the detected
+                prompt will be used.
+            lines (bool): If True the iterator returns the complete lines. Otherwise the chunks of text.
+            priority (int): The command priority class used when waiting for the device session.
+            deadline (float): Optional absolute time (as returned by time.time()) the command must be
+                completed by.
+
+        Returns:
+            The :class:`condoor.capture.OutputStream` iterator. The command is sent when the iteration starts.
+
+        Raises:
+            ConnectionError: General connection error during command execution
+            CommandSyntaxError: Command syntax error or unknown command.
+            CommandTimeoutError: Timeout during command execution
+            CommandError: The device session is held by the calling thread, i.e. in the admin mode.
+        """
+        if not self.connected:
+            raise ConnectionError("Device not connected", host=self.hostname)
+
+        if self.command_queue.held():
+            # the command is executed in the stream thread which would wait for the session forever
+            raise CommandError("Command streaming not supported while the device session is held, "
+                               "i.e. in the admin mode", host=self.hostname, command=cmd)
+
+        logger.debug("Streaming command: '{}'".format(cmd))
+        if timeout is None:
+            timeout = self._command_timeout(cmd)
+        return OutputStream(partial(self._execute_queued, cmd, timeout, wait_for_string, priority, deadline),
+                            lines=lines)
+
+    @contextmanager
+    def admin_mode(self, timeout=None):
+        """Enter the admin mode for the commands executed in the context and return to the previous mode at the end.
+
+        The device session is held by the calling thread for the whole context, so the commands from other threads
+        are not executed in the admin mode.
+
+        Args:
+            timeout (int): Timeout in seconds for entering and leaving the admin mode. If *None* the adaptive
+                timeout is used.
+
+        Raises:
+            CommandError: The admin mode not supported by the platform or not entered.
+        """
+        if self.mode == 'admin':
+            yield
+            return
+
+        if not self.connected:
+            raise ConnectionError("Device not connected", host=self.hostname)
+
+        if self.driver.admin_cmd is None:
+            raise CommandError("Admin mode not supported on {} platform".format(self.driver.platform),
+                               host=self.hostname)
+
+        prompt_re = self.prompt_re
+        self.command_queue.acquire(PRIORITY_NORMAL)
+        self._admin_owner = threading.current_thread()
         try:
+            self.send(self.driver.admin_cmd, timeout=timeout)
+            if self.mode != 'admin':
+                raise CommandError("Unable to enter admin mode", host=self.hostname, command=self.driver.admin_cmd)
+            logger.info("Admin mode entered: {}".format(self.driver.platform))
+            self.prepare_terminal_session()
+
+            completed = False
+            try:
+                yield
+                completed = True
+            finally:
+                if self.connected:
+                    try:
+                        self.send(self.driver.admin_exit_cmd, timeout=timeout, wait_for_string=prompt_re)
+                    except GeneralError as e:
+                        logger.error("Unable to exit admin mode: {}".format(e))
+                        # do not mask the exception raised within the context
+                        if completed:
+                            raise
+                    else:
+                        self.prompt_re = prompt_re
+                        logger.info("Admin mode exited: {}".format(self.driver.platform))
+        finally:
+            self._admin_owner = None
+            self.command_queue.release()
+
+    def _execute_queued(self, cmd, timeout, wait_for_string, priority, deadline, sink=None, **kwargs):
+        """Execute command when the device session is available."""
+        expected = 0
+        if deadline is not None:
+            # the median latency is the expected command run time
+            expected = latency.history.percentile(self._latency_key(), normalize_command(cmd), 50) or 0
+        if not self.command_queue.acquire(priority, deadline, expected):
+            raise CommandTimeoutError("Command can not complete before the deadline while waiting for the device "
+                                      "session", host=self.hostname, command=cmd)
+        try:
+            if deadline is not None:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    raise CommandTimeoutError("Deadline passed before command execution",
+                                              host=self.hostname, command=cmd)
+                timeout = min(timeout, remaining)
+            with self._operation(deadline):
+                return self.execute_command(cmd, timeout, wait_for_string, sink, **kwargs)
+        finally:
+            self.command_queue.release()
+
+    @contextmanager
+    def _operation(self, deadline):
+        """Run the operation within the controller budget, so it can be cancelled.
+
+        If the session was killed by the cancel request, the session to the device and all the jumphosts
+        is torn down before the operation ends.
+        """
+        with self.ctrl.budget(deadline):
+            try:
+                yield
+            except CancelledError:
+                if not self.ctrl.is_connected:
+                    logger.warning("Session killed on cancel. Disconnecting.")
+                    self.ctrl.disconnect()
+                    self.chain.tail_disconnect(-1)
+                raise
+
+    def execute_command(self, cmd, timeout, wait_for_string, sink=None, spill_threshold=None, command_result=False):
+        """Execute command.
+
+        If the sink is set the output is passed to the sink as it arrives. If the spill threshold is set and
+        the output is longer, the output is stored in the temporary file. If the command_result is True
+        the output is returned as :class:`condoor.result.CommandResult` object. If the driver supports it,
+        the command waiting for the prompt is framed with the sentinels marking the output start and end.
+        """
+        try:
+            start = time()
+            prompt_expected = wait_for_string is None
+            self.last_command = cmd
             self.last_command_result = None
-            self.ctrl.send_command(cmd)
+            frame = None
+            if wait_for_string is None and sink is None and spill_threshold is None:
+                frame = self.driver.frame_command(cmd)
+            self.ctrl.send_command(cmd if frame is None else frame[0])
             if wait_for_string is None:
                 wait_for_string = self.prompt_re
 
-            if not self.driver.wait_for_string(wait_for_string, timeout):
-                logger.error("Unexpected session disconnect during '{}' "
-                             "command execution".format(cmd))
-                raise ConnectionError("Unexpected session disconnect", host=self.hostname)
+            with self.ctrl.capture_output(sink, spill_threshold, pager=self.driver.more_re) as capture:
+                if frame is None:
+                    completed = self.driver.wait_for_string(wait_for_string, timeout)
+                else:
+                    completed = self.driver.wait_for_frame(frame, timeout)
+                if not completed:
+                    logger.error("Unexpected session disconnect during '{}' "
+                                 "command execution".format(cmd))
+                    raise ConnectionError("Unexpected session disconnect", host=self.hostname)
+
+            if frame is not None and not self.driver.framed_commands:
+                # the framed command line was rejected by the shell, the command is not sent again as it might
+                # have been executed
+                raise CommandError("Command framing not supported by the shell", host=self.hostname, command=cmd)
 
             if self.last_command_result:
                 output = self.last_command_result.replace('\r', '')
+                second_line_index = output.find('\n') + 1
+                output = output[second_line_index:]
             else:
-                output = self.ctrl.before.replace('\r', '')
-
-            second_line_index = output.find('\n') + 1
-            output = output[second_line_index:]
+                output = capture.getvalue(skip_first_line=True)
+
+            if prompt_expected:
+                latency.history.record(self._latency_key(), normalize_command(cmd), time() - start)
+            if command_result and not isinstance(output, MappedOutput):
+                output = CommandResult(output, command=cmd, prompt=self.ctrl.after, elapsed=time() - start,
+                                       pages=capture.pages + 1)
+            if capture.pages:
+                logger.debug("Command output received in {} pages".format(capture.pages + 1))
             return output
 
         except CommandSyntaxError as e:  # pylint: disable=invalid-name
@@ -257,7 +538,7 @@ class Device(object):
             logger.error("Command timeout: '{}'".format(cmd))
             raise CommandTimeoutError(message="Command timeout", host=self.hostname, command=cmd)
 
-        except ConnectionError as e:  # pylint: disable=invalid-name
+        except (ConnectionError, CommandError) as e:  # pylint: disable=invalid-name
             logger.error("{}: '{}'".format(e.message, cmd))
             raise
 
@@ -265,6 +546,10 @@ class Device(object):
             logger.error("Unexpected session disconnect")
             raise ConnectionError("Unexpected session disconnect", host=self.hostname)
 
+        except CancelledError:
+            logger.info("Command cancelled: '{}'".format(cmd))
+            raise
+
         except Exception as e:  # pylint: disable=invalid-name
             logger.critical("Exception", exc_info=True)
             raise ConnectionError(message="Unexpected error", host=self.hostname)
@@ -280,6 +565,12 @@ class Device(object):
             self.driver = self.make_driver(driver_name)
             logger.debug("{}".format(self.driver.platform))
             self.make_dynamic_prompt(self.prompt)
+            self._update_message_pattern()
+
+    def _update_message_pattern(self):
+        """Set the asynchronous message pattern of the target device driver in the session demultiplexer."""
+        if self.is_target and self.ctrl is not None:
+            self.ctrl.demux.pattern = self.driver.async_message_re
 
     def make_driver(self, driver_name='generic'):
         """Factory function to make driver."""
@@ -296,6 +587,23 @@ class Device(object):
         logger.debug("Make Device: {} with Driver: {}".format(self, driver_class.platform))
         return driver_class(self)
 
+    def _latency_key(self):
+        """Return the latency history key for the commands or None if the platform is not known."""
+        return latency.command_key(self.platform, self.os_version)
+
+    def _hop_latency_key(self):
+        """Return the latency history key for the connection to the device."""
+        devices = self.chain.devices
+        return latency.hop_key([device.node_info for device in devices[:devices.index(self) + 1]])
+
+    def connect_timeout(self, default):
+        """Return the adaptive connection timeout derived from the connection latency history.
+
+        Args:
+            default (int): The timeout in seconds used if there is not enough history.
+        """
+        return latency.history.timeout(self._hop_latency_key(), latency.CONNECT, default)
+
     def get_previous_prompts(self):
         """Return list of prompts from all devices except target."""
         return self.chain.get_previous_prompts(self)
@@ -379,6 +687,15 @@ class Device(object):
         """Update hostname."""
         self.hostname = self.driver.update_hostname(self.prompt)
 
+    def update_prompt(self, prompt):
+        """Update driver, config mode and hostname if the prompt changed since the last update."""
+        if self.prompt == prompt and self._prompt_state == (prompt, self.driver.platform):
+            return
+        self.update_driver(prompt)
+        self.update_config_mode()
+        self.update_hostname()
+        self._prompt_state = (prompt, self.driver.platform)
+
     def update_driver(self, prompt):
         """Update driver based on new prompt."""
         logger.debug("{}: New prompt '{}'".format(self.driver.platform, prompt))
@@ -386,9 +703,15 @@ class Device(object):
         self.driver_name = self.driver.update_driver(prompt)
 
     def prepare_terminal_session(self):
-        """Send commands to prepare terminal session configuration."""
+        """Send commands to prepare terminal session configuration.
+
+        The command not supported by the device is skipped and the remaining ones are sent.
+        """
         for cmd in self.driver.prepare_terminal_session:
-            self.send(cmd)
+            try:
+                self.send(cmd)
+            except CommandSyntaxError:
+                logger.debug("Terminal session command not supported: {}".format(cmd))
 
     def update_os_type(self):
         """Update os_type attribute."""
@@ -432,13 +755,34 @@ class Device(object):
         """Set privilege mode."""
         self.driver.enable(enable_password)
 
-    def reload(self, reload_timeout, save_config, no_reload_cmd):
-        """Reload device."""
-        if not no_reload_cmd:
-            self.ctrl.send_command(self.driver.reload_cmd)
-        self.driver.reload(reload_timeout, save_config)
+    def reload(self, reload_timeout, save_config, no_reload_cmd, deadline=None):
+        """Reload device.
+
+        The device session is held for the whole reload, so the commands from other threads wait until
+        the device is reconnected.
+
+        Args:
+            reload_timeout (int): The timeout for the device to boot up.
+            save_config (bool): If True the configuration is saved before reload.
+            no_reload_cmd (bool): If True the reload command is not sent.
+            deadline (float): Optional absolute time (as returned by time.time()) the reload and reconnect must be
+                completed by. The timeout of every FSM state is limited to the time left.
+
+        Raises:
+            ConnectionTimeoutError: The deadline passed.
+        """
+        with self.command_queue, self._operation(deadline):
+            try:
+                if not no_reload_cmd:
+                    self.ctrl.send_command(self.driver.reload_cmd)
+                self.driver.reload(reload_timeout, save_config)
+            except (pexpect.TIMEOUT, CommandTimeoutError):
+                if deadline is None or time() < deadline:
+                    raise
+                raise ConnectionTimeoutError("Reload deadline exceeded", host=self.hostname)
 
     def run_fsm(self, name, command, events, transitions, timeout, max_transitions=20):
         """Wrap the FSM code."""
-        self.ctrl.send_command(command)
-        return FSM(name, self, events, transitions, timeout=timeout, max_transitions=max_transitions).run()
+        with self.command_queue, self._operation(None):
+            self.ctrl.send_command(command)
+            return FSM(name, self, events, transitions, timeout=timeout, max_transitions=max_transitions).run()
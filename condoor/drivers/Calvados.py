@@ -15,6 +15,12 @@ class Driver(Generic):
     inventory_cmd = 'show inventory chassis'
     target_prompt_components = ['prompt_dynamic', 'prompt_default', 'exr', 'windriver']
     prepare_terminal_session = ['terminal len 0', 'terminal width 0']
+    output_filters = {
+        'include': '| include {}',
+        'exclude': '| exclude {}',
+        'begin': '| begin {}',
+    }
+    output_filters_chained = True
     families = {
         "ASR9K": "ASR9K",
         "ASR-9": "ASR9K",
@@ -25,8 +25,16 @@ class Driver(Generic):
     users_cmd = 'show users'
     enable_cmd = 'enable'
     reload_cmd = 'reload'
+    # Ctrl-^ (Ctrl-Shift-6) escape sequence
+    break_sequence = '\x1e'
     target_prompt_components = ['prompt_dynamic', 'prompt_default', 'rommon']
     prepare_terminal_session = ['terminal len 0', 'terminal width 0']
+    output_filters = {
+        'include': '| include {}',
+        'exclude': '| exclude {}',
+        'begin': '| begin {}',
+        'section': '| section {}',
+    }
     families = {
         'A9': 'ASR900',
     }
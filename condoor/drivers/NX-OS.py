@@ -16,6 +16,13 @@ class Driver(Generic):
     users_cmd = 'show users'
     target_prompt_components = ['prompt_dynamic', 'prompt_default', 'rommon']
     prepare_terminal_session = ['terminal len 0', 'terminal width 511']
+    output_filters = {
+        'include': '| grep {}',
+        'exclude': '| exclude {}',
+        'begin': '| begin {}',
+        'section': '| section {}',
+    }
+    output_filters_chained = True
     # N9K-C9508
     families = {
         "Nexus9": "N9K",
@@ -1,6 +1,7 @@
 """This is a Wind River Linux driver implementation."""
 
 import logging
+from pipes import quote
 from condoor.drivers.generic import Driver as Generic
 
 logger = logging.getLogger(__name__)
@@ -13,6 +14,11 @@ class Driver(Generic):
     inventory_cmd = None
     target_prompt_components = ['prompt_dynamic', 'prompt_default', 'calvados', 'lc']
     prepare_terminal_session = []
+    output_filters = {
+        'include': '| grep -E -e {}',
+        'exclude': '| grep -v -E -e {}',
+    }
+    output_filters_chained = True
     families = {
     }
 
@@ -28,3 +34,7 @@ class Driver(Generic):
     def get_os_type(self, version_text):
         """Return Windriver os type."""
         return 'Windriver'
+
+    def quote_filter_pattern(self, pattern):
+        """Return the filter pattern quoted for the shell."""
+        return quote(pattern)
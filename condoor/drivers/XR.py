@@ -20,6 +20,14 @@ class Driver(Generic):
     users_cmd = 'show users'
     target_prompt_components = ['prompt_dynamic', 'prompt_default', 'rommon', 'xml']
     prepare_terminal_session = ['terminal exec prompt no-timestamp', 'terminal len 0', 'terminal width 0']
+    output_filters = {
+        'include': '| include {}',
+        'exclude': '| exclude {}',
+        'begin': '| begin {}',
+        'section': '| section {}',
+    }
+    output_filters_chained = True
+    admin_cmd = 'admin'
     reload_cmd = 'admin reload location all'
     families = {
         "ASR9K": "ASR9K",
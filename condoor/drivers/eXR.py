@@ -11,6 +11,7 @@ from condoor.actions import a_connection_closed, a_expected_prompt, a_stays_conn
 from condoor.utils import pattern_to_str
 from condoor.fsm import FSM
 from condoor.drivers.generic import Driver as Generic
+from condoor.scheduler import normalize_command
 from condoor import pattern_manager, EOF
 from condoor.config import CONF
 
@@ -27,6 +28,14 @@ class Driver(Generic):
     users_cmd = 'show users'
     target_prompt_components = ['prompt_dynamic', 'prompt_default', 'rommon', 'xml']
     prepare_terminal_session = ['terminal exec prompt no-timestamp', 'terminal len 0', 'terminal width 0']
+    output_filters = {
+        'include': '| include {}',
+        'exclude': '| exclude {}',
+        'begin': '| begin {}',
+        'section': '| section {}',
+    }
+    output_filters_chained = True
+    admin_cmd = 'admin'
     reload_cmd = 'admin hw-module location all reload'
     families = {
         "ASR9K": "ASR9K",
@@ -83,6 +92,12 @@ class Driver(Generic):
         logger.debug("Expecting: {}".format(pattern_to_str(expected_string)))
         logger.debug("Calvados prompt: {}".format(pattern_to_str(self.calvados_re)))
 
+        # The 'admin' command switches to the Calvados prompt. The 'admin <command>' executes the command
+        # in Calvados and returns to XR. The latter is marked by the 'terminal length 0' echoed
+        # after the Calvados prompt.
+        calvados_shell = self.device.last_command is not None and \
+            normalize_command(self.device.last_command) == "admin"
+
         transitions = [
             (self.syntax_error_re, [0], -1, CommandSyntaxError("Command unknown", self.device.hostname), 0),
             (self.connection_closed_re, [0], 1, a_connection_closed, 10),
@@ -94,11 +109,12 @@ class Driver(Generic):
             (self.press_return_re, [0], -1, a_stays_connected, 0),
             (self.calvados_connect_re, [0], 2, None, 0),
             # admin command to switch to calvados
-            (self.calvados_re, [2], 3, None, _C['calvados_term_wait_time']),
-            # getting the prompt only
-            (pexpect.TIMEOUT, [3], 0, partial(a_send, "\r"), 0),
+            (self.calvados_re, [2], -1 if calvados_shell else 3, a_expected_prompt if calvados_shell else None,
+             0 if calvados_shell else _C['calvados_term_wait_time']),
+            # no term len received, getting the prompt only
+            (pexpect.TIMEOUT, [3], 0, partial(a_send, "\r"), timeout),
             # term len
-            (self.calvados_term_length, [3], 4, None, 0),
+            (self.calvados_term_length, [3], 4, None, timeout),
             # ignore for command start
             (self.calvados_re, [4], 5, None, 0),
             # ignore for command start
@@ -23,33 +23,44 @@ class Driver(object):
     users_cmd = None
     target_prompt_components = ['prompt_dynamic']
     prepare_terminal_session = ['terminal len 0']
+    # device side output filters: filter name -> command suffix template
+    output_filters = {}
+    # True if the device accepts multiple output filters in one command
+    output_filters_chained = False
+    # commands entering and leaving the admin mode or None if not supported
+    admin_cmd = None
+    admin_exit_cmd = 'exit'
+    # the characters interrupting the running command
+    break_sequence = '\x03'
     families = {}
 
     def __init__(self, device):
         """Initialize the Driver object."""
         self.device = device
 
-        # FIXME: Do something with this, it's insane
-        self.prompt_re = pattern_manager.pattern(self.platform, 'prompt')
-        self.syntax_error_re = pattern_manager.pattern(self.platform, 'syntax_error')
-        self.connection_closed_re = pattern_manager.pattern(self.platform, 'connection_closed')
-        self.press_return_re = pattern_manager.pattern(self.platform, 'press_return')
-        self.more_re = pattern_manager.pattern(self.platform, 'more')
-        self.rommon_re = pattern_manager.pattern(self.platform, 'rommon')
-        self.buffer_overflow_re = pattern_manager.pattern(self.platform, 'buffer_overflow')
-
-        self.username_re = pattern_manager.pattern(self.platform, 'username')
-        self.password_re = pattern_manager.pattern(self.platform, 'password')
-        self.authentication_error_re = pattern_manager.pattern(self.platform, 'authentication_error')
-        self.unable_to_connect_re = pattern_manager.pattern(self.platform, 'unable_to_connect')
-        self.timeout_re = pattern_manager.pattern(self.platform, 'timeout')
-        self.standby_re = pattern_manager.pattern(self.platform, 'standby')
-
-        self.pid2platform_re = pattern_manager.pattern(self.platform, 'pid2platform')
-        self.platform_re = pattern_manager.pattern(self.platform, 'platform', compiled=False)
-        self.version_re = pattern_manager.pattern(self.platform, 'version', compiled=False)
-        self.vty_re = pattern_manager.pattern(self.platform, 'vty')
-        self.console_re = pattern_manager.pattern(self.platform, 'console')
+        patterns = pattern_manager.bundle(self.platform)
+        self.prompt_re = patterns.prompt
+        self.syntax_error_re = patterns.syntax_error
+        self.connection_closed_re = patterns.connection_closed
+        self.press_return_re = patterns.press_return
+        self.more_re = patterns.more
+        self.async_message_re = patterns.async_message
+        self.rommon_re = patterns.rommon
+        self.buffer_overflow_re = patterns.buffer_overflow
+
+        self.username_re = patterns.username
+        self.password_re = patterns.password
+        self.authentication_error_re = patterns.authentication_error
+        self.unable_to_connect_re = patterns.unable_to_connect
+        self.timeout_re = patterns.timeout
+        self.standby_re = patterns.standby
+
+        self.pid2platform_re = patterns.pid2platform
+        self.platform_re = patterns.platform
+        self.version_re = patterns.version
+        self.vty_re = patterns.vty
+        self.console_re = patterns.console
+        self.base_prompt_re = patterns.base_prompt
 
     def __repr__(self):
         """Return the string representation of the driver class."""
@@ -274,15 +285,51 @@ class Driver(object):
         """Execute right after connecting to the device."""
         pass
 
+    def frame_command(self, cmd):  # pylint: disable=no-self-use,unused-argument
+        """Return the command framed with the sentinels or None if the driver does not frame the commands."""
+        return None
+
+    def wait_for_frame(self, frame, timeout=60):
+        """Wait for the framed command output. Refer to :meth:`frame_command`.
+
+        The driver not framing the commands waits for the prompt.
+        """
+        return self.wait_for_string(self.device.prompt_re, timeout)
+
+    def quote_filter_pattern(self, pattern):  # pylint: disable=no-self-use
+        """Return the filter pattern in the form accepted by the device."""
+        return pattern
+
+    def filter_command(self, cmd, filters):
+        """Append the output filters supported by the device to the command.
+
+        The filters are applied in order. If the filter is not supported by the device, this filter and all the
+        following filters must be applied to the output locally.
+
+        Args:
+            cmd (str): The command string.
+            filters (list): The list of (filter name, pattern) tuples. The filter names are: ``include``,
+                ``exclude``, ``begin`` and ``section``.
+
+        Returns:
+            The tuple of the command with the device side filters appended and the list of remaining filters.
+        """
+        used = 1 if '|' in cmd else 0
+        for index, (name, pattern) in enumerate(filters):
+            template = self.output_filters.get(name, None)
+            if template is None or (used and not self.output_filters_chained) or '\n' in pattern:
+                return cmd, list(filters[index:])
+            cmd = "{} {}".format(cmd, template.format(self.quote_filter_pattern(pattern)))
+            used += 1
+        return cmd, []
+
     def base_prompt(self, prompt):
         """Extract the base prompt pattern."""
         if prompt is None:
             return None
         if not self.device.is_target:
             return prompt
-        pattern = pattern_manager.pattern(self.platform, "prompt_dynamic", compiled=False)
-        pattern = pattern.format(prompt="(?P<prompt>.*?)")
-        result = re.search(pattern, prompt)
+        result = self.base_prompt_re.search(prompt)
         if result:
             base = result.group("prompt") + "#"
             logger.debug("base prompt: {}".format(base))
@@ -293,16 +340,7 @@ class Driver(object):
 
     def make_dynamic_prompt(self, prompt):
         """Extend prompt with flexible mode handling regexp."""
-        patterns = [pattern_manager.pattern(
-            self.platform, pattern_name, compiled=False) for pattern_name in self.target_prompt_components]
-
-        patterns_re = "|".join(patterns).format(prompt=re.escape(prompt[:-1]))
-
-        try:
-            prompt_re = re.compile(patterns_re)
-        except re.error as e:  # pylint: disable=invalid-name
-            raise RuntimeError("Pattern compile error: {} ({}:{})".format(e.message, self.platform, patterns_re))
-
+        prompt_re = pattern_manager.dynamic_prompt(self.platform, self.target_prompt_components, prompt[:-1])
         logger.debug("Platform: {} -> Dynamic prompt: '{}'".format(self.platform, prompt_re.pattern))
         return prompt_re
 
@@ -2,12 +2,40 @@
 
 import re
 import logging
+from itertools import count
+from pipes import quote
+from time import time
+from uuid import uuid4
 
+import pexpect
+
+from condoor.actions import a_connection_closed, a_unexpected_prompt, a_store_frame_result, a_frame_not_supported
+from condoor.config import CONF
 from condoor.drivers.generic import Driver as Generic
+from condoor.exceptions import CommandSyntaxError, CommandTimeoutError, ConnectionError
+from condoor.fsm import FSM
+from condoor.protocols.ssh import SSH
+from condoor.utils import LRUCache
 from condoor import pattern_manager, CommandError
 
 logger = logging.getLogger(__name__)
 
+_C = CONF['protocol']['ssh']
+
+# exit status of the shell command not found
+_COMMAND_NOT_FOUND = 127
+
+VERSION_CMD = 'uname -sr; hostname'
+
+# the commands starting the interactive session or leaving the shell are not framed as the end sentinel
+# would not be printed until the session ends
+_UNFRAMED_RE = re.compile(r"(?:^|[;&|(`]|\$\()\s*(?:(?:sudo|exec|nohup|env|command|time)(?:\s+-\S+)*\s+)*"
+                          r"(?:su|sudo\s+-[is]|bash|sh|dash|zsh|ksh|csh|tcsh|fish|ssh|telnet|rlogin|screen|tmux|"
+                          r"exit|logout)(?![\w.-])")
+
+# version command output collected over the SSH exec channel per (hostname, port, username)
+exec_cache = LRUCache()
+
 
 class Driver(Generic):
     """This is a Driver class implementation for Unix Jumphost."""
@@ -16,16 +44,149 @@ class Driver(Generic):
     inventory_cmd = None
     target_prompt_components = ['prompt_dynamic']
     prepare_terminal_session = []
+    output_filters = {
+        'include': '| grep -E -e {}',
+        'exclude': '| grep -v -E -e {}',
+    }
+    output_filters_chained = True
+    # frame the commands with the start and end sentinels. None until the shell is checked after connect
+    framed_commands = None
 
     def __init__(self, device):
         """Initialize the Unix Jumphost driver object."""
         super(Driver, self).__init__(device)
+        self._sentinel_prefix = "__CONDOOR_{}".format(uuid4().hex[:8])
+        self._sentinel_ids = count(1)
+        self._hostname_text = None
+
+    def after_connect(self):
+        """Check once if the shell supports the command framing with the harmless command."""
+        if self.framed_commands is not None:
+            return
+        self.framed_commands = True
+        try:
+            self.device.send("true")
+        except CommandError as e:  # pylint: disable=invalid-name
+            logger.warning("Command framing disabled: {}".format(e))
+            self.framed_commands = False
+        else:
+            logger.debug("Command framing supported by the shell")
+
+    def frame_command(self, cmd):
+        """Return the command framed with the start and end sentinels.
+
+        The sentinels are split with the empty quotes in the command line, so the command echo does not match them.
+        The command is grouped and the end sentinel follows the line end, so the comment or the trailing ``;``
+        or ``&`` in the command do not break the framing. The end sentinel carries the command exit status.
+        The multi line commands and the commands starting the interactive session, i.e. ``su -``, ``bash``
+        or ``ssh host`` are not framed.
+
+        Returns:
+            The tuple of the framed command line, the start sentinel pattern and the end sentinel pattern
+            or None if the command is not framed.
+        """
+        if not self.framed_commands or not cmd.strip() or '\n' in cmd or _UNFRAMED_RE.search(cmd):
+            return None
+        sentinel_id = next(self._sentinel_ids)
+        line = 'echo {0}_B""{1}__; {{ {2}\n}}; echo {0}_E""{1}__ $?'.format(self._sentinel_prefix, sentinel_id, cmd)
+        start_re = re.compile("{}_B{}__".format(self._sentinel_prefix, sentinel_id))
+        end_re = re.compile(r"{}_E{}__ (\d+)".format(self._sentinel_prefix, sentinel_id))
+        return line, start_re, end_re
+
+    def wait_for_frame(self, frame, timeout=60):
+        """Wait for the framed command output.
+
+        The command is completed when the end sentinel is received, so the prompt like characters in the output
+        do not end the command. If the prompt is received before the start sentinel the framing is disabled.
+
+        Args:
+            frame (tuple): The tuple returned by :meth:`frame_command`.
+            timeout (int): Timeout in seconds.
+
+        Raises:
+            CommandSyntaxError: The command not found.
+        """
+        _, start_re, end_re = frame
+        end_time = time() + timeout
+        self.device.last_exit_status = None
+
+        events = [start_re, self.device.prompt_re, self.connection_closed_re, pexpect.TIMEOUT, pexpect.EOF]
+        events += self.device.get_previous_prompts()
+        transitions = [
+            (start_re, [0], -1, None, 0),
+            (self.device.prompt_re, [0], -1, a_frame_not_supported, 0),
+            (self.connection_closed_re, [0], 1, a_connection_closed, 10),
+            (pexpect.TIMEOUT, [0], -1, CommandTimeoutError("Timeout waiting for command", self.device.hostname), 0),
+            (pexpect.EOF, [0, 1], -1, ConnectionError("Unexpected device disconnect", self.device.hostname), 0),
+        ]
+        for prompt in self.device.get_previous_prompts():
+            transitions.append((prompt, [0], -1, a_unexpected_prompt, 0))
+        if not FSM("WAIT-4-START", self.device, events, transitions, timeout=timeout).run():
+            return False
+        if not self.framed_commands:
+            return True
+
+        # only the end sentinel completes the output
+        events = [end_re, pexpect.TIMEOUT, pexpect.EOF]
+        transitions = [
+            (end_re, [0], -1, a_store_frame_result, 0),
+            (pexpect.TIMEOUT, [0], -1, CommandTimeoutError("Timeout waiting for command", self.device.hostname), 0),
+            (pexpect.EOF, [0], -1, ConnectionError("Unexpected device disconnect", self.device.hostname), 0),
+        ]
+        if not FSM("WAIT-4-END", self.device, events, transitions, timeout=max(end_time - time(), 1)).run():
+            return False
+
+        if not self.wait_for_string(self.device.prompt_re, timeout=max(end_time - time(), 1)):
+            return False
+
+        if self.device.last_exit_status == _COMMAND_NOT_FOUND:
+            raise CommandSyntaxError("Command unknown", self.device.hostname)
+        return True
 
     def get_version_text(self):
-        """Return the version information from Unix host."""
-        version_text = self.device.send('uname -sr', timeout=10)
+        """Return the version information from Unix host.
+
+        The hostname is collected in the same call and returned by :meth:`get_hostname_text`.
+        """
+        version_text = self._exec_version_text()
+        if version_text is None:
+            version_text = self.device.send(VERSION_CMD, timeout=10)
+        lines = version_text.splitlines()
+        if len(lines) == 2:
+            version_text, self._hostname_text = lines
         return version_text
 
+    def _exec_version_text(self):
+        """Return the version command output collected over the SSH exec channel or None.
+
+        The exec channel is used if enabled in the configuration and the jumphost is the first hop connected
+        with SSH, so the separate ssh session can be started locally. The successful result is cached
+        per jumphost and reused by all the following connections.
+        """
+        if not _C['exec_discovery'] or not isinstance(self.device.protocol, SSH) or \
+                self.device.chain.devices[0] is not self.device:
+            return None
+
+        node_info = self.device.node_info
+        key = (node_info.hostname, node_info.port, node_info.username)
+        version_text = exec_cache.get(key)
+        if version_text is not None:
+            logger.debug("Version info reused from SSH exec channel cache")
+            return version_text
+
+        result = self.device.protocol.execute(VERSION_CMD, timeout=_C['exec_timeout'])
+        if result is None or result[1] != 0:
+            logger.debug("Version info not collected over SSH exec channel")
+            return None
+
+        version_text = result[0]
+        exec_cache.put(key, version_text)
+        return version_text
+
+    def quote_filter_pattern(self, pattern):
+        """Return the filter pattern quoted for the shell."""
+        return quote(pattern)
+
     def update_hostname(self, prompt):
         """Return the hostname."""
         return self.device.hostname
@@ -34,7 +195,7 @@ class Driver(Generic):
         """Return hostname information from the Unix host."""
         # FIXME: fix it, too complex logic
         try:
-            hostname_text = self.device.send('hostname', timeout=10)
+            hostname_text = self._hostname_text or self.device.send('hostname', timeout=10)
             if hostname_text:
                 self.device.hostname = hostname_text.splitlines()[0]
                 return hostname_text
@@ -43,15 +204,6 @@ class Driver(Generic):
 
     def make_dynamic_prompt(self, prompt):
         """Extend prompt with flexible mode handling regexp."""
-        patterns = [pattern_manager.pattern(
-            self.platform, pattern_name, compiled=False) for pattern_name in self.target_prompt_components]
-
-        patterns_re = "|".join(patterns).format(prompt=re.escape(prompt))
-
-        try:
-            prompt_re = re.compile(patterns_re)
-        except re.error as e:  # pylint: disable=invalid-name
-            raise RuntimeError("Pattern compile error: {} ({}:{})".format(e.message, self.platform, patterns_re))
-
+        prompt_re = pattern_manager.dynamic_prompt(self.platform, self.target_prompt_components, prompt)
         logger.debug("Dynamic prompt: '{}'".format(prompt_re.pattern))
         return prompt_re
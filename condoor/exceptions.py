@@ -46,6 +46,18 @@ class ConnectionTimeoutError(ConnectionError):
     pass
 
 
+class CircuitOpenError(ConnectionError):
+    """Connection not attempted. The circuit breaker is open after the recent connection failures."""
+
+    pass
+
+
+class CancelledError(GeneralError):
+    """Operation cancelled."""
+
+    pass
+
+
 class CommandError(GeneralError):
     """Command execution error."""
 
@@ -0,0 +1,150 @@
+"""Provides the latency history and the adaptive timeouts derived from it."""
+
+import logging
+import threading
+from math import ceil
+
+from condoor.config import CONF
+
+logger = logging.getLogger(__name__)
+
+_C = CONF['adaptive_timeout']
+
+_KEY_PREFIX = "latency:"
+
+# the latency sample name of the connection to the hop
+CONNECT = 'connect'
+
+
+def command_key(platform, os_version):
+    """Return the history key for the commands of the platform and software version or None if not known."""
+    if platform is None:
+        return None
+    return "{}{}:{}".format(_KEY_PREFIX, platform, os_version)
+
+
+def hop_key(hops):
+    """Return the history key for the connection to the last hop on the path.
+
+    Args:
+        hops (list): The list of HopInfo objects on the path up to and including the hop.
+    """
+    return _KEY_PREFIX + "".join("/{}:{}".format(hop.hostname, hop.port) for hop in hops)
+
+
+class LatencyHistory(object):
+    """The command and connection latency history used to derive the adaptive timeouts.
+
+    The latency samples are kept per history key (the platform and software version or the hop) and the sample
+    name (the normalized command or ``connect``). The adaptive timeout is the 99th percentile of the recent
+    samples multiplied by the *factor* and limited by the *floor* and the *ceiling*. If there are less than
+    *min_samples* samples the default timeout is used.
+
+    The history is stored in the persistent cache. The records are loaded once and the new samples are merged
+    with the stored ones when saved, so the concurrent processes do not lose each other samples.
+    """
+
+    def __init__(self, enabled=True, factor=3, floor=10, ceiling=3600, min_samples=10, size=100):
+        """Initialize the LatencyHistory object.
+
+        Args:
+            enabled (bool): If False the default timeouts are used and no samples are recorded.
+            factor (float): The 99th percentile multiplier.
+            floor (float): The minimum adaptive timeout in seconds.
+            ceiling (float): The maximum adaptive timeout in seconds.
+            min_samples (int): Minimum number of samples required for the adaptive timeout.
+            size (int): Number of recent samples kept per command.
+        """
+        self.enabled = enabled
+        self.factor = factor
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.size = size
+        self._lock = threading.Lock()
+        self._records = {}
+        self._new = {}
+        self._loaded = set()
+
+    def load(self, cache_open, keys):
+        """Load the history records not loaded yet from the persistent cache.
+
+        Args:
+            cache_open (callable): The function called with the *mode* argument returning the open shelve
+                object or *None* if the cache is not available.
+            keys (list): The history keys. The *None* keys are ignored.
+        """
+        keys = [key for key in set(keys) if key is not None and key not in self._loaded]
+        if not self.enabled or not keys:
+            return
+        cache = cache_open(mode='c')
+        if cache is None:
+            return
+        try:
+            for key in keys:
+                stored = cache.get(key, {})
+                with self._lock:
+                    record = self._records.setdefault(key, {})
+                    for name, samples in stored.items():
+                        record[name] = (samples + record.get(name, []))[-self.size:]
+                    self._loaded.add(key)
+        finally:
+            cache.close()
+
+    @property
+    def changed(self):
+        """Return True if there are new samples not saved yet."""
+        with self._lock:
+            return bool(self._new)
+
+    def save(self, cache_open):
+        """Merge the new samples with the records stored in the persistent cache."""
+        with self._lock:
+            new, self._new = self._new, {}
+        if not new:
+            return
+        cache = cache_open(mode='c')
+        if cache is None:
+            return
+        try:
+            for key, names in new.items():
+                stored = cache.get(key, {})
+                for name, samples in names.items():
+                    stored[name] = (stored.get(name, []) + samples)[-self.size:]
+                cache[key] = stored
+        finally:
+            cache.close()
+
+    def record(self, key, name, elapsed):
+        """Record the latency sample in seconds."""
+        if not self.enabled or key is None:
+            return
+        with self._lock:
+            samples = self._records.setdefault(key, {}).setdefault(name, [])
+            samples.append(elapsed)
+            del samples[:-self.size]
+            self._new.setdefault(key, {}).setdefault(name, []).append(elapsed)
+
+    def percentile(self, key, name, percent=99):
+        """Return the latency percentile in seconds or None if there are no samples."""
+        with self._lock:
+            samples = sorted(self._records.get(key, {}).get(name, []))
+        if not samples:
+            return None
+        return samples[max(0, int(ceil(percent / 100.0 * len(samples))) - 1)]
+
+    def timeout(self, key, name, default):
+        """Return the adaptive timeout in seconds or the default if there are not enough samples."""
+        if not self.enabled or key is None:
+            return default
+        with self._lock:
+            count = len(self._records.get(key, {}).get(name, []))
+        if count < self.min_samples:
+            return default
+        timeout = min(self.ceiling, max(self.floor, self.percentile(key, name) * self.factor))
+        logger.debug("Adaptive timeout for '{}': {:.1f}s".format(name, timeout))
+        return timeout
+
+
+# the history shared by all the connections
+history = LatencyHistory(**_C)
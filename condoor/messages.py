@@ -0,0 +1,133 @@
+"""Provides the demultiplexer separating the asynchronous console messages from the session output."""
+
+import re
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Maximum length of the incomplete message line held back waiting for the line end
+MAX_PENDING = 4096
+
+
+class Subscription(object):
+    """The subscription to the asynchronous messages, i.e. syslog messages printed on the console."""
+
+    def __init__(self, callback, pattern=None):
+        """Initialize the Subscription object.
+
+        Args:
+            callback (callable): The function called with the message text without the line end characters.
+            pattern: Optional regular expression string or compiled pattern. If set only the messages matching
+                the pattern are delivered.
+        """
+        self.callback = callback
+        self.pattern = re.compile(pattern) if isinstance(pattern, basestring) else pattern
+        self.count = 0
+
+    def deliver(self, message):
+        """Call the callback if the message matches the subscription pattern."""
+        if self.pattern is None or self.pattern.search(message):
+            self.count += 1
+            self.callback(message)
+
+
+class MessageDemux(object):
+    """Remove the asynchronous messages from the session output and publish them to the subscribers.
+
+    The message is the complete line matching the platform message pattern (``async_message`` in patterns.yaml).
+    The line is recognized as the message once its header matching the pattern is received. The incomplete
+    message line is held back until the line end is received, so the partial message is not seen by the expect
+    engine. The text of the line not matching the pattern passes unchanged.
+    If the pattern is *None* the output is not changed.
+    """
+
+    def __init__(self, pattern=None, max_pending=MAX_PENDING):
+        """Initialize the MessageDemux object.
+
+        Args:
+            pattern (re): The compiled message pattern matched at the line start or *None*.
+            max_pending (int): Maximum length of the incomplete message held back. The longer text is passed
+                as the regular output.
+        """
+        self.pattern = pattern
+        self.max_pending = max_pending
+        self.count = 0
+        self._pending = ''
+        self._line_start = True
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Clear the pattern and the incomplete message, i.e. when the session is spawned to the next hop."""
+        self.pattern = None
+        self._pending = ''
+        self._line_start = True
+
+    def subscribe(self, subscription):
+        """Add the subscription."""
+        with self._lock:
+            self._subscriptions.append(subscription)
+
+    def unsubscribe(self, subscription):
+        """Remove the subscription."""
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def feed(self, text):
+        """Return the text with the complete message lines removed and publish the messages."""
+        if self._pending:
+            text = self._pending + text
+            self._pending = ''
+            line_start = True
+        elif self.pattern is None or not text:
+            if text:
+                self._line_start = text.endswith('\n')
+            return text
+        else:
+            line_start = self._line_start
+
+        output = []
+        messages = []
+        position = 0
+        for match in self.pattern.finditer(text):
+            start = match.start()
+            if start < position or (start == 0 and not line_start):
+                continue
+            end = text.find('\n', match.end())
+            if end < 0:
+                if len(text) - start <= self.max_pending:
+                    # wait for the message end
+                    output.append(text[position:start])
+                    self._pending = text[start:]
+                    position = len(text)
+                break
+            output.append(text[position:start])
+            messages.append(text[start:end].rstrip('\r'))
+            position = end + 1
+
+        output.append(text[position:])
+        if self._pending:
+            self._line_start = True
+        elif position < len(text):
+            self._line_start = text.endswith('\n')
+        else:
+            self._line_start = True
+
+        if messages:
+            self._publish(messages)
+        return "".join(output)
+
+    def _publish(self, messages):
+        """Deliver the messages to the subscribers."""
+        self.count += len(messages)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for message in messages:
+            logger.debug("Async message: {}".format(message))
+            for subscription in subscriptions:
+                try:
+                    subscription.deliver(message)
+                except Exception:  # pylint: disable=broad-except
+                    logger.error("Async message subscriber error", exc_info=True)
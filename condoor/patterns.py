@@ -2,64 +2,93 @@
 
 import os
 import re
-from utils import yaml_file_to_dict
+import logging
+from collections import namedtuple
+from utils import yaml_file_to_dict, LRUCache, strip_named_groups
+
+logger = logging.getLogger(__name__)
+
+# The patterns used by every driver. The text patterns are used by re.search with the additional flags.
+_BUNDLE_COMPILED = ('prompt', 'syntax_error', 'connection_closed', 'press_return', 'more', 'rommon',
+                    'buffer_overflow', 'username', 'password', 'authentication_error', 'unable_to_connect',
+                    'timeout', 'standby', 'pid2platform', 'vty', 'console', 'async_message')
+_BUNDLE_TEXT = ('platform', 'version')
+
+_NOT_CACHED = object()
+
+
+class PatternBundle(namedtuple('PatternBundle', _BUNDLE_COMPILED + _BUNDLE_TEXT + ('base_prompt', ))):
+    """Immutable set of the patterns for the specific platform shared by all the driver instances.
+
+    The *base_prompt* is the compiled ``prompt_dynamic`` pattern extracting the base prompt.
+    """
+
+    __slots__ = ()
 
 
 class PatternManager(object):
     """Provides API to patterns defined externally."""
 
     def __init__(self, pattern_dict):
-        """Initialize PatternManager object."""
+        """Initialize PatternManager object.
+
+        The patterns are compiled on the first use.
+        """
         self._dict = pattern_dict
-        self._dict_compiled, self._dict_text, self._dict_dscr = self._prepare_patterns(pattern_dict)
+        self._dict_text, self._dict_dscr = self._prepare_patterns(pattern_dict)
+        self._dict_compiled = {}
+        self._bundles = {}
+        self.dynamic_prompt_cache = LRUCache(maxsize=256)
+        self._platform_re = None
+        self.platform_cache = LRUCache(maxsize=256)
 
     def _prepare_patterns(self, pattern_dict):
-        """Return two dictionaries: compiled and text prompts."""
-        dict_compiled = {}
+        """Return two dictionaries: text prompts and descriptions."""
         dict_text = {}
         dict_dscr = {}
         for platform, patterns in pattern_dict.items():
             dict_text[platform] = {}
-            dict_compiled[platform] = {}
             dict_dscr[platform] = {}
 
             for key, pattern in patterns.items():
-                try:
-                    text_pattern = None
-                    compiled_pattern = None
-                    description_pattern = None
-
-                    if isinstance(pattern, str):
-                        text_pattern = pattern
-                        compiled_pattern = re.compile(text_pattern, re.MULTILINE)
-                        description_pattern = key
-
-                    elif isinstance(pattern, dict):
-                        text_pattern = pattern['pattern']
-                        compiled_pattern = re.compile(text_pattern, re.MULTILINE)
-                        description_pattern = pattern['description']
-
-                    elif isinstance(pattern, list):
-                        text_pattern = self._concatenate_patterns(key, pattern)
-                        compiled_pattern = re.compile(text_pattern, re.MULTILINE)
-                        description_pattern = key
-
-                    dict_text[platform][key] = text_pattern
-                    dict_compiled[platform][key] = compiled_pattern
-                    dict_dscr[platform][key] = description_pattern
-
-                except re.error as e:
-                    raise RuntimeError("Pattern compile error: {} ({}:{})".format(e.message, platform, key))
-
-        return dict_compiled, dict_text, dict_dscr
-
-    def _platform_patterns(self, platform='generic', compiled=False):
-        """Return all the patterns for specific platform."""
-        patterns = self._dict_compiled.get(platform, None) if compiled else self._dict_text.get(platform, None)
+                text_pattern = None
+                description_pattern = None
+
+                if isinstance(pattern, str):
+                    text_pattern = pattern
+                    description_pattern = key
+
+                elif isinstance(pattern, dict):
+                    text_pattern = pattern['pattern']
+                    description_pattern = pattern['description']
+
+                elif isinstance(pattern, list):
+                    text_pattern = self._concatenate_patterns(key, pattern)
+                    description_pattern = key
+
+                dict_text[platform][key] = text_pattern
+                dict_dscr[platform][key] = description_pattern
+
+        return dict_text, dict_dscr
+
+    def _platform_patterns(self, platform='generic'):
+        """Return all the text patterns for specific platform."""
+        patterns = self._dict_text.get(platform, None)
         if patterns is None:
             raise KeyError("Unknown platform: {}".format(platform))
         return patterns
 
+    def _compile(self, platform, key, text_pattern):
+        """Return the compiled pattern. Compile on the first use."""
+        compiled_pattern = self._dict_compiled.get((platform, key), None)
+        if compiled_pattern is None:
+            try:
+                compiled_pattern = re.compile(text_pattern, re.MULTILINE)
+            except re.error as e:
+                raise RuntimeError("Pattern compile error: {} ({}:{})".format(e.message, platform, key))
+            self._dict_compiled[(platform, key)] = compiled_pattern
+        return compiled_pattern
+
     def _concatenate_patterns(self, key, patterns):
         pattern_set = set()
         for platform in patterns:
@@ -81,32 +110,89 @@ class PatternManager(object):
         :param compiled:
         :return: Pattern string or RE object.
         """
-        patterns = self._platform_patterns(platform, compiled=compiled)
-        pattern = patterns.get(key, self._platform_patterns(compiled=compiled).get(key, None))
+        source = platform if key in self._platform_patterns(platform) else 'generic'
+        pattern = self._platform_patterns(source).get(key, None)
 
         if pattern is None:
             raise KeyError("Patterns database corrupted. Platform: {}, Key: {}".format(platform, key))
 
         if compiled:
-            return re.compile(pattern)
+            return self._compile(source, key, pattern)
         else:
             return pattern
 
+    def bundle(self, platform):
+        """Return the pattern bundle for the platform. The bundle is created once and shared."""
+        bundle = self._bundles.get(platform, None)
+        if bundle is None:
+            patterns = dict((key, self.pattern(platform, key)) for key in _BUNDLE_COMPILED)
+            patterns.update((key, self.pattern(platform, key, compiled=False)) for key in _BUNDLE_TEXT)
+            base_prompt = self.pattern(platform, 'prompt_dynamic', compiled=False).format(prompt="(?P<prompt>.*?)")
+            patterns['base_prompt'] = re.compile(base_prompt)
+            bundle = PatternBundle(**patterns)
+            self._bundles[platform] = bundle
+        return bundle
+
+    def dynamic_prompt(self, platform, components, prompt):
+        """Return the compiled dynamic prompt pattern.
+
+        The patterns are cached by the platform, components and prompt, so the same prompt is compiled only once.
+        The cache hits and misses are available in the *dynamic_prompt_cache* attribute.
+
+        Args:
+            platform (str): The platform name.
+            components (list): The pattern names joined to create the dynamic prompt pattern.
+            prompt (str): The prompt text substituted to the patterns.
+
+        Returns:
+            The compiled pattern.
+        """
+        key = (platform, tuple(components), prompt)
+        prompt_re = self.dynamic_prompt_cache.get(key)
+        if prompt_re is None:
+            patterns = [self.pattern(platform, pattern_name, compiled=False) for pattern_name in components]
+            patterns_re = "|".join(patterns).format(prompt=re.escape(prompt))
+            try:
+                prompt_re = re.compile(patterns_re)
+            except re.error as e:  # pylint: disable=invalid-name
+                raise RuntimeError("Pattern compile error: {} ({}:{})".format(e.message, platform, patterns_re))
+            self.dynamic_prompt_cache.put(key, prompt_re)
+            logger.debug("Dynamic prompt cache: hits={}, misses={}".format(
+                self.dynamic_prompt_cache.hits, self.dynamic_prompt_cache.misses))
+        return prompt_re
+
     def description(self, platform, key):
         """Return the patter description."""
         patterns = self._dict_dscr.get(platform, None)
         description = patterns.get(key, None)
         return description
 
+    def _platform_detection_re(self):
+        """Return the single pattern detecting all the platforms and the list of platforms.
+
+        Every platform prompt pattern is the separate alternative in the order of the ``prompt_detection`` list.
+        The lazy prefix allows the alternative to match anywhere in the string and the alternatives are tried
+        in order, so the first matching platform from the list wins.
+        """
+        if self._platform_re is None:
+            platforms = self._dict['generic']['prompt_detection']
+            prompts = [strip_named_groups(self.pattern(platform, 'prompt')) for platform in platforms]
+            alternatives = [r"(?P<_{}>[\s\S]*?(?:{}))".format(index, prompt) for index, prompt in enumerate(prompts)]
+            self._platform_re = re.compile(r"\A(?:{})".format("|".join(alternatives)), re.MULTILINE), platforms
+        return self._platform_re
+
     def platform(self, with_prompt):
-        """Return the platform name based on the prompt matching."""
-        platforms = self._dict['generic']['prompt_detection']
-        for platform in platforms:
-            pattern = self.pattern(platform, 'prompt')
-            result = re.search(pattern, with_prompt)
-            if result:
-                return platform
-        return None
+        """Return the platform name based on the prompt matching.
+
+        The result is cached, so the repeated prompt is not matched again.
+        """
+        platform = self.platform_cache.get(with_prompt, _NOT_CACHED)
+        if platform is _NOT_CACHED:
+            platform_re, platforms = self._platform_detection_re()
+            result = platform_re.match(with_prompt)
+            platform = platforms[int(result.lastgroup[1:])] if result else None
+            self.platform_cache.put(with_prompt, platform)
+        return platform
 
 
 class YPatternManager(PatternManager):
@@ -1,7 +1,9 @@
 """Provides SSH driver class."""
 
 from functools import partial
+from pipes import quote
 import logging
+import os
 import pexpect
 
 from condoor.fsm import FSM, action
@@ -32,24 +34,78 @@ class SSH(Protocol):
         """Initialize SSH object."""
         super(SSH, self).__init__(device)
 
-    def get_command(self, version=2):
-        """Return the SSH protocol specific command to connect."""
+    def get_command(self, version=2, options=""):
+        """Return the SSH protocol specific command to connect.
+
+        Args:
+            version (int): The SSH protocol version.
+            options (str): The additional ssh command line options.
+        """
         if self.username:
             # Not supported on SunOS
             # "-o ConnectTimeout={}
-            command = "ssh " \
+            command = "ssh {}" \
                       "-o UserKnownHostsFile=/dev/null " \
                       "-o StrictHostKeyChecking=no " \
                       "-{} " \
-                      "-p {} {}@{}".format(version, self.port, self.username, self.hostname)
+                      "-p {} {}@{}".format(options, version, self.port, self.username, self.hostname)
         else:
-            command = "ssh " \
+            command = "ssh {}" \
                       "-o UserKnownHostsFile=/dev/null " \
                       "-o StrictHostKeyChecking=no " \
                       "-{} " \
-                      "-p {} {}".format(version, self.port, self.hostname)
+                      "-p {} {}".format(options, version, self.port, self.hostname)
         return command
 
+    def execute(self, command, timeout=10):
+        """Execute the command over the separate non-interactive SSH exec channel.
+
+        The new ssh session is started with no PTY on the remote host (``ssh -T``), so no prompt detection is
+        needed and the exit status of the command is returned by ssh. The password prompt is answered once.
+        If no password is known the public key authentication only is used.
+
+        Args:
+            command (str): The shell command executed on the remote host.
+            timeout (int): Timeout in seconds for the whole execution.
+
+        Returns:
+            The tuple of the command output and the exit status or None if the command could not be executed.
+        """
+        if self.password:
+            options = "-q -T -o NumberOfPasswordPrompts=1 "
+        else:
+            options = "-q -T -o BatchMode=yes "
+        line = "{} {}".format(self.get_command(options=options), quote(command))
+        logger.debug("Executing over SSH exec channel: '{}'".format(line))
+        try:
+            # keep the environment, i.e. SSH_AUTH_SOCK for the agent authentication
+            session = pexpect.spawn(line, env=dict(os.environ, TERM="dumb"), timeout=timeout)
+        except pexpect.ExceptionPexpect as e:
+            logger.debug("SSH exec channel not available: {}".format(e))
+            return None
+
+        try:
+            events = [self.device.driver.password_re, pexpect.EOF] if self.password else [pexpect.EOF]
+            if session.expect(events) == 0 and self.password:
+                session.sendline(self._acquire_password())
+                session.expect(pexpect.EOF)
+                output = session.before.replace('\r', '')
+                # the new line printed after the password
+                if output.startswith('\n'):
+                    output = output[1:]
+            else:
+                output = session.before.replace('\r', '')
+        except pexpect.TIMEOUT:
+            logger.debug("SSH exec channel timeout")
+            session.close(force=True)
+            return None
+        session.close()
+
+        logger.debug("SSH exec channel exit status: {}".format(session.exitstatus))
+        if session.exitstatus is None:
+            return None
+        return output, session.exitstatus
+
     def connect(self, driver):
         """Connect using the SSH protocol specific FSM."""
         #                      0                    1                 2
@@ -76,7 +132,8 @@ class SSH(Protocol):
         ]
 
         logger.debug("EXPECTED_PROMPT={}".format(pattern_to_str(self.device.prompt_re)))
-        fsm = FSM("SSH-CONNECT", self.device, events, transitions, timeout=_C['connect_timeout'],
+        fsm = FSM("SSH-CONNECT", self.device, events, transitions,
+                  timeout=self.device.connect_timeout(_C['connect_timeout']),
                   searchwindowsize=160)
         return fsm.run()
 
@@ -67,7 +67,8 @@ class Telnet(Protocol):
         ]
 
         logger.debug("EXPECTED_PROMPT={}".format(pattern_to_str(self.device.prompt_re)))
-        fsm = FSM("TELNET-CONNECT", self.device, events, transitions, timeout=_C['connect_timeout'],
+        fsm = FSM("TELNET-CONNECT", self.device, events, transitions,
+                  timeout=self.device.connect_timeout(_C['connect_timeout']),
                   init_pattern=self.last_pattern)
         return fsm.run()
 
@@ -137,7 +138,8 @@ class TelnetConsole(Telnet):
             (pexpect.TIMEOUT, [5], -1, ConnectionTimeoutError("Connection timeout", self.hostname), 0)
         ]
         logger.debug("EXPECTED_PROMPT={}".format(pattern_to_str(self.device.prompt_re)))
-        fsm = FSM("TELNET-CONNECT-CONSOLE", self.device, events, transitions, timeout=_C['connect_timeout'],
+        fsm = FSM("TELNET-CONNECT-CONSOLE", self.device, events, transitions,
+                  timeout=self.device.connect_timeout(_C['connect_timeout']),
                   init_pattern=self.last_pattern)
         return fsm.run()
 
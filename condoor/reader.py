@@ -0,0 +1,220 @@
+"""Provides the pexpect session drained continuously by the background reader thread."""
+
+import logging
+import threading
+from collections import deque
+from time import time
+
+import pexpect
+from pexpect.spawnbase import SpawnBase
+from pexpect.utils import select_ignore_interrupts
+
+logger = logging.getLogger(__name__)
+
+# Ring buffer overflow policies
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP = 'drop'
+
+
+class RingBuffer(object):
+    """The bounded FIFO buffer of the session output shared by the reader thread and the expect engine.
+
+    If the buffer is full and the policy is ``block``, the writer waits for the free space. Then the transport
+    is not read and the device is flow controlled as without the buffer. If the policy is ``drop``, the oldest
+    output is discarded. Both events are counted in the buffer statistics.
+    """
+
+    def __init__(self, capacity, overflow=OVERFLOW_BLOCK):
+        """Initialize the RingBuffer object.
+
+        Args:
+            capacity (int): Maximum number of characters kept in the buffer.
+            overflow (str): The overflow policy: ``block`` or ``drop``.
+
+        Raises:
+            ValueError: Unknown overflow policy.
+        """
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP):
+            raise ValueError("Unknown overflow policy: {}".format(overflow))
+        self.capacity = capacity
+        self.overflow = overflow
+        self._chunks = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {
+            'received': 0,  # characters written to the buffer
+            'peak': 0,  # maximum number of characters in the buffer
+            'overflows': 0,  # number of writes discarding the oldest output
+            'dropped': 0,  # characters discarded
+            'backpressure': 0,  # number of writes waiting for the free space
+            'backpressure_time': 0.0,  # total time in seconds the writer waited
+        }
+
+    def __len__(self):
+        """Return the number of characters in the buffer."""
+        return self._size
+
+    def write(self, text, stop=None):
+        """Append the text to the buffer.
+
+        Args:
+            text (str): The session output.
+            stop (threading.Event): Optional event ending the wait for the free space.
+        """
+        with self._cond:
+            if self._size + len(text) > self.capacity:
+                if self.overflow == OVERFLOW_DROP:
+                    self._drop(text)
+                    text = text[-self.capacity:]
+                else:
+                    self._wait_for_space(len(text), stop)
+            self._chunks.append(text)
+            self._size += len(text)
+            self.stats['received'] += len(text)
+            self.stats['peak'] = max(self.stats['peak'], self._size)
+            self._cond.notify_all()
+
+    def _drop(self, text):
+        """Discard the oldest output, so the text fits in the buffer."""
+        count = self._size + len(text) - self.capacity
+        self.stats['overflows'] += 1
+        self.stats['dropped'] += count
+        while count > 0 and self._chunks:
+            chunk = self._chunks.popleft()
+            if len(chunk) > count:
+                self._chunks.appendleft(chunk[count:])
+                self._size -= count
+                return
+            self._size -= len(chunk)
+            count -= len(chunk)
+
+    def _wait_for_space(self, count, stop):
+        """Wait until the text fits or the buffer is empty."""
+        self.stats['backpressure'] += 1
+        start = time()
+        while self._size and self._size + count > self.capacity and not self._closed:
+            if stop is not None and stop.is_set():
+                break
+            self._cond.wait(0.1)
+        self.stats['backpressure_time'] += time() - start
+
+    def read(self, size, timeout):
+        """Remove and return up to *size* characters from the buffer.
+
+        Args:
+            size (int): Maximum number of characters returned.
+            timeout (float): Time in seconds to wait for the output. If *None* the wait is not limited.
+
+        Returns:
+            The text or *None* if no text was received within timeout.
+
+        Raises:
+            pexpect.EOF: The buffer is closed and empty.
+        """
+        end_time = None if timeout is None else time() + timeout
+        with self._cond:
+            while not self._chunks:
+                if self._closed:
+                    raise pexpect.EOF("End Of File (EOF). Reader thread stopped.")
+                remaining = None if end_time is None else end_time - time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+            chunks = []
+            count = 0
+            while self._chunks and count < size:
+                chunk = self._chunks.popleft()
+                if count + len(chunk) > size:
+                    self._chunks.appendleft(chunk[size - count:])
+                    chunk = chunk[:size - count]
+                chunks.append(chunk)
+                count += len(chunk)
+            self._size -= count
+            self._cond.notify_all()
+            return "".join(chunks)
+
+    def close(self):
+        """Mark the end of the output. The remaining text can be still read."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class ReaderSpawn(pexpect.spawn):
+    """The pexpect session with the output read by the background thread to the ring buffer.
+
+    The reader thread drains the pseudo terminal continuously, also between the commands and while the output
+    is processed, so the console messages do not pile up in the kernel buffer and do not stall the device
+    or the terminal server. The expect engine reads the output from the ring buffer. The session log is written
+    by the reader thread as the output arrives.
+    """
+
+    def __init__(self, command, buffer_size=1048576, overflow=OVERFLOW_BLOCK, poll_interval=0.1, text_filter=None,
+                 **kwargs):
+        """Initialize the ReaderSpawn object and start the reader thread.
+
+        Args:
+            command (str): The command spawned.
+            buffer_size (int): The ring buffer capacity in characters.
+            overflow (str): The ring buffer overflow policy: ``block`` or ``drop``.
+            poll_interval (float): Time in seconds the reader thread checks if it should stop.
+            text_filter (callable): Optional function called by the reader thread with the received text
+                returning the text stored in the ring buffer.
+            kwargs: The pexpect.spawn arguments.
+        """
+        self.ring_buffer = RingBuffer(buffer_size, overflow)
+        self._poll_interval = poll_interval
+        self._text_filter = text_filter
+        self._stop = threading.Event()
+        self._reader = None
+        super(ReaderSpawn, self).__init__(command, **kwargs)
+        self._reader = threading.Thread(target=self._read_loop, name="condoor-reader")
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read_loop(self):
+        """Read the session output to the ring buffer until the end of file or the session close."""
+        try:
+            while not self._stop.is_set():
+                if not select_ignore_interrupts([self.child_fd], [], [], self._poll_interval)[0]:
+                    continue
+                # the plain read with the decoding and logging, without the child process status check
+                text = SpawnBase.read_nonblocking(self, self.maxread)
+                if self._text_filter is not None:
+                    text = self._text_filter(text)
+                if text:
+                    self.ring_buffer.write(text, self._stop)
+        except pexpect.EOF:
+            pass
+        except (OSError, ValueError) as e:  # pylint: disable=invalid-name
+            if not self._stop.is_set():
+                logger.debug("Reader thread error: {}".format(e))
+        finally:
+            self.ring_buffer.close()
+
+    def read_nonblocking(self, size=1, timeout=-1):
+        """Read at most *size* characters from the ring buffer.
+
+        The method has the same semantic as pexpect.spawn.read_nonblocking.
+        """
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        if timeout == -1:
+            timeout = self.timeout
+        try:
+            text = self.ring_buffer.read(size, timeout)
+        except pexpect.EOF:
+            self.flag_eof = True
+            raise
+        if text is None:
+            raise pexpect.TIMEOUT('Timeout exceeded.')
+        return text
+
+    def close(self, force=True):
+        """Stop the reader thread and close the session."""
+        self._stop.set()
+        if self._reader is not None and self._reader is not threading.current_thread():
+            self._reader.join()
+        super(ReaderSpawn, self).close(force)
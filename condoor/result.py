@@ -0,0 +1,185 @@
+"""Provides the CommandResult class."""
+
+import re
+from array import array
+from bisect import bisect_right
+
+_NEW_LINE = re.compile('\n')
+
+
+class CommandResult(str):
+    """The command output string with the line index and the command execution details.
+
+    The object is the regular string, so it can be used everywhere the output string was used.
+    The line index is built on the first line based access and reused by all the helper methods.
+
+    Attributes:
+        command (str): The command string.
+        prompt (str): The prompt received after the command output.
+        elapsed (float): The command execution time in seconds.
+        pages (int): Number of the output pages, i.e. separated with the ``--More--`` prompt.
+    """
+
+    def __new__(cls, text, command=None, prompt=None, elapsed=None, pages=1):
+        """Create the CommandResult object.
+
+        Args:
+            text (str): The command output.
+            command (str): The command string.
+            prompt (str): The prompt received after the command output.
+            elapsed (float): The command execution time in seconds.
+            pages (int): Number of the output pages.
+        """
+        result = str.__new__(cls, text)
+        result.command = command
+        result.prompt = prompt
+        result.elapsed = elapsed
+        result.pages = pages
+        result._offsets = None
+        return result
+
+    def __getnewargs__(self):
+        """Return the arguments for pickle."""
+        return str(self),
+
+    @property
+    def bytes(self):
+        """Return the output size in bytes."""
+        return len(self)
+
+    @property
+    def offsets(self):
+        """Return the array of the line start offsets. The index is built on the first access."""
+        if self._offsets is None:
+            offsets = array('L', [0])
+            offsets.extend(match.end() for match in _NEW_LINE.finditer(self))
+            if offsets[-1] == len(self) and len(offsets) > 1:
+                # no empty line after the last new line character
+                offsets.pop()
+            self._offsets = offsets
+        return self._offsets
+
+    @property
+    def line_count(self):
+        """Return the number of lines."""
+        return len(self.offsets) if self else 0
+
+    def line(self, number):
+        """Return the line without the new line character.
+
+        Args:
+            number (int): The line number starting from 0. The negative numbers count from the last line.
+
+        Raises:
+            IndexError: Line number out of range.
+        """
+        offsets = self.offsets
+        if number < 0:
+            number += self.line_count
+        if not 0 <= number < self.line_count:
+            raise IndexError("Line number out of range: {}".format(number))
+        if number + 1 < len(offsets):
+            end = offsets[number + 1] - 1
+        else:
+            end = len(self) - 1 if self.endswith('\n') else len(self)
+        return self[offsets[number]:end]
+
+    def lines(self, start=0, stop=None):
+        """Return the list of lines from the start to the stop line number (exclusive)."""
+        count = self.line_count
+        start, stop, _ = slice(start, stop).indices(count)
+        return [self.line(number) for number in range(start, stop)]
+
+    def line_number(self, offset):
+        """Return the line number of the character at the offset."""
+        return bisect_right(self.offsets, offset) - 1
+
+    def grep(self, pattern, flags=0):
+        """Return the list of (line number, line) tuples for the lines matching the regular expression.
+
+        The pattern is searched in the whole output at once and the line is located using the line index.
+
+        Args:
+            pattern: The regular expression string or compiled pattern.
+            flags (int): The regular expression flags used if the pattern is the string.
+        """
+        if isinstance(pattern, basestring):
+            pattern = re.compile(pattern, flags | re.MULTILINE)
+
+        result = []
+        position = 0
+        while True:
+            match = pattern.search(self, position)
+            if match is None:
+                break
+            number = self.line_number(match.start())
+            result.append((number, self.line(number)))
+            if number + 1 >= self.line_count:
+                break
+            # continue from the next line
+            position = self.offsets[number + 1]
+        return result
+
+    def section(self, pattern, flags=0):
+        """Return the sections of the output starting with the line matching the regular expression.
+
+        The section is the matching line and all the following lines indented more than the matching line,
+        similar to the ``| section`` IOS filter.
+
+        Args:
+            pattern: The regular expression string or compiled pattern.
+            flags (int): The regular expression flags used if the pattern is the string.
+
+        Returns:
+            The string containing all the sections found.
+        """
+        lines = []
+        last = -1
+        for number, header in self.grep(pattern, flags):
+            if number <= last:
+                continue
+            indent = len(header) - len(header.lstrip())
+            lines.append(header)
+            last = number
+            for next_number in range(number + 1, self.line_count):
+                line = self.line(next_number)
+                if line.strip() and len(line) - len(line.lstrip()) <= indent:
+                    break
+                lines.append(line)
+                last = next_number
+        return "\n".join(lines)
+
+
+def filter_output(text, filters):
+    """Apply the output filters to the text locally.
+
+    It is used if the filters are not supported by the device. The filters work like the IOS output filters.
+
+    Args:
+        text (str): The command output.
+        filters (list): The list of (filter name, pattern) tuples. The filter names are: ``include``,
+            ``exclude``, ``begin`` and ``section``.
+
+    Returns:
+        The filtered output string.
+
+    Raises:
+        ValueError: Unknown filter name.
+    """
+    for name, pattern in filters:
+        regex = re.compile(pattern, re.MULTILINE)
+        if name == 'include':
+            text = "\n".join(line for line in text.splitlines() if regex.search(line))
+        elif name == 'exclude':
+            text = "\n".join(line for line in text.splitlines() if not regex.search(line))
+        elif name == 'begin':
+            match = regex.search(text)
+            if match is None:
+                text = ''
+            else:
+                text = text[text.rfind('\n', 0, match.start()) + 1:]
+        elif name == 'section':
+            text = CommandResult(text).section(regex)
+        else:
+            raise ValueError("Unknown output filter: {}".format(name))
+    return text
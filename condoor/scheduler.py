@@ -0,0 +1,220 @@
+"""Provides the classes serializing and coalescing the commands sent to the device."""
+
+import heapq
+import logging
+import threading
+from itertools import count
+from time import time
+
+logger = logging.getLogger(__name__)
+
+# Command priority classes. The lower value is served first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+
+def normalize_command(cmd):
+    """Return the command string with the redundant whitespaces removed."""
+    return " ".join(cmd.split())
+
+
+class _Call(object):
+    """The in-flight call shared by all the waiters."""
+
+    __slots__ = ('event', 'result', 'exception', 'waiters')
+
+    def __init__(self):
+        """Initialize the call object."""
+        self.event = threading.Event()
+        self.result = None
+        self.exception = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """Execute the concurrent calls with the same key only once.
+
+    The first caller (leader) executes the function. All the callers requesting the same key while the leader
+    is still running wait for the leader and receive the same result or exception.
+    """
+
+    def __init__(self):
+        """Initialize the SingleFlight object."""
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """Call the function or wait for the in-flight call with the same key.
+
+        Args:
+            key (hashable): The key identifying the call. If *None* the function is always called.
+            func (callable): The function to be called.
+
+        Returns:
+            The function result.
+        """
+        if key is None:
+            return func(*args, **kwargs)
+
+        with self._lock:
+            call = self._calls.get(key, None)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+            else:
+                call.waiters += 1
+                leader = False
+
+        if not leader:
+            logger.debug("Waiting for in-flight call: {}".format(key))
+            call.event.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as e:  # pylint: disable=invalid-name
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                logger.debug("In-flight call shared with {} waiter(s): {}".format(call.waiters, key))
+            call.event.set()
+
+
+class CommandQueue(object):
+    """Serialize the access to the device session in the priority order.
+
+    The callers are served according to the priority class and the FIFO order within the same class.
+    The number of waiting callers is limited by *maxsize*. If the queue is full the caller is blocked until
+    there is a free slot (backpressure) and the blocked callers take the free slots in the same order.
+    The caller giving the deadline is dropped from the queue if it can not complete before the deadline,
+    i.e. the deadline passes or the remaining time is shorter than the expected run time.
+
+    The queue is reentrant, so the thread holding the session can send further commands,
+    i.e. from the driver or the message callback.
+    """
+
+    def __init__(self, maxsize=0):
+        """Initialize the CommandQueue object.
+
+        Args:
+            maxsize (int): Maximum number of waiting callers. If 0 the queue size is not limited.
+        """
+        self.maxsize = maxsize
+        self._cond = threading.Condition(threading.Lock())
+        self._waiting = []
+        self._blocked = []
+        self._counter = count()
+        self._owner = None
+        self._depth = 0
+
+        self.dropped = 0
+        self.blocked = 0
+
+    def acquire(self, priority=PRIORITY_NORMAL, deadline=None, expected=0):
+        """Wait for the turn and take the device session.
+
+        Args:
+            priority (int): The priority class. Refer to PRIORITY_INTERACTIVE, PRIORITY_NORMAL and PRIORITY_BULK.
+            deadline (float): Optional absolute time (as returned by time.time()) until the caller can wait.
+            expected (float): The expected run time in seconds. The caller is dropped if there is less time
+                left until the deadline when its turn comes.
+
+        Returns:
+            True if the session was acquired or False if the caller can not complete before the deadline.
+        """
+        me = threading.current_thread()
+        with self._cond:
+            if self._owner is me:
+                self._depth += 1
+                return True
+
+            # the latest time the session must be taken to complete before the deadline
+            start_by = None if deadline is None else deadline - expected
+
+            if self.maxsize > 0 and (len(self._waiting) >= self.maxsize or self._blocked):
+                self.blocked += 1
+                logger.debug("Command queue full ({}). Waiting for free slot.".format(self.maxsize))
+                entry = (priority, next(self._counter))
+                heapq.heappush(self._blocked, entry)
+                while len(self._waiting) >= self.maxsize or self._blocked[0] is not entry:
+                    if not self._wait(start_by):
+                        self._drop(self._blocked, entry)
+                        logger.warning("Command queue full. Deadline passed.")
+                        return False
+                heapq.heappop(self._blocked)
+                # wake up the next blocked caller
+                self._cond.notify_all()
+
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiting, entry)
+            while self._owner is not None or self._waiting[0] is not entry:
+                if not self._wait(start_by):
+                    self._drop(self._waiting, entry)
+                    logger.warning("Command dropped from the queue. Deadline passed.")
+                    return False
+
+            if start_by is not None and time() > start_by:
+                self._drop(self._waiting, entry)
+                logger.warning("Command dropped from the queue. Not enough time left to complete before "
+                               "the deadline (expected {:.1f}s).".format(expected))
+                return False
+
+            heapq.heappop(self._waiting)
+            self._owner = me
+            self._depth = 1
+            # wake up callers blocked on full queue
+            self._cond.notify_all()
+            return True
+
+    def _drop(self, heap, entry):
+        """Remove the caller entry from the heap and wake up the remaining callers."""
+        heap.remove(entry)
+        heapq.heapify(heap)
+        self._cond.notify_all()
+        self.dropped += 1
+
+    def _wait(self, deadline):
+        """Wait for the condition change. Return False if deadline passed."""
+        if deadline is None:
+            self._cond.wait()
+            return True
+        remaining = deadline - time()
+        if remaining <= 0:
+            return False
+        self._cond.wait(remaining)
+        return True
+
+    def release(self):
+        """Release the device session and wake up the next caller."""
+        with self._cond:
+            if self._owner is not threading.current_thread():
+                raise RuntimeError("Command queue released by non-owner thread")
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._cond.notify_all()
+
+    def held(self):
+        """Return True if the device session is held by the calling thread."""
+        return self._owner is threading.current_thread()
+
+    def __enter__(self):
+        """Acquire the session in the context manager."""
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Release the session in the context manager."""
+        self.release()
+
+    def __len__(self):
+        """Return the number of callers waiting for the session."""
+        return len(self._waiting)
@@ -0,0 +1,133 @@
+"""Provides the session tap fanning out the raw session stream to multiple consumers."""
+
+import logging
+import threading
+from Queue import Queue, Full, Empty
+
+logger = logging.getLogger(__name__)
+
+# Consumer queue overflow policies
+OVERFLOW_DROP = 'drop'
+OVERFLOW_DETACH = 'detach'
+
+
+class TapConsumer(object):
+    """The consumer of the raw session stream with the bounded queue.
+
+    The consumer iterates over the chunks of the session output as received from the device, including
+    the command echo, the prompts and the asynchronous messages. The same string object is queued for every
+    consumer, so the chunk is not copied. If the consumer is too slow and its queue is full, the chunk is
+    dropped (``drop``) or the consumer is detached from the session (``detach``). The session is never slowed
+    down by the consumer.
+
+    Example::
+
+        consumer = conn.tap(maxsize=4096)
+        for chunk in consumer:
+            recorder.write(chunk)
+    """
+
+    def __init__(self, maxsize=1024, overflow=OVERFLOW_DROP, poll_interval=0.1):
+        """Initialize the TapConsumer object.
+
+        Args:
+            maxsize (int): Maximum number of chunks waiting in the consumer queue.
+            overflow (str): The queue overflow policy: ``drop`` or ``detach``.
+            poll_interval (float): Time in seconds the iterator checks if the consumer is closed.
+
+        Raises:
+            ValueError: Unknown overflow policy.
+        """
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_DETACH):
+            raise ValueError("Unknown overflow policy: {}".format(overflow))
+        self.overflow = overflow
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+        self._queue = Queue(maxsize)
+        self._poll_interval = poll_interval
+        self._taps = []
+
+    def __iter__(self):
+        """Return the iterator."""
+        return self
+
+    def next(self):
+        """Return the next chunk. The iteration stops when the consumer is closed or detached."""
+        while True:
+            chunk = self.get(self._poll_interval)
+            if chunk is not None:
+                return chunk
+            if self.closed:
+                raise StopIteration
+
+    __next__ = next
+
+    def get(self, timeout=None):
+        """Return the next chunk or *None* if no chunk was received within timeout."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def put(self, chunk):
+        """Queue the chunk without blocking. Return False if the consumer should be detached."""
+        try:
+            self._queue.put_nowait(chunk)
+        except Full:
+            self.dropped += 1
+            return self.overflow == OVERFLOW_DROP
+        self.received += 1
+        return True
+
+    def close(self):
+        """Detach the consumer from all the sessions. The queued chunks can be still read."""
+        self.closed = True
+        for tap in list(self._taps):
+            tap.remove(self)
+
+
+class SessionTap(object):
+    """The file like object passed as the pexpect *logfile_read* writing the session stream to the consumers.
+
+    The session log file is one of the outputs. The consumer list is replaced on every change, so the session
+    output is written without locking.
+    """
+
+    def __init__(self, logfile=None):
+        """Initialize the SessionTap object.
+
+        Args:
+            logfile (file): Optional session log file.
+        """
+        self.logfile = logfile
+        self._consumers = ()
+        self._lock = threading.Lock()
+
+    def add(self, consumer):
+        """Add the consumer."""
+        with self._lock:
+            if consumer not in self._consumers:
+                self._consumers += (consumer, )
+                consumer._taps.append(self)  # pylint: disable=protected-access
+
+    def remove(self, consumer):
+        """Remove the consumer."""
+        with self._lock:
+            self._consumers = tuple(item for item in self._consumers if item is not consumer)
+            if self in consumer._taps:  # pylint: disable=protected-access
+                consumer._taps.remove(self)  # pylint: disable=protected-access
+
+    def write(self, data):
+        """Write the session output to the log file and queue it for the consumers."""
+        if self.logfile is not None:
+            self.logfile.write(data)
+        for consumer in self._consumers:
+            if not consumer.put(data):
+                logger.warning("Session tap consumer too slow. Detached after {} chunks".format(consumer.received))
+                consumer.close()
+
+    def flush(self):
+        """Flush the session log file."""
+        if self.logfile is not None:
+            self.logfile.flush()
@@ -6,7 +6,12 @@ import codecs
 import time
 import re
 import os
-import yaml
+import marshal
+import random
+import threading
+from collections import OrderedDict
+
+from version import __version__
 
 
 def delegate(attribute_name, method_names):
@@ -57,29 +62,121 @@ def is_reachable(host, port=23):
     :rtype: number
     :return: True if host is reachable else false
     """
+    if probe_ports([(host, port)], timeout=5)[(host, port)] is True:
+        # Wait 2 sec for socket to shutdown
+        time.sleep(2)
+        return True
+    return False
+
+
+def probe_ports(addresses, timeout=2):
+    """Probe the TCP ports of the hosts in parallel.
+
+    Every hostname is resolved only once and all the ports are probed at the same time, so the whole check
+    takes at most the timeout for the name resolution and the timeout for the connection.
+
+    Args:
+        addresses (list): The list of (host, port) tuples.
+        timeout (float): The name resolution and connection timeout in seconds.
+
+    Returns:
+        The dictionary mapping (host, port) to True if the port accepts the connection, False if it does not
+        on any of the host addresses or None if the hostname could not be resolved or the probe did not complete
+        within the timeout, i.e. the first address timed out and the next ones were not tried.
+    """
+    addresses = list(set(addresses))
+    resolved = {}
+    results = dict.fromkeys(addresses)
+
+    def resolve(host):
+        try:
+            resolved[host] = [(info[0], info[4]) for info in
+                              socket.getaddrinfo(host, None, socket.AF_UNSPEC, socket.SOCK_STREAM)]
+        except socket.gaierror:
+            pass
+
+    def probe(host, port):
+        for family, sockaddr in resolved[host]:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            try:
+                sock.connect((sockaddr[0], port) + sockaddr[2:])
+            except IOError:
+                continue
+            finally:
+                sock.close()
+            results[(host, port)] = True
+            return
+        results[(host, port)] = False
+
+    _run_threads([(resolve, (host, )) for host in set(host for host, _ in addresses)], timeout)
+    _run_threads([(probe, address) for address in addresses if address[0] in resolved], timeout)
+    # the threads still running do not change the result
+    return dict(results)
+
+
+def _run_threads(calls, timeout):
+    """Run the calls in the daemon threads and wait for them at most the timeout."""
+    threads = []
+    for func, args in calls:
+        thread = threading.Thread(target=func, args=args, name="condoor-probe")
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    end = time.time() + timeout
+    for thread in threads:
+        thread.join(max(0, end - time.time()))
+
+
+def probe_port(host, port, timeout=1):
+    """Probe the TCP port.
+
+    The socket is closed immediately after the connection is established and no data is sent, so no
+    SSH or TELNET session is started. It supports IPv6.
+
+    Args:
+        host (str): The hostname or IP address.
+        port (int): The TCP port number.
+        timeout (float): The connection timeout in seconds.
+
+    Returns:
+        True if the port accepts the connection, False if the connection is refused, times out or the host
+        is unreachable or None if the hostname could not be resolved, i.e. it is the ssh config alias.
+    """
     try:
-        addresses = socket.getaddrinfo(
-            host, port, socket.AF_UNSPEC, socket.SOCK_STREAM
-        )
+        sock = socket.create_connection((host, port), timeout)
     except socket.gaierror:
+        return None
+    except (IOError, socket.timeout):
         return False
+    sock.close()
+    return True
 
-    for family, _, _, _, sockaddr in addresses:
-        sock = socket.socket(family, socket.SOCK_STREAM)
-        sock.settimeout(5)
-        try:
-            sock.connect(sockaddr)
-        except IOError:
-            continue
 
-        sock.shutdown(socket.SHUT_RDWR)
-        sock.close()
-        # Wait 2 sec for socket to shutdown
-        time.sleep(2)
-        break
-    else:
-        return False
-    return True
+def is_port_open(host, port, timeout=1):
+    """Return True if the TCP port accepts the connection.
+
+    Args:
+        host (str): The hostname or IP address.
+        port (int): The TCP port number.
+        timeout (float): The connection timeout in seconds.
+    """
+    return probe_port(host, port, timeout) is True
+
+
+def backoff_delays(initial, factor, maximum, jitter=0.0):
+    """Generate the exponentially growing delays with the random jitter.
+
+    Args:
+        initial (float): The first delay in seconds.
+        factor (float): The multiplier applied to every next delay.
+        maximum (float): The delay cap in seconds.
+        jitter (float): The fraction of the delay the delay is randomly changed by in both directions.
+    """
+    delay = initial
+    while True:
+        yield min(maximum, delay * random.uniform(1 - jitter, 1 + jitter))
+        delay = min(maximum, delay * factor)
 
 
 def pattern_to_str(pattern):
@@ -96,6 +193,14 @@ def pattern_to_str(pattern):
         return pattern.pattern if pattern else None
 
 
+def strip_named_groups(pattern):
+    """Return the pattern string with the named groups converted to the non-capturing groups.
+
+    It allows to combine the patterns defining the same group names into a single pattern.
+    """
+    return re.sub(r"(?<!\\)\(\?P<\w+>", "(?:", pattern_to_str(pattern))
+
+
 def levenshtein_distance(str_a, str_b):
     """Calculate the Levenshtein distance between string a and b.
 
@@ -220,6 +325,60 @@ class FilteredFileHandler(logging.FileHandler):
         return FilteredFile(self.baseFilename, mode=self.mode, encoding=self.encoding, pattern=self.pattern)
 
 
+class LRUCache(object):
+    """Thread safe dictionary with the limited size and the least recently used items eviction.
+
+    The *hits* and *misses* counters show how many times the cached value was reused or had to be created.
+    """
+
+    def __init__(self, maxsize=128):
+        """Initialize the LRUCache object.
+
+        Args:
+            maxsize (int): Maximum number of the cached items.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it as recently used or the default if not cached."""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store the value in the cache and evict the least recently used item if cache is full."""
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all the items from the cache and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        """Return the number of the cached items."""
+        return len(self._data)
+
+    def __contains__(self, key):
+        """Return True if the key is cached. Does not change the item order nor counters."""
+        return key in self._data
+
+
 def normalize_urls(urls):
     """Overload urls and make list of lists of urls."""
     _urls = []
@@ -268,6 +427,70 @@ def make_handler(log_dir, log_level):
     return handler
 
 
+def _bundle_file_path(script_name):
+    """Return the pattern bundle file path for the script name. Every user has the own bundle file."""
+    return "/tmp/condoor.{}.{}.{}.bundle".format(os.getuid(), __version__, os.path.basename(script_name))
+
+
+def _bundle_key(file_paths):
+    """Return the bundle key based on the condoor version and the source files modification time and size."""
+    key = [__version__]
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+            key.append((file_path, stat.st_mtime, stat.st_size))
+        except OSError:
+            key.append((file_path, None, None))
+    return tuple(key)
+
+
+def load_bundle(bundle_path, key):
+    """Load the dictionary from the bundle file.
+
+    Args:
+        bundle_path (str): The bundle file path.
+        key (tuple): The expected bundle key.
+
+    Returns:
+        The dictionary or *None* if the bundle does not exist, is corrupted, the key does not match or the file
+        is not owned by the user or is writable by others.
+    """
+    try:
+        with open(bundle_path, 'rb') as bundle:
+            stat = os.fstat(bundle.fileno())
+            if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+                return None
+            bundle_key, dictionary = marshal.load(bundle)
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+    if bundle_key != key:
+        return None
+    return dictionary
+
+
+def save_bundle(bundle_path, key, dictionary):
+    """Save the dictionary to the bundle file.
+
+    The file is written atomically and is readable and writable only by the user. Any error is ignored
+    as the bundle is only the optimization.
+
+    Args:
+        bundle_path (str): The bundle file path.
+        key (tuple): The bundle key.
+        dictionary (dict): The dictionary to be saved. Must contain only the basic types.
+    """
+    tmp_path = "{}.{}".format(bundle_path, os.getpid())
+    try:
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as bundle:
+            marshal.dump((key, dictionary), bundle)
+        os.rename(tmp_path, bundle_path)
+    except (IOError, OSError, ValueError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
 def yaml_file_to_dict(script_name, path=None):
     """Read yaml file and return the dict.
 
@@ -276,9 +499,14 @@ def yaml_file_to_dict(script_name, path=None):
 
     There can be user file located in ~/.condoor directory with the {script_name}.yaml filename. If exists
     it is merget with default config.
+
+    The merged dictionary is stored in the bundle file /tmp/condoor.{uid}.{version}.{script_name}.bundle.
+    The bundle is reused as long as the condoor version and the yaml files modification time
+    and size do not change, so the yaml files are not parsed on every start.
     """
     def load_yaml(file_path):
         """Load YAML file from full file path and return dict."""
+        import yaml
         with open(file_path, 'r') as yamlfile:
             try:
                 dictionary = yaml.load(yamlfile)
@@ -305,13 +533,20 @@ def yaml_file_to_dict(script_name, path=None):
     if not os.path.exists(config_file_path):
         raise RuntimeError('Config file does not exist: {}'.format(config_file_path))
 
-    default_dict = load_yaml(config_file_path)
-
     user_config_file_path = os.path.join(os.path.expanduser('~'), '.condoor', script_name + '.yaml')
     user_config_file_path = os.getenv('CONDOOR_' + script_name.upper(), user_config_file_path)
 
+    bundle_path = _bundle_file_path(script_name)
+    key = _bundle_key([config_file_path, user_config_file_path])
+    default_dict = load_bundle(bundle_path, key)
+    if default_dict is not None:
+        return default_dict
+
+    default_dict = load_yaml(config_file_path)
+
     if os.path.exists(user_config_file_path):
         user_dict = load_yaml(user_config_file_path)
         default_dict = merge(user_dict, default_dict)
 
+    save_bundle(bundle_path, key, default_dict)
     return default_dict
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+"""Measure the peak memory and time of capturing the huge command output.
+
+Usage: python tests/benchmark/bench_capture.py [-s SIZE_MB]
+
+The synthetic output of the given size (200 MB by default) is generated by the spawned process and captured
+using the legacy method (pexpect ``before`` attribute with CR removal and echo line slicing) and the
+:class:`condoor.capture.OutputCapture` keeping the output in memory or spilling it to the temporary file above
+10 MB. Each method runs in the fresh interpreter to measure its peak memory.
+"""
+
+import argparse
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+
+import pexpect
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+
+LINE = "1.1.1.0/24          10.0.0.1        0     0 65000 65001 65002 i\n"
+
+GENERATOR = """
+import sys
+line = {line!r} * 1024
+for _ in range({count}):
+    sys.stdout.write(line)
+sys.stdout.write('host#')
+sys.stdout.flush()
+"""
+
+
+class FakeConnection(object):
+    """The minimal connection object required by the Controller."""
+
+    session_fd = None
+    hostname = "benchmark"
+
+
+def run(method, size):
+    """Capture the output with the method and return the output length."""
+    from condoor.controller import Controller
+
+    count = size * 1024 * 1024 // (len(LINE) * 1024)
+    ctrl = Controller(FakeConnection())
+    ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, GENERATOR.format(line=LINE, count=count)))
+    prompt = re.compile("host#")
+    if method == "legacy":
+        ctrl.expect([prompt, pexpect.TIMEOUT], timeout=600)
+        output = ctrl.before.replace('\r', '')
+        second_line_index = output.find('\n') + 1
+        output = output[second_line_index:]
+    else:
+        spill_threshold = 10 * 1024 * 1024 if method == "spill" else None
+        with ctrl.capture_output(spill_threshold=spill_threshold) as capture:
+            ctrl.expect([prompt, pexpect.TIMEOUT], timeout=600)
+        output = capture.getvalue(skip_first_line=True)
+    ctrl.disconnect()
+    return len(output)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-s", "--size", type=int, default=200, help="Output size in MB")
+    parser.add_argument("--method", choices=["legacy", "capture", "spill"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.method:
+        start = time.time()
+        length = run(args.method, args.size)
+        elapsed = time.time() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        print("{} {} {}".format(length, elapsed, peak))
+        return
+
+    print("output size: {} MB".format(args.size))
+    for method in ("legacy", "capture", "spill"):
+        result = subprocess.check_output([sys.executable, __file__, "-s", str(args.size), "--method", method])
+        length, elapsed, peak = result.split()
+        print("{:8s} output {:6.1f} MB, time {:6.2f} s, peak RSS {:7.1f} MB".format(
+            method, int(length) / 1048576.0, float(elapsed), float(peak)))
+
+
+if __name__ == '__main__':
+    main()
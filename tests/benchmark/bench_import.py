@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+"""Measure the ``import condoor`` time with cold and warm pattern bundle.
+
+Usage: python tests/benchmark/bench_import.py [-n RUNS] [--importtime]
+
+Each measurement runs in a fresh interpreter. The cold run removes the bundle files before the import.
+With ``--importtime`` the cumulative time of the top imported modules is printed in the ``-X importtime`` style.
+"""
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+_IMPORT_SNIPPET = """
+import time
+t = time.time()
+import condoor
+print(time.time() - t)
+"""
+
+_IMPORTTIME_SNIPPET = """
+import time
+import __builtin__
+_import = __builtin__.__import__
+_stats = {}
+_depth = [0]
+
+def timed_import(name, *args, **kwargs):
+    if name in _stats:
+        return _import(name, *args, **kwargs)
+    _depth[0] += 1
+    t = time.time()
+    try:
+        return _import(name, *args, **kwargs)
+    finally:
+        _depth[0] -= 1
+        _stats.setdefault(name, (time.time() - t, _depth[0]))
+
+__builtin__.__import__ = timed_import
+import condoor
+__builtin__.__import__ = _import
+for name, (cumulative, depth) in sorted(_stats.items(), key=lambda item: -item[1][0])[:25]:
+    print("import time: {:10d} | {}{}".format(int(cumulative * 1e6), "  " * depth, name))
+"""
+
+
+def remove_bundles():
+    """Remove the pattern bundle files."""
+    for bundle in glob.glob("/tmp/condoor.*.bundle"):
+        os.remove(bundle)
+
+
+def run(snippet):
+    """Run the snippet in the fresh interpreter and return the output."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.check_output([sys.executable, "-c", snippet], env=env, cwd="/tmp")
+
+
+def measure(runs, cold):
+    """Return the list of import times."""
+    times = []
+    for _ in range(runs):
+        if cold:
+            remove_bundles()
+        times.append(float(run(_IMPORT_SNIPPET).strip().splitlines()[-1]))
+    return times
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=10)
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    cold = sorted(measure(args.runs, cold=True))
+    warm = sorted(measure(args.runs, cold=False))
+    print("cold import (yaml parse):   median {:.1f} ms, min {:.1f} ms".format(
+        cold[len(cold) // 2] * 1000, cold[0] * 1000))
+    print("warm import (bundle load):  median {:.1f} ms, min {:.1f} ms".format(
+        warm[len(warm) // 2] * 1000, warm[0] * 1000))
+
+    if args.importtime:
+        print("")
+        print("import time: cumulative [us] | imported package")
+        print(run(_IMPORTTIME_SNIPPET))
+
+
+if __name__ == '__main__':
+    main()
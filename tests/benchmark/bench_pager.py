@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+"""Measure the time of receiving the paged command output.
+
+Usage: python tests/benchmark/bench_pager.py [-l LINES] [-p PAGE_LINES]
+
+The spawned process emulates the device with the pager enabled: it prints the ``--More--`` prompt after every page
+and waits for the key press. The output is received with the pager prompt answered by the FSM transition
+(expect returns on every page and the space is sent with the send delay) and by the controller without leaving
+the read loop.
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import pexpect
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+
+GENERATOR = "; ".join([
+    "import sys, tty",
+    "tty.setcbreak(0)",
+    "sys.stdout.write('echo\\n')",
+    "lines = ['interface GigabitEthernet0/0/0/%d is up\\n' % i for i in range({lines})]",
+    "pages = [''.join(lines[i:i + {page}]) for i in range(0, len(lines), {page})]",
+    "[(sys.stdout.write(page + ' --More-- '), sys.stdout.flush(), sys.stdin.read(1),"
+    " sys.stdout.write('\\b' * 10 + ' ' * 10 + '\\b' * 10)) for page in pages[:-1]]",
+    "sys.stdout.write(pages[-1] + 'host#')",
+    "sys.stdout.flush()",
+])
+
+
+class FakeConnection(object):
+    """The minimal connection object required by the Controller."""
+
+    session_fd = None
+    hostname = "benchmark"
+
+
+def run(method, lines, page):
+    """Receive the paged output with the method and return the number of lines and pages."""
+    from condoor.controller import Controller
+
+    ctrl = Controller(FakeConnection())
+    ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, GENERATOR.format(lines=lines, page=page)))
+    prompt = re.compile("host#")
+    more = re.compile(" --More-- ")
+    segments = []
+    with ctrl.capture_output(pager=more if method == "controller" else None) as capture:
+        pages = 1
+        while True:
+            index = ctrl.expect([prompt, more, pexpect.TIMEOUT], timeout=60)
+            segments.append(capture.getvalue())
+            if index != 1:
+                break
+            # the FSM transition: a_send(" ") with the send delay
+            ctrl.send(" ")  # pylint: disable=no-member
+            pages += 1
+    pages += capture.pages
+    ctrl.disconnect()
+    return len("".join(segments).splitlines()) - 1, pages
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-l", "--lines", type=int, default=10000, help="Number of output lines")
+    parser.add_argument("-p", "--page", type=int, default=24, help="Number of lines per page")
+    args = parser.parse_args()
+
+    print("output: {} lines, {} lines per page".format(args.lines, args.page))
+    for method in ("fsm", "controller"):
+        start = time.time()
+        lines, pages = run(method, args.lines, args.page)
+        print("{:10s} {} lines, {} pages, time {:7.2f} s".format(method, lines, pages, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
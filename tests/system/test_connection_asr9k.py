@@ -70,6 +70,19 @@ class TestASR9KConnection(CondoorTestCase):
         with self.assertRaises(condoor.CommandSyntaxError):
             conn.send("wrongcommand")
 
+        output = conn.send("show version brief")
+        self.assertEqual("".join(conn.send_stream("show version brief")), output)
+        self.assertEqual(list(conn.send_stream("show version brief", lines=True)), output.splitlines())
+
+        result = conn.send("show version brief", command_result=True)
+        self.assertEqual(result, output)
+        self.assertEqual(result.command, "show version brief")
+        self.assertEqual(result.lines(), output.splitlines())
+        self.assertEqual(result.pages, 1)
+
+        with self.assertRaises(condoor.CommandSyntaxError):
+            list(conn.send_stream("wrongcommand"))
+
         conn.disconnect()
 
     def test_ASR9K_3_connection_wrong_user(self):
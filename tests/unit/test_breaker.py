@@ -0,0 +1,160 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+import logging
+import os
+import shelve
+import shutil
+import socket
+import tempfile
+import time
+
+from condoor import connection
+from condoor.breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN, hop_keys, failure_kind
+from condoor.connection import Connection
+from condoor.exceptions import ConnectionError, ConnectionTimeoutError, ConnectionAuthenticationError, \
+    CircuitOpenError
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.cache_dir, "cache.shelve")
+        self.breaker = CircuitBreaker(lambda mode: shelve.open(self.cache_file, mode),
+                                      threshold=3, window=60, cooldown=0.3)
+        self.key = hop_keys([MagicMock(hostname="host", port=23)])[0]
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_failure_kind(self):
+        """Breaker: Test the failure kinds"""
+        self.assertEqual(failure_kind(ConnectionTimeoutError("Timeout")), "timeout")
+        self.assertEqual(failure_kind(ConnectionAuthenticationError("Authentication failed")), "auth")
+        self.assertEqual(failure_kind(ConnectionError("telnet: Unable to connect to remote host")), "refused")
+        self.assertEqual(failure_kind(ConnectionError("Connection error")), "error")
+
+    def test_hop_keys(self):
+        """Breaker: Test the hop keys include the path"""
+        hops = [MagicMock(hostname="jumphost", port=22), MagicMock(hostname="10.0.0.1", port=23)]
+        self.assertEqual(hop_keys(hops), ["breaker:/jumphost:22", "breaker:/jumphost:22/10.0.0.1:23"])
+
+    def test_open_and_half_open(self):
+        """Breaker: Test the breaker opens after the failures and allows the trial after cooldown"""
+        self.breaker.failure(self.key, "timeout")
+        self.breaker.failure(self.key, "refused")
+        self.assertEqual(self.breaker.check(self.key), CLOSED)
+        self.breaker.failure(self.key, "timeout")
+        self.assertEqual(self.breaker.state(self.key)[0], OPEN)
+        with self.assertRaises(CircuitOpenError) as context:
+            self.breaker.check(self.key)
+        self.assertIn("timeout, refused, timeout", str(context.exception))
+
+        time.sleep(0.3)
+        self.assertEqual(self.breaker.check(self.key), HALF_OPEN)
+        # the trial failure opens the breaker again
+        self.breaker.failure(self.key, "auth")
+        self.assertEqual(self.breaker.state(self.key)[0], OPEN)
+
+        time.sleep(0.3)
+        self.assertEqual(self.breaker.check(self.key), HALF_OPEN)
+        self.breaker.success([self.key])
+        self.assertEqual(self.breaker.state(self.key), (CLOSED, None))
+
+    def test_window(self):
+        """Breaker: Test the failures out of the window are not counted"""
+        self.breaker.window = 0.2
+        self.breaker.failure(self.key, "timeout")
+        self.breaker.failure(self.key, "timeout")
+        time.sleep(0.2)
+        self.breaker.failure(self.key, "timeout")
+        self.assertEqual(self.breaker.check(self.key), CLOSED)
+
+    def test_disabled(self):
+        """Breaker: Test the breaker disabled with zero threshold"""
+        self.breaker.threshold = 0
+        for _ in range(5):
+            self.breaker.failure(self.key, "timeout")
+        self.assertEqual(self.breaker.check(self.key), CLOSED)
+
+
+class TestConnectionBreaker(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = patch.object(connection, "_CACHE_FILE", os.path.join(self.cache_dir, "cache.shelve"))
+        self.cache.start()
+        self.config = patch.dict(connection._C, {"breaker_threshold": 3, "breaker_cooldown": 0.3})
+        self.config.start()
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+        self.conn = Connection("test", ["ssh://127.0.0.1:{}".format(self.port), "telnet://target"],
+                               log_session=False, log_level=logging.ERROR)
+        self.chain = self.conn.connection_chains[0]
+
+    def tearDown(self):
+        self.config.stop()
+        self.cache.stop()
+        shutil.rmtree(self.cache_dir)
+
+    def failing_connect(self, deadline=None):
+        self.chain.failed_device = self.chain.devices[1]
+        raise ConnectionTimeoutError("Timeout")
+
+    def test_fail_fast(self):
+        """Breaker: Test the connection fails fast when the breaker is open"""
+        with patch.object(self.chain, "connect", side_effect=self.failing_connect) as connect:
+            for _ in range(3):
+                self.assertRaises(ConnectionTimeoutError, self.conn.connect)
+            self.assertRaises(CircuitOpenError, self.conn.connect)
+            self.assertEqual(connect.call_count, 3)
+
+        # the jumphost is not affected
+        keys = hop_keys([device.node_info for device in self.chain.devices])
+        self.assertEqual(self.conn._breaker.state(keys[0])[0], CLOSED)
+        self.assertEqual(self.conn._breaker.state(keys[1])[0], OPEN)
+
+        time.sleep(0.3)
+        with patch.object(self.chain, "connect", return_value=True) as connect:
+            self.conn.connect()
+            self.assertEqual(connect.call_count, 1)
+        self.assertEqual(self.conn._breaker.state(keys[1])[0], CLOSED)
+
+    def test_half_open_probe(self):
+        """Breaker: Test the half-open probe of the first hop port"""
+        self.chain.failed_device = self.chain.devices[0]
+        for _ in range(3):
+            self.conn._record_failure(self.chain, ConnectionError("Connection refused"))
+        time.sleep(0.3)
+        with patch.object(self.chain, "connect", return_value=True) as connect:
+            self.assertRaises(CircuitOpenError, self.conn.connect)
+            self.assertFalse(connect.called)
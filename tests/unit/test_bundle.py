@@ -0,0 +1,149 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+import os
+import re
+import shutil
+import tempfile
+
+from condoor.utils import load_bundle, save_bundle, _bundle_file_path, LRUCache, strip_named_groups
+from condoor.patterns import PatternManager, YPatternManager
+
+
+class TestBundle(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.bundle_path = os.path.join(self.tmp_dir, "test.bundle")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_roundtrip(self):
+        """Bundle: Test the dictionary saved and loaded"""
+        data = {'generic': {'prompt': '[#>]', 'list': ['XR', 'eXR']}}
+        save_bundle(self.bundle_path, ('1.0', ('file', 1.0, 10)), data)
+        self.assertEqual(load_bundle(self.bundle_path, ('1.0', ('file', 1.0, 10))), data)
+
+    def test_key_mismatch(self):
+        """Bundle: Test the bundle ignored when the key does not match"""
+        save_bundle(self.bundle_path, ('1.0', ('file', 1.0, 10)), {})
+        self.assertIsNone(load_bundle(self.bundle_path, ('1.0', ('file', 2.0, 10))))
+
+    def test_file_permissions(self):
+        """Bundle: Test the bundle private to the user"""
+        save_bundle(self.bundle_path, ('1.0', ), {})
+        self.assertEqual(os.stat(self.bundle_path).st_mode & 0o777, 0o600)
+        self.assertEqual(load_bundle(self.bundle_path, ('1.0', )), {})
+        os.chmod(self.bundle_path, 0o666)
+        self.assertIsNone(load_bundle(self.bundle_path, ('1.0', )))
+        self.assertIn(".{}.".format(os.getuid()), _bundle_file_path("patterns"))
+
+    def test_missing_and_corrupted(self):
+        """Bundle: Test the missing and corrupted bundle ignored"""
+        self.assertIsNone(load_bundle(self.bundle_path, ()))
+        with open(self.bundle_path, 'wb') as bundle:
+            bundle.write("corrupted")
+        self.assertIsNone(load_bundle(self.bundle_path, ()))
+
+
+class TestLazyPatterns(TestCase):
+    def test_lazy_compile(self):
+        """Bundle: Test the patterns compiled on first use"""
+        manager = PatternManager({'generic': {'prompt': '[#>]', 'wrong': '('}, 'XR': {'prompt': 'RP/.*#'}})
+        self.assertEqual(manager._dict_compiled, {})
+        pattern = manager.pattern('XR', 'prompt')
+        self.assertIs(manager.pattern('XR', 'prompt'), pattern)
+        self.assertEqual(manager.pattern('XR', 'wrong', compiled=False), '(')
+        with self.assertRaises(RuntimeError):
+            manager.pattern('XR', 'wrong')
+
+    def test_platform_bundle(self):
+        """Bundle: Test the platform bundle shared and falls back to generic patterns"""
+        generic = dict((key, key) for key in ('prompt', 'syntax_error', 'connection_closed', 'press_return', 'more',
+                                              'rommon', 'buffer_overflow', 'username', 'password',
+                                              'authentication_error', 'unable_to_connect', 'timeout', 'standby',
+                                              'pid2platform', 'vty', 'console', 'async_message', 'platform',
+                                              'version'))
+        generic['prompt_dynamic'] = '{prompt}[#>]'
+        manager = PatternManager({'generic': generic,
+                                  'XR': {'prompt': 'RP/.*#', 'prompt_dynamic': r'{prompt}(\([^()]*\))?#'}})
+        bundle = manager.bundle('XR')
+        self.assertIs(manager.bundle('XR'), bundle)
+        self.assertEqual(bundle.prompt.pattern, 'RP/.*#')
+        self.assertEqual(bundle.more.pattern, 'more')
+        self.assertEqual(bundle.version, 'version')
+        self.assertEqual(bundle.base_prompt.search("RP/0/RSP0/CPU0:ios(config)#").group('prompt'),
+                         "RP/0/RSP0/CPU0:ios")
+        with self.assertRaises(AttributeError):
+            bundle.prompt = None
+
+    def test_dynamic_prompt_cache(self):
+        """Bundle: Test the dynamic prompt compiled once"""
+        manager = PatternManager({'generic': {'prompt_dynamic': '{prompt}[#>]', 'rommon': 'rommon'}})
+        prompt_re = manager.dynamic_prompt('generic', ['prompt_dynamic', 'rommon'], 'host')
+        self.assertIs(manager.dynamic_prompt('generic', ['prompt_dynamic', 'rommon'], 'host'), prompt_re)
+        self.assertEqual(prompt_re.pattern, 'host[#>]|rommon')
+        self.assertEqual(manager.dynamic_prompt_cache.hits, 1)
+        self.assertEqual(manager.dynamic_prompt_cache.misses, 1)
+
+
+class TestLRUCache(TestCase):
+    def test_eviction(self):
+        """Bundle: Test the least recently used item evicted"""
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+class TestPlatformDetection(TestCase):
+    def test_platform_detection(self):
+        """Bundle: Test the combined platform detection matches the detection order"""
+        manager = YPatternManager()
+        prompts = ["RP/0/RSP0/CPU0:ios#", "RP/0/0/CPU0:xrv(config)#", "\r\nsysadmin-vm:0_RSP0#",
+                   "[sysadmin-vm:0_RP0:~]$", "switch#", "router(config-if)#", "nx-os-9k#", "$ ", "", "host>"]
+        platforms = manager._dict['generic']['prompt_detection']
+        for prompt in prompts:
+            expected = next((platform for platform in platforms
+                             if re.search(manager.pattern(platform, 'prompt'), prompt)), None)
+            self.assertEqual(manager.platform(prompt), expected, prompt)
+
+        self.assertEqual(manager.platform("RP/0/RSP0/CPU0:ios#"), "XR")
+        self.assertEqual(manager.platform_cache.hits, 1)
+
+    def test_strip_named_groups(self):
+        """Bundle: Test the named groups removed from pattern"""
+        self.assertEqual(strip_named_groups(r"(?P<hostname>.*?)\(?P<x>"), r"(?:.*?)\(?P<x>")
@@ -0,0 +1,209 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+from threading import Thread
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from condoor import connection
+from condoor.connection import Connection
+from condoor.controller import Controller
+from condoor.exceptions import CancelledError, ConnectionError
+
+DEVICE_SCRIPT = """
+import signal, sys, time
+if {ignore_break}:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+sys.stdout.write('host#')
+sys.stdout.flush()
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    try:
+        if line.strip() == 'slow':
+            time.sleep(30)
+        sys.stdout.write('done\\n')
+    except KeyboardInterrupt:
+        sys.stdout.write('^C\\n')
+    sys.stdout.write('host#')
+    sys.stdout.flush()
+"""
+
+
+class TestCancel(TestCase):
+    def setUp(self):
+        self.script_dir = tempfile.mkdtemp()
+        self.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+
+    def tearDown(self):
+        self.ctrl.disconnect()
+        shutil.rmtree(self.script_dir)
+
+    def spawn(self, ignore_break=False):
+        script_file = os.path.join(self.script_dir, "device.py")
+        with open(script_file, 'w') as script:
+            script.write(DEVICE_SCRIPT.format(ignore_break=ignore_break))
+        self.ctrl.spawn_session("{} {}".format(sys.executable, script_file))
+        self.ctrl.expect("host#", timeout=5)
+
+    def cancel_later(self, delay, timeout):
+        result = []
+
+        def cancel():
+            time.sleep(delay)
+            result.append(self.ctrl.cancel('\x03', timeout))
+
+        thread = Thread(target=cancel)
+        thread.start()
+        return thread, result
+
+    def test_cancel_resync(self):
+        """Cancel: Test the cancelled operation ends on the prompt after the break"""
+        self.spawn()
+        self.ctrl.sendline("slow")
+        thread, result = self.cancel_later(0.5, 5)
+        start = time.time()
+        with self.ctrl.budget(None):
+            self.assertRaises(CancelledError, self.ctrl.expect, "host#", timeout=30)
+        thread.join()
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(result, [True])
+
+        # the session is synchronized and the next operation is not cancelled
+        self.ctrl.sendline("fast")
+        with self.ctrl.budget(None):
+            self.assertEqual(self.ctrl.expect(["host#"], timeout=5), 0)
+        self.assertIn("done", self.ctrl.before)
+        self.assertTrue(self.ctrl.is_connected)
+
+    def test_cancel_teardown(self):
+        """Cancel: Test the session torn down if the break is ignored"""
+        self.spawn(ignore_break=True)
+        self.ctrl.sendline("slow")
+        thread, result = self.cancel_later(0.5, 0.5)
+        start = time.time()
+        with self.ctrl.budget(None):
+            self.assertRaises(CancelledError, self.ctrl.expect, "host#", timeout=30)
+        thread.join()
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(result, [False])
+        self.assertFalse(self.ctrl.is_connected)
+
+    def test_cancel_idle(self):
+        """Cancel: Test the cancel has no effect if no operation is in progress"""
+        self.spawn()
+        self.assertTrue(self.ctrl.cancel('\x03', 5))
+        self.ctrl.sendline("fast")
+        with self.ctrl.budget(None):
+            self.assertEqual(self.ctrl.expect(["host#"], timeout=5), 0)
+
+
+class TestConnectionCancel(TestCase):
+    def test_teardown_marks_disconnected(self):
+        """Cancel: Test the devices are marked disconnected by the cancelled thread when the session is killed"""
+        script_dir = tempfile.mkdtemp()
+        script_file = os.path.join(script_dir, "device.py")
+        with open(script_file, 'w') as script:
+            script.write(DEVICE_SCRIPT.format(ignore_break=True))
+        conn = Connection("test", ["telnet://jumphost", "telnet://target"], log_session=False,
+                          log_level=logging.ERROR)
+        chain = conn.connection_chains[0]
+        device = chain.target_device
+        device.prompt_re = re.compile("host#")
+        device.ctrl = chain.ctrl
+        chain.ctrl.spawn_session("{} {}".format(sys.executable, script_file))
+        chain.ctrl.expect("host#", timeout=5)
+        chain.ctrl.connected = True
+        for hop in chain.devices:
+            hop.connected = True
+        result = []
+
+        def cancel():
+            time.sleep(0.5)
+            result.append(conn.cancel(timeout=0.5))
+            result.append([hop.connected for hop in chain.devices])
+
+        thread = Thread(target=cancel)
+        thread.start()
+        try:
+            self.assertRaises(CancelledError, device.send, "slow", timeout=30)
+            thread.join(5)
+        finally:
+            chain.ctrl.disconnect()
+            shutil.rmtree(script_dir)
+        self.assertEqual(result, [False, [False, False]])
+
+    def test_fsm_cancellable(self):
+        """Cancel: Test the FSM run is the operation which can be cancelled"""
+        conn = Connection("test", "telnet://target", log_session=False, log_level=logging.ERROR)
+        device = conn.connection_chains[0].target_device
+        device.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+        with patch.object(device.ctrl, "send_command"), patch("condoor.device.FSM") as fsm:
+            fsm.return_value.run.side_effect = device.ctrl.request_cancel
+            self.assertTrue(device.run_fsm("test", "reload", [], [], 10))
+        self.assertFalse(device.ctrl.request_cancel())
+
+    def test_cancel_reconnect_backoff(self):
+        """Cancel: Test the reconnect cancelled while waiting for the next attempt"""
+        conn = Connection("test", "telnet://127.0.0.1:1", log_session=False, log_level=logging.ERROR)
+        chain = conn.connection_chains[0]
+        result = []
+
+        def cancel():
+            time.sleep(0.5)
+            result.append(conn.cancel(timeout=5))
+
+        thread = Thread(target=cancel)
+        config = {"reconnect_initial_delay": 30, "reconnect_probe_interval": 0.1}
+        with patch.dict(connection._C, config), patch.object(chain, "connect", side_effect=ConnectionError("Refused")):
+            thread.start()
+            start = time.time()
+            self.assertRaises(CancelledError, conn.reconnect, max_timeout=60)
+            thread.join()
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(result, [True])
+
+    def test_cancel_connect_teardown(self):
+        """Cancel: Test the chain torn down when the connection is cancelled"""
+        conn = Connection("test", ["telnet://jumphost", "telnet://target"], log_session=False,
+                          log_level=logging.ERROR)
+        chain = conn.connection_chains[0]
+        with patch.object(chain.ctrl, "spawn_session"), patch.object(chain.ctrl, "disconnect") as disconnect, \
+                patch.object(chain.devices[0], "connect", side_effect=CancelledError("Operation cancelled")):
+            self.assertRaises(CancelledError, conn.connect)
+            self.assertTrue(disconnect.called)
+        self.assertFalse(any(device.connected for device in chain.devices))
@@ -0,0 +1,231 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+import re
+import sys
+import time
+
+import pexpect
+from mock import MagicMock
+
+from condoor.controller import Controller
+from condoor.capture import OutputCapture, OutputStream, MappedOutput
+
+LINES = 20000
+SCRIPT = "import sys; sys.stdout.write('echo\\n' + ''.join('line %d\\n' % i for i in range({})) + 'host#')"
+
+
+class TestOutputCapture(TestCase):
+    def test_segments(self):
+        """Capture: Test the new segment started after complete one"""
+        capture = OutputCapture()
+        capture.begin()
+        capture.write("cmd\r\nfirst\r\n")
+        capture.write("second\r\n")
+        capture.end()
+        self.assertEqual(capture.getvalue(), "cmd\nfirst\nsecond\n")
+        self.assertEqual(capture.getvalue(skip_first_line=True), "first\nsecond\n")
+        capture.begin()
+        self.assertEqual(capture.getvalue(), "")
+
+    def test_skip_first_line_across_chunks(self):
+        """Capture: Test the first line removed when split across chunks"""
+        capture = OutputCapture()
+        capture.write("long ")
+        capture.write("echo\r")
+        capture.write("\noutput")
+        self.assertEqual(capture.getvalue(skip_first_line=True), "output")
+
+
+class TestSpill(TestCase):
+    def test_spill(self):
+        """Capture: Test the output spilled to the file above the threshold"""
+        capture = OutputCapture(spill_threshold=10)
+        capture.write("cmd\r\n")
+        self.assertFalse(capture.spilled)
+        capture.write("first line\r\n")
+        capture.write("second line\r\nlast")
+        self.assertTrue(capture.spilled)
+        self.assertEqual(capture.text(), "cmd\nfirst line\nsecond line\nlast")
+
+        with capture.getvalue(skip_first_line=True) as output:
+            self.assertIsInstance(output, MappedOutput)
+            self.assertEqual(len(output), 27)
+            self.assertEqual(output[0], "f")
+            self.assertEqual(output[-4:], "last")
+            self.assertEqual(str(output), "first line\nsecond line\nlast")
+            self.assertEqual(list(output), ["first line", "second line", "last"])
+            self.assertEqual(list(output.splitlines(True)), ["first line\n", "second line\n", "last"])
+            self.assertEqual(output.find("second"), 11)
+            self.assertEqual(output.search(re.compile(r"^sec\w+", re.MULTILINE)).group(), "second")
+            self.assertEqual([m.start() for m in output.finditer("line")], [6, 18])
+        self.assertEqual(len(output), 0)
+
+    def test_spill_waits_for_first_line(self):
+        """Capture: Test the output not spilled before the first line is complete"""
+        capture = OutputCapture(spill_threshold=2)
+        capture.write("long echo")
+        self.assertFalse(capture.spilled)
+        capture.write("\noutput")
+        self.assertTrue(capture.spilled)
+        self.assertEqual(str(capture.getvalue(skip_first_line=True)), "output")
+
+    def test_no_spill(self):
+        """Capture: Test the output below threshold returned as string"""
+        capture = OutputCapture(spill_threshold=100)
+        capture.write("cmd\noutput")
+        self.assertEqual(capture.getvalue(skip_first_line=True), "output")
+
+    def test_new_segment(self):
+        """Capture: Test the spilled file removed on the new segment"""
+        capture = OutputCapture(spill_threshold=2)
+        capture.write("cmd\noutput")
+        capture.end()
+        capture.begin()
+        self.assertFalse(capture.spilled)
+        capture.write("x")
+        self.assertEqual(capture.getvalue(), "x")
+
+
+class TestOutputStream(TestCase):
+    @staticmethod
+    def producer(chunks, error=None):
+        def func(sink):
+            for chunk in chunks:
+                sink(chunk)
+            if error:
+                raise error
+        return func
+
+    def test_chunks(self):
+        """Capture: Test the stream chunks with echo removed"""
+        stream = OutputStream(self.producer(["cmd", " echo\nfirst", "\nsecond\n"]))
+        self.assertEqual(list(stream), ["first", "\nsecond\n"])
+
+    def test_lines(self):
+        """Capture: Test the stream lines"""
+        stream = OutputStream(self.producer(["cmd\nfir", "st\nsec", "ond\n", "last"]), lines=True)
+        self.assertEqual(list(stream), ["first", "second", "last"])
+
+    def test_error(self):
+        """Capture: Test the stream raises the producer exception"""
+        stream = OutputStream(self.producer(["cmd\nfirst\n"], ValueError("error")), lines=True)
+        self.assertEqual(next(stream), "first")
+        with self.assertRaises(ValueError):
+            next(stream)
+
+    def test_close(self):
+        """Capture: Test the producer not blocked when the stream is closed"""
+        done = []
+
+        def func(sink):
+            for _ in range(100):
+                sink("line\n")
+            done.append(True)
+
+        stream = OutputStream(func, lines=True, maxsize=1)
+        self.assertEqual(next(stream), "line")
+        stream.close()
+        for _ in range(50):
+            if done:
+                break
+            time.sleep(0.1)
+        self.assertEqual(done, [True])
+
+
+class TestControllerCapture(TestCase):
+    def setUp(self):
+        self.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+        self.ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, SCRIPT.format(LINES)))
+
+    def tearDown(self):
+        self.ctrl.disconnect()
+
+    def test_capture(self):
+        """Capture: Test the long output captured in chunks"""
+        with self.ctrl.capture_output() as capture:
+            index = self.ctrl.expect([re.compile("host#"), pexpect.TIMEOUT], timeout=30)
+            self.assertEqual(index, 0)
+            self.assertEqual(self.ctrl.after, "host#")
+            # the output is longer than the single read, so it is consumed in chunks
+            self.assertGreater(len(capture._chunks), 1)
+
+        expected = "".join("line %d\n" % i for i in range(LINES))
+        self.assertEqual(capture.getvalue(skip_first_line=True), expected)
+
+    def test_no_capture(self):
+        """Capture: Test the expect without capture"""
+        index = self.ctrl.expect([re.compile("host#"), pexpect.TIMEOUT], timeout=30)
+        self.assertEqual(index, 0)
+        self.assertEqual(self.ctrl.before.replace('\r', ''),
+                         "echo\n" + "".join("line %d\n" % i for i in range(LINES)))
+
+    def test_sink(self):
+        """Capture: Test the output passed to the sink"""
+        chunks = []
+        with self.ctrl.capture_output(chunks.append) as capture:
+            self.ctrl.expect([re.compile("host#"), pexpect.TIMEOUT], timeout=30)
+        self.assertEqual("".join(chunks), "echo\n" + "".join("line %d\n" % i for i in range(LINES)))
+        self.assertEqual(capture.getvalue(), "")
+
+
+PAGER_SCRIPT = "; ".join([
+    "import sys, tty",
+    "tty.setcbreak(0)",
+    "sys.stdout.write('echo\\n')",
+    "lines = ['line %d\\n' % i for i in range({})]",
+    "pages = [''.join(lines[i:i + 20]) for i in range(0, len(lines), 20)]",
+    "[(sys.stdout.write(page + ' --More-- '), sys.stdout.flush(), sys.stdin.read(1),"
+    " sys.stdout.write('\\b' * 10 + ' ' * 10 + '\\b' * 10)) for page in pages[:-1]]",
+    "sys.stdout.write(pages[-1] + 'host#')",
+    "sys.stdout.flush()",
+])
+
+
+class TestControllerPager(TestCase):
+    def setUp(self):
+        self.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+        self.ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, PAGER_SCRIPT.format(200)))
+
+    def tearDown(self):
+        self.ctrl.disconnect()
+
+    def test_pager(self):
+        """Capture: Test the pager prompt answered by the controller and the pager artifacts removed"""
+        start = time.time()
+        more = re.compile(" --More-- ")
+        with self.ctrl.capture_output(pager=more) as capture:
+            # the pager pattern expected by the FSM is answered by the controller
+            index = self.ctrl.expect([re.compile("host#"), re.compile(" --More-- "), pexpect.TIMEOUT], timeout=30)
+        self.assertEqual(index, 0)
+        self.assertEqual(capture.pages, 9)
+        self.assertEqual(capture.getvalue(skip_first_line=True), "".join("line %d\n" % i for i in range(200)))
+        # no delay before sending the page answer
+        self.assertLess(time.time() - start, 9 * 0.3)
@@ -0,0 +1,132 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+import pexpect
+
+from condoor import connection
+from condoor.connection import Connection
+from condoor.controller import Controller
+from condoor.exceptions import ConnectionTimeoutError
+from condoor.fsm import FSM, action
+
+
+class TestBudget(TestCase):
+    def setUp(self):
+        self.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+        self.ctrl.spawn_session("/bin/sh -c 'sleep 30'")
+
+    def tearDown(self):
+        self.ctrl.disconnect()
+
+    def test_clamped_timeout(self):
+        """Deadline: Test the expect timeout limited to the budget"""
+        start = time.time()
+        with self.ctrl.budget(start + 0.5):
+            index = self.ctrl.expect(["never", pexpect.TIMEOUT], timeout=30)
+            self.assertEqual(index, 1)
+            self.assertLess(time.time() - start, 2)
+            # the expected TIMEOUT does not extend the budget
+            self.assertRaises(pexpect.TIMEOUT, self.ctrl.expect, ["never", pexpect.TIMEOUT], timeout=30)
+        self.assertIsNone(self.ctrl.deadline)
+
+    def test_nested_budget(self):
+        """Deadline: Test the nested budget only shortens the deadline"""
+        now = time.time()
+        with self.ctrl.budget(now + 10):
+            with self.ctrl.budget(now + 20):
+                self.assertEqual(self.ctrl.deadline, now + 10)
+            with self.ctrl.budget(now + 5):
+                self.assertEqual(self.ctrl.deadline, now + 5)
+            with self.ctrl.budget(None):
+                self.assertEqual(self.ctrl.deadline, now + 10)
+            self.assertEqual(self.ctrl.deadline, now + 10)
+        self.assertIsNone(self.ctrl.deadline)
+
+    def test_fsm_timeout_loop(self):
+        """Deadline: Test the FSM looping on TIMEOUT stops at the deadline"""
+        device = MagicMock(ctrl=self.ctrl)
+        device.counter = 0
+
+        @action
+        def retry(ctx):
+            ctx.device.counter += 1
+            return True
+
+        transitions = [
+            (pexpect.TIMEOUT, [0], 0, retry, 0.2),
+        ]
+        fsm = FSM("LOOP", device, ["never", pexpect.TIMEOUT], transitions, timeout=0.2, max_transitions=1000)
+        start = time.time()
+        with self.ctrl.budget(start + 1):
+            self.assertRaises(pexpect.TIMEOUT, fsm.run)
+        self.assertLess(time.time() - start, 2)
+        self.assertGreater(device.counter, 0)
+
+
+class TestConnectDeadline(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = patch.object(connection, "_CACHE_FILE", os.path.join(self.cache_dir, "cache.shelve"))
+        self.cache.start()
+        # the port accepts the connection but nothing is ever received
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(128)
+        self.conn = Connection("test", "telnet://127.0.0.1:{}".format(self.sock.getsockname()[1]),
+                               log_session=False, log_level=logging.ERROR)
+
+    def tearDown(self):
+        self.conn.disconnect()
+        self.sock.close()
+        self.cache.stop()
+        shutil.rmtree(self.cache_dir)
+
+    def test_connect_deadline(self):
+        """Deadline: Test the connection fails at the deadline instead of the connect timeout"""
+        start = time.time()
+        self.assertRaises(ConnectionTimeoutError, self.conn.connect, deadline=start + 1)
+        self.assertLess(time.time() - start, 5)
+        self.assertIs(self.conn.connection_chains[0].failed_device, self.conn.connection_chains[0].devices[0])
+
+    def test_deadline_passed(self):
+        """Deadline: Test no chain is tried after the deadline"""
+        chain = self.conn.connection_chains[0]
+        with patch.object(chain, "connect") as connect:
+            self.assertRaises(ConnectionTimeoutError, self.conn.connect, deadline=time.time() - 1)
+            self.assertRaises(ConnectionTimeoutError, self.conn.reconnect, deadline=time.time() - 1)
+            self.assertFalse(connect.called)
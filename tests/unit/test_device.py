@@ -0,0 +1,302 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+import re
+import sys
+import time
+from threading import Thread
+
+from condoor.controller import Controller
+from condoor.device import Device
+from condoor.drivers import eXR
+from condoor.exceptions import CommandError, CommandSyntaxError, CommandTimeoutError
+from condoor.scheduler import PRIORITY_INTERACTIVE
+
+CALVADOS_SCRIPT = """
+import sys, tty, time
+tty.setcbreak(0)
+cmd = ''
+while not cmd.endswith('\\n'):
+    cmd += sys.stdin.read(1)
+    sys.stdout.write(cmd[-1])
+    sys.stdout.flush()
+sys.stdout.write('\\nroot connected from 127.0.0.1 using console on xr-vm_node0_RSP0_CPU0\\nsysadmin-vm:0_RSP0#')
+sys.stdout.flush()
+if cmd.strip() == 'admin show led':
+    # no term len echoed
+    sys.stdin.read(1)
+    sys.stdout.write('\\nsysadmin-vm:0_RSP0#')
+    sys.stdout.flush()
+elif cmd.strip() != 'admin':
+    sys.stdout.write(' terminal length 0\\nsysadmin-vm:0_RSP0# show inventory chassis\\n')
+    sys.stdout.write('Fri Sep  2  14:00:27.628 UTC\\n Name: Rack 0    Descr: ASR-9904 AC Chassis\\n')
+    sys.stdout.write('sysadmin-vm:0_RSP0#\\nRP/0/RSP0/CPU0:ios#')
+    sys.stdout.flush()
+time.sleep(10)
+"""
+
+
+class TestPromptUpdate(TestCase):
+    def setUp(self):
+        node_info = MagicMock(hostname="host", port=23)
+        self.device = Device(None, node_info, driver_name='generic', is_target=True)
+
+    def test_unchanged_prompt(self):
+        """Device: Test driver, mode and hostname not re-evaluated for the same prompt"""
+        with patch.object(self.device, 'update_driver', wraps=self.device.update_driver) as update_driver:
+            self.device.update_prompt("RP/0/RSP0/CPU0:ios#")
+            self.device.update_prompt("RP/0/RSP0/CPU0:ios#")
+            self.assertEqual(update_driver.call_count, 1)
+        self.assertEqual(self.device.driver_name, "XR")
+        self.assertEqual(self.device.mode, "global")
+        self.assertEqual(self.device.hostname, "ios")
+
+    def test_changed_prompt(self):
+        """Device: Test driver and mode updated when prompt changes"""
+        self.device.update_prompt("RP/0/RSP0/CPU0:ios#")
+        self.device.update_prompt("RP/0/RSP0/CPU0:ios(config)#")
+        self.assertEqual(self.device.mode, "config")
+        self.device.update_prompt("sysadmin-vm:0_RSP0#")
+        self.assertEqual(self.device.driver_name, "Calvados")
+        self.assertEqual(self.device.mode, "admin")
+
+    def test_clear_info(self):
+        """Device: Test prompt re-evaluated after clearing the device info"""
+        self.device.update_prompt("RP/0/RSP0/CPU0:ios#")
+        self.device.clear_info()
+        with patch.object(self.device, 'update_driver', wraps=self.device.update_driver) as update_driver:
+            self.device.update_prompt("RP/0/RSP0/CPU0:ios#")
+            self.assertEqual(update_driver.call_count, 1)
+
+
+class TestCommandKey(TestCase):
+    def setUp(self):
+        node_info = MagicMock(hostname="host", port=23)
+        self.device = Device(None, node_info, driver_name='generic', is_target=True)
+        self.device.update_prompt("RP/0/RSP0/CPU0:ios#")
+
+    def test_priority_and_deadline(self):
+        """Device: Test only the commands with the same priority and without deadline are coalesced"""
+        key = self.device._command_key("show version", None)
+        self.assertEqual(key, self.device._command_key(" show  version ", None))
+        self.assertNotEqual(key, self.device._command_key("show version", None, priority=PRIORITY_INTERACTIVE))
+        self.assertIsNone(self.device._command_key("show version", None, deadline=time.time() + 1))
+
+
+class TestStreamTimeout(TestCase):
+    def test_adaptive_timeout(self):
+        """Device: Test the streamed command uses the adaptive timeout by default"""
+        node_info = MagicMock(hostname="host", port=23)
+        device = Device(None, node_info, driver_name='generic', is_target=True)
+        device.connected = True
+        with patch.object(device, '_command_timeout', return_value=123) as command_timeout:
+            self.assertEqual(device.send_stream("show bgp")._func.args[1], 123)
+            command_timeout.assert_called_once_with("show bgp")
+            self.assertEqual(device.send_stream("show bgp", timeout=600)._func.args[1], 600)
+
+
+class TestReload(TestCase):
+    def test_session_held(self):
+        """Device: Test the commands from other threads wait for the reload end"""
+        node_info = MagicMock(hostname="host", port=23)
+        device = Device(None, node_info, driver_name='generic', is_target=True)
+        device.ctrl = MagicMock()
+        acquired = []
+
+        def other():
+            acquired.append(device.command_queue.acquire(deadline=time.time() + 0.1))
+
+        def reload(reload_timeout, save_config):
+            thread = Thread(target=other)
+            thread.start()
+            thread.join(5)
+
+        with patch.object(device.driver, 'reload', side_effect=reload):
+            device.reload(10, False, True)
+        self.assertEqual(acquired, [False])
+        other()
+        self.assertEqual(acquired, [False, True])
+        device.command_queue.release()
+
+
+class TestCalvadosCommand(TestCase):
+    def setUp(self):
+        node_info = MagicMock(hostname="host", port=23)
+        chain = MagicMock()
+        chain.get_previous_prompts.return_value = []
+        self.device = Device(chain, node_info, driver_name='eXR', is_target=True)
+        self.device.prompt_re = re.compile("RP/0/RSP0/CPU0:ios#")
+        self.device.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+        self.device.ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, CALVADOS_SCRIPT))
+
+    def tearDown(self):
+        self.device.ctrl.disconnect()
+
+    def test_admin_command(self):
+        """Device: Test the admin command output captured from Calvados"""
+        output = self.device.execute_command("admin show inventory chassis", 10, None)
+        self.assertEqual(output.strip(), "Name: Rack 0    Descr: ASR-9904 AC Chassis")
+
+    def test_admin_shell(self):
+        """Device: Test the admin command switching to Calvados completes without waiting"""
+        start = time.time()
+        self.device.execute_command("admin", 10, None)
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(self.device.driver_name, "Calvados")
+
+    def test_no_term_length(self):
+        """Device: Test the prompt requested shortly after the Calvados prompt without term len"""
+        start = time.time()
+        with patch.dict(eXR._C, {"calvados_term_wait_time": 0.5}):
+            self.device.execute_command("admin show led", 30, None)
+        self.assertLess(time.time() - start, 5)
+
+
+EXR_SCRIPT = """
+import sys, tty
+tty.setcbreak(0)
+prompt = 'RP/0/RSP0/CPU0:ios#'
+while True:
+    cmd = ''
+    while not cmd.endswith('\\n'):
+        cmd += sys.stdin.read(1)
+        sys.stdout.write(cmd[-1])
+        sys.stdout.flush()
+    cmd = cmd.strip()
+    if cmd == 'admin':
+        prompt = 'sysadmin-vm:0_RSP0#'
+        sys.stdout.write('\\nroot connected from 127.0.0.1 using console on xr-vm_node0_RSP0_CPU0\\n' + prompt)
+    elif cmd == 'exit':
+        prompt = 'RP/0/RSP0/CPU0:ios#'
+        sys.stdout.write(prompt)
+    else:
+        sys.stdout.write('output of ' + cmd + '\\n' + prompt)
+    sys.stdout.flush()
+"""
+
+
+class TestAdminMode(TestCase):
+    def setUp(self):
+        node_info = MagicMock(hostname="host", port=23)
+        chain = MagicMock()
+        chain.get_previous_prompts.return_value = []
+        self.device = Device(chain, node_info, driver_name='eXR', is_target=True)
+        self.device.update_prompt("RP/0/RSP0/CPU0:ios#")
+        self.device.prompt_re = self.device.driver.make_dynamic_prompt(self.device.prompt)
+        self.device.connected = True
+        self.device.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+        self.device.ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, EXR_SCRIPT))
+
+    def tearDown(self):
+        self.device.ctrl.disconnect()
+
+    def test_admin_mode(self):
+        """Device: Test the commands executed natively in Calvados within the admin mode context"""
+        with self.device.admin_mode():
+            self.assertEqual(self.device.driver_name, "Calvados")
+            self.assertEqual(self.device.mode, "admin")
+            self.assertEqual(self.device.send("show inventory chassis").strip(), "output of show inventory chassis")
+            with self.device.admin_mode():
+                self.assertEqual(self.device.send("show install active").strip(), "output of show install active")
+
+        self.assertEqual(self.device.driver_name, "eXR")
+        self.assertEqual(self.device.mode, "global")
+        self.assertEqual(self.device.send("show version").strip(), "output of show version")
+
+    def test_admin_mode_not_coalesced(self):
+        """Device: Test the commands of the other threads not coalesced within the admin mode context"""
+        keys = []
+
+        def other():
+            keys.append(self.device._command_key("show version", None))
+
+        with self.device.admin_mode():
+            self.assertIsNotNone(self.device._command_key("show version", None))
+            thread = Thread(target=other)
+            thread.start()
+            thread.join(5)
+        self.assertEqual(keys, [None])
+        other()
+        self.assertIsNotNone(keys[-1])
+
+    def test_stream_in_admin_mode(self):
+        """Device: Test the command streaming rejected within the admin mode context"""
+        with self.device.admin_mode():
+            with self.assertRaises(CommandError):
+                list(self.device.send_stream("show running-config"))
+            self.assertEqual(self.device.send("show install active").strip(), "output of show install active")
+        self.assertEqual("".join(self.device.send_stream("show version")).strip(), "output of show version")
+
+    def test_terminal_session(self):
+        """Device: Test the terminal session commands sent after the unsupported one"""
+        sent = []
+
+        def send(cmd, **kwargs):
+            sent.append(cmd)
+            if cmd == "terminal exec prompt no-timestamp":
+                raise CommandSyntaxError("Command unknown", host="host", command=cmd)
+
+        with patch.object(self.device, "send", side_effect=send):
+            self.device.prepare_terminal_session()
+        self.assertEqual(sent, self.device.driver.prepare_terminal_session)
+
+    def failing_exit(self):
+        send = self.device.send
+
+        def failing_send(cmd, **kwargs):
+            if cmd == "exit":
+                raise CommandTimeoutError("Timeout", host="host", command=cmd)
+            return send(cmd, **kwargs)
+
+        return patch.object(self.device, "send", side_effect=failing_send)
+
+    def test_exit_error(self):
+        """Device: Test the admin mode exit error raised if the context completed"""
+        with self.failing_exit():
+            with self.assertRaises(CommandTimeoutError):
+                with self.device.admin_mode():
+                    pass
+        self.assertIsNone(self.device._admin_owner)
+
+    def test_exit_error_not_masking(self):
+        """Device: Test the admin mode exit error not masking the error raised in the context"""
+        with self.failing_exit():
+            with self.assertRaises(ValueError):
+                with self.device.admin_mode():
+                    raise ValueError("error in the context")
+        self.assertIsNone(self.device._admin_owner)
+
+    def test_not_supported(self):
+        """Device: Test the admin mode not supported by the platform"""
+        self.device.driver_name = "NX-OS"
+        with self.assertRaises(CommandError):
+            with self.device.admin_mode():
+                pass
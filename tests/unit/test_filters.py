@@ -0,0 +1,113 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+
+from condoor.device import Device
+from condoor.exceptions import CommandSyntaxError
+from condoor.result import CommandResult, filter_output
+
+
+OUTPUT = """interface Loopback0
+ description router id
+ ipv4 address 10.0.0.1 255.255.255.255
+!
+interface GigabitEthernet0/0/0/0
+ description uplink
+ shutdown
+!
+router static
+ address-family ipv4 unicast
+  0.0.0.0/0 10.0.1.1
+!"""
+
+
+def make_device(driver_name):
+    node_info = MagicMock(hostname="host", port=23)
+    return Device(None, node_info, driver_name=driver_name, is_target=True)
+
+
+class TestFilterCommand(TestCase):
+    def test_ios_single_filter(self):
+        """Filters: Test IOS accepts only one device side filter"""
+        driver = make_device('IOS').driver
+        self.assertEqual(driver.filter_command("show run", [('section', '^interface'), ('include', 'desc')]),
+                         ("show run | section ^interface", [('include', 'desc')]))
+        self.assertEqual(driver.filter_command("show run | include a", [('exclude', 'b')]),
+                         ("show run | include a", [('exclude', 'b')]))
+
+    def test_xr_chained_filters(self):
+        """Filters: Test XR accepts the chained device side filters"""
+        driver = make_device('XR').driver
+        self.assertEqual(driver.filter_command("show run", [('begin', 'router'), ('exclude', '!')]),
+                         ("show run | begin router | exclude !", []))
+
+    def test_unsupported_filter(self):
+        """Filters: Test the unsupported filter and the following filters left for local filtering"""
+        driver = make_device('jumphost').driver
+        self.assertEqual(driver.filter_command("cat log", [('include', 'a b'), ('section', 'x'), ('include', 'y')]),
+                         ("cat log | grep -E -e 'a b'", [('section', 'x'), ('include', 'y')]))
+        driver = make_device('generic').driver
+        self.assertEqual(driver.filter_command("show run", [('include', 'a')]), ("show run", [('include', 'a')]))
+
+
+class TestFilterOutput(TestCase):
+    def test_filters(self):
+        """Filters: Test the local output filters"""
+        self.assertEqual(filter_output(OUTPUT, [('include', 'description')]),
+                         " description router id\n description uplink")
+        self.assertEqual(filter_output(OUTPUT, [('begin', '^router'), ('exclude', '^!')]),
+                         "router static\n address-family ipv4 unicast\n  0.0.0.0/0 10.0.1.1")
+        self.assertEqual(filter_output(OUTPUT, [('section', 'Gigabit')]),
+                         "interface GigabitEthernet0/0/0/0\n description uplink\n shutdown")
+        self.assertEqual(filter_output(OUTPUT, [('begin', 'not found')]), "")
+        with self.assertRaises(ValueError):
+            filter_output(OUTPUT, [('count', 'a')])
+
+
+class TestQuery(TestCase):
+    def test_device_side(self):
+        """Filters: Test the query sends the filtered command"""
+        device = make_device('XR')
+        with patch.object(device, 'send', return_value="filtered") as send:
+            self.assertEqual(device.query("show run", [('include', 'a')]), "filtered")
+            self.assertEqual(send.call_args[0][0], "show run | include a")
+
+    def test_fallback(self):
+        """Filters: Test the query filters the output locally when the device rejects the filter"""
+        device = make_device('IOS')
+        result = CommandResult(OUTPUT, command="show run", elapsed=1.0)
+        with patch.object(device, 'send', side_effect=[CommandSyntaxError("Invalid input"), result]) as send:
+            output = device.query("show run", [('section', 'Loopback'), ('include', 'description')],
+                                  command_result=True)
+            self.assertEqual(send.call_args[0][0], "show run")
+        self.assertEqual(output, " description router id")
+        self.assertEqual(output.command, "show run")
+        self.assertEqual(output.elapsed, 1.0)
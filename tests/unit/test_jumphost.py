@@ -0,0 +1,241 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+import os
+import platform
+import shutil
+import socket
+import sys
+import tempfile
+
+from condoor.controller import Controller
+from condoor.device import Device
+from condoor.drivers import jumphost
+from condoor.exceptions import CommandSyntaxError
+from condoor.protocols.ssh import SSH
+
+# ssh emulator logging the arguments and executing the last argument locally
+FAKE_SSH = """#!/bin/sh
+echo "$*" >> "$(dirname "$0")/calls"
+for last; do :; done
+case "$*" in
+    *BatchMode=yes*) ;;
+    *)
+        printf "Password: "
+        stty -echo; read password; stty echo; echo
+        [ "$password" = "secret" ] || exit 255
+        ;;
+esac
+exec /bin/sh -c "$last"
+"""
+
+
+class TestFramedCommand(TestCase):
+    def setUp(self):
+        node_info = MagicMock(hostname="host", port=22)
+        chain = MagicMock()
+        chain.get_previous_prompts.return_value = []
+        self.device = Device(chain, node_info, driver_name='jumphost')
+        self.device.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+        self.device.ctrl.spawn_session("/bin/sh -c 'PS1=\"$ \" exec /bin/sh -i'")
+        self.device.ctrl.setecho(True)
+        self.device.ctrl.expect_exact("$ ", timeout=10)
+        self.device.prompt = "$ "
+        self.device.prompt_re = self.device.driver.make_dynamic_prompt(self.device.prompt)
+        self.device.connected = True
+        self.device.driver.after_connect()
+
+    def tearDown(self):
+        self.device.ctrl.disconnect()
+
+    def test_prompt_in_output(self):
+        """Jumphost: Test the framed command output containing the prompt characters"""
+        output = self.device.send("printf 'first $ line\\n$ second\\n'")
+        self.assertEqual(output, "first $ line\n$ second\n")
+        self.assertEqual(self.device.last_exit_status, 0)
+        self.assertEqual(self.device.send("echo done"), "done\n")
+
+    def test_exit_status(self):
+        """Jumphost: Test the framed command exit status"""
+        self.assertEqual(self.device.send("false"), "")
+        self.assertEqual(self.device.last_exit_status, 1)
+
+    def test_command_line_end(self):
+        """Jumphost: Test the framed command with the comment or the trailing separator"""
+        self.assertEqual(self.device.send("echo one # comment"), "one\n")
+        self.assertEqual(self.device.send("echo two;"), "two\n")
+        self.assertEqual(self.device.send("true &"), "")
+        self.assertTrue(self.device.driver.framed_commands)
+        self.assertEqual(self.device.send("echo three"), "three\n")
+
+    def test_interactive_not_framed(self):
+        """Jumphost: Test the commands starting the interactive session are not framed"""
+        driver = self.device.driver
+        for cmd in ["su -", "sudo -i", "bash", "ssh host", "cd /tmp && exec sh", "telnet host 23", "exit",
+                    "printf 'a\nb'\n"]:
+            self.assertIsNone(driver.frame_command(cmd), cmd)
+        for cmd in ["ls", "cat ~/.ssh/config", "ssh-keygen -l -f key", "sudo ls"]:
+            self.assertIsNotNone(driver.frame_command(cmd), cmd)
+
+    def test_command_not_found(self):
+        """Jumphost: Test the unknown command raises syntax error"""
+        with self.assertRaises(CommandSyntaxError):
+            self.device.send("condoor-unknown-command")
+        self.assertEqual(self.device.send("echo next"), "next\n")
+
+    def test_batched_discovery(self):
+        """Jumphost: Test the version and hostname collected in one call"""
+        self.assertEqual(self.device.version_text.strip(), "{} {}".format(platform.system(), platform.release()))
+        with patch.object(self.device, 'send') as send:
+            self.assertEqual(self.device.hostname_text.strip(), socket.gethostname())
+            self.assertFalse(send.called)
+
+
+# shell rejecting the command grouping
+NO_GROUPING_SHELL = """
+import sys
+sys.stdout.write('$ ')
+sys.stdout.flush()
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    if line.startswith('}'):
+        continue
+    if '{' in line:
+        sys.stdout.write('syntax error\\n$ ')
+    else:
+        sys.stdout.write('output of ' + line.strip() + '\\n$ ')
+    sys.stdout.flush()
+"""
+
+
+class TestFramingNotSupported(TestCase):
+    def setUp(self):
+        node_info = MagicMock(hostname="host", port=22)
+        chain = MagicMock()
+        chain.get_previous_prompts.return_value = []
+        self.device = Device(chain, node_info, driver_name='jumphost')
+        self.device.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+        self.device.ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, NO_GROUPING_SHELL))
+        self.device.ctrl.setecho(True)
+        self.device.ctrl.expect_exact("$ ", timeout=10)
+        self.device.prompt = "$ "
+        self.device.prompt_re = self.device.driver.make_dynamic_prompt(self.device.prompt)
+        self.device.connected = True
+
+    def tearDown(self):
+        self.device.ctrl.disconnect()
+
+    def test_framing_checked_once(self):
+        """Jumphost: Test the framing disabled after the check and the commands sent once"""
+        self.device.driver.after_connect()
+        self.assertFalse(self.device.driver.framed_commands)
+        with patch.object(self.device.ctrl, 'send_command', wraps=self.device.ctrl.send_command) as send_command:
+            self.assertEqual(self.device.send("ls").strip(), "output of ls")
+            send_command.assert_called_once_with("ls")
+        self.device.driver.after_connect()
+        self.assertFalse(self.device.driver.framed_commands)
+
+
+class TestExecChannel(TestCase):
+    def setUp(self):
+        self.bin_dir = tempfile.mkdtemp()
+        ssh_path = os.path.join(self.bin_dir, "ssh")
+        with open(ssh_path, "w") as ssh_file:
+            ssh_file.write(FAKE_SSH)
+        os.chmod(ssh_path, 0o755)
+        self.env = patch.dict(os.environ, {"PATH": self.bin_dir + os.pathsep + os.environ["PATH"]})
+        self.env.start()
+        self.config = patch.dict(jumphost._C, {"exec_discovery": True})
+        self.config.start()
+        jumphost.exec_cache.clear()
+
+        node_info = MagicMock(hostname="host", port=22, username="user", password="secret")
+        chain = MagicMock()
+        self.device = Device(chain, node_info, driver_name='jumphost')
+        chain.devices = [self.device, MagicMock()]
+        self.device.protocol = SSH(self.device)
+
+    def tearDown(self):
+        self.config.stop()
+        self.env.stop()
+        jumphost.exec_cache.clear()
+        shutil.rmtree(self.bin_dir)
+
+    def calls(self):
+        with open(os.path.join(self.bin_dir, "calls")) as calls_file:
+            return calls_file.read().splitlines()
+
+    def test_execute(self):
+        """Jumphost: Test the command executed over the SSH exec channel with password"""
+        self.assertEqual(self.device.protocol.execute("echo one; echo two; exit 3"), ("one\ntwo\n", 3))
+        self.assertIn("-T", self.calls()[0].split())
+
+    def test_execute_wrong_password(self):
+        """Jumphost: Test the SSH exec channel with wrong password"""
+        self.device.protocol.password = "wrong"
+        self.assertEqual(self.device.protocol.execute("echo one")[1], 255)
+
+    def test_execute_public_key(self):
+        """Jumphost: Test the SSH exec channel without password uses the batch mode"""
+        self.device.protocol.password = None
+        self.assertEqual(self.device.protocol.execute("echo one"), ("one\n", 0))
+        self.assertIn("BatchMode=yes", self.calls()[0])
+
+    def test_discovery_cached(self):
+        """Jumphost: Test the version and hostname collected over the SSH exec channel and cached"""
+        with patch.object(self.device, 'send') as send:
+            self.assertEqual(self.device.version_text.strip(), "{} {}".format(platform.system(), platform.release()))
+            self.assertEqual(self.device.hostname_text.strip(), socket.gethostname())
+            self.assertFalse(send.called)
+
+        chain = MagicMock()
+        device = Device(chain, self.device.node_info, driver_name='jumphost')
+        chain.devices = [device]
+        device.protocol = SSH(device)
+        self.assertEqual(device.version_text, self.device.version_text)
+        self.assertEqual(len(self.calls()), 1)
+
+    def test_fallback(self):
+        """Jumphost: Test the interactive shell used if the SSH exec channel fails"""
+        self.device.protocol.password = "wrong"
+        with patch.object(self.device, 'send', return_value="Linux 4.4\nhost\n") as send:
+            self.assertEqual(self.device.version_text, "Linux 4.4")
+            send.assert_called_once_with(jumphost.VERSION_CMD, timeout=10)
+        self.assertEqual(len(jumphost.exec_cache), 0)
+
+    def test_not_first_hop(self):
+        """Jumphost: Test the SSH exec channel not used for the second jumphost"""
+        self.device.chain.devices.reverse()
+        with patch.object(self.device, 'send', return_value="Linux 4.4\nhost\n"):
+            self.assertEqual(self.device.version_text, "Linux 4.4")
+        self.assertFalse(os.path.exists(os.path.join(self.bin_dir, "calls")))
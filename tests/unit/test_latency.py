@@ -0,0 +1,176 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+import os
+import shelve
+import shutil
+import tempfile
+
+from condoor import latency
+from condoor.connection import Connection
+from condoor.device import Device
+from condoor.latency import LatencyHistory, command_key, hop_key
+
+
+class TestLatencyHistory(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.cache_dir, "cache.shelve")
+        self.cache_open = lambda mode: shelve.open(self.cache_file, mode)
+        self.key = command_key("ASR-9904", "6.1.2")
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_keys(self):
+        """Latency: Test the history keys"""
+        self.assertEqual(self.key, "latency:ASR-9904:6.1.2")
+        self.assertIsNone(command_key(None, None))
+        hops = [MagicMock(hostname="jumphost", port=22), MagicMock(hostname="10.0.0.1", port=23)]
+        self.assertEqual(hop_key(hops), "latency:/jumphost:22/10.0.0.1:23")
+
+    def test_adaptive_timeout(self):
+        """Latency: Test the adaptive timeout from the 99th percentile"""
+        history = LatencyHistory(factor=3, floor=10, ceiling=100, min_samples=10)
+        for _ in range(9):
+            history.record(self.key, "show version", 5)
+        self.assertEqual(history.timeout(self.key, "show version", 60), 60)
+        history.record(self.key, "show version", 6)
+        self.assertEqual(history.percentile(self.key, "show version"), 6)
+        self.assertEqual(history.timeout(self.key, "show version", 60), 18)
+
+        for _ in range(10):
+            history.record(self.key, "show clock", 0.1)
+            history.record(self.key, "show tech", 50)
+        self.assertEqual(history.timeout(self.key, "show clock", 60), 10)
+        self.assertEqual(history.timeout(self.key, "show tech", 60), 100)
+        self.assertEqual(history.timeout(None, "show tech", 60), 60)
+
+    def test_percentile(self):
+        """Latency: Test the percentile of the recent samples"""
+        history = LatencyHistory(size=100)
+        for value in range(1, 201):
+            history.record(self.key, "show run", value)
+        self.assertEqual(history.percentile(self.key, "show run", 50), 150)
+        self.assertEqual(history.percentile(self.key, "show run", 99), 199)
+        self.assertIsNone(history.percentile(self.key, "show clock"))
+
+    def test_disabled(self):
+        """Latency: Test the default timeout used if disabled"""
+        history = LatencyHistory(enabled=False, min_samples=1)
+        history.record(self.key, "show version", 1)
+        self.assertEqual(history.timeout(self.key, "show version", 60), 60)
+
+    def test_changed(self):
+        """Latency: Test the history changed only by the new samples"""
+        history = LatencyHistory()
+        history.load(self.cache_open, [self.key])
+        self.assertFalse(history.changed)
+        history.record(self.key, "show version", 1)
+        self.assertTrue(history.changed)
+        history.save(self.cache_open)
+        self.assertFalse(history.changed)
+
+    def test_persistence(self):
+        """Latency: Test the samples merged in the persistent cache"""
+        first = LatencyHistory(min_samples=2)
+        second = LatencyHistory(min_samples=2)
+        first.load(self.cache_open, [self.key])
+        second.load(self.cache_open, [self.key])
+        first.record(self.key, "show version", 1)
+        second.record(self.key, "show version", 2)
+        first.save(self.cache_open)
+        second.save(self.cache_open)
+
+        third = LatencyHistory(min_samples=2)
+        third.record(self.key, "show version", 3)
+        third.load(self.cache_open, [self.key, None])
+        self.assertEqual(third.percentile(self.key, "show version", 100), 3)
+        self.assertEqual(third._records[self.key]["show version"], [1, 2, 3])
+        # the loaded samples are not saved again
+        third.save(self.cache_open)
+        self.assertEqual(shelve.open(self.cache_file, 'r')[self.key], {"show version": [1, 2, 3]})
+
+
+class TestDeviceTimeout(TestCase):
+    def setUp(self):
+        self.history = patch.object(latency, "history", LatencyHistory(factor=2, floor=1, min_samples=3))
+        self.history.start()
+        node_info = MagicMock(hostname="host", port=23)
+        chain = MagicMock()
+        self.device = Device(chain, node_info, driver_name='generic')
+        chain.devices = [self.device]
+        self.device.platform = "ASR-9904"
+        self.device.os_version = "6.1.2"
+        self.device.connected = True
+
+    def tearDown(self):
+        self.history.stop()
+
+    def test_send_timeout(self):
+        """Latency: Test the adaptive command timeout used if not given"""
+        with patch.object(self.device, "_execute_queued", return_value="") as execute:
+            self.device.send("show  version")
+            self.assertEqual(execute.call_args[0][1], 60)
+            for _ in range(3):
+                latency.history.record(self.device._latency_key(), "show version", 2)
+            self.device.send("show version")
+            self.assertEqual(execute.call_args[0][1], 4)
+            self.device.send("show version", timeout=30)
+            self.assertEqual(execute.call_args[0][1], 30)
+
+    def test_connect_timeout(self):
+        """Latency: Test the adaptive connection timeout"""
+        self.assertEqual(self.device.connect_timeout(120), 120)
+        for _ in range(3):
+            latency.history.record(self.device._hop_latency_key(), latency.CONNECT, 5)
+        self.assertEqual(self.device.connect_timeout(120), 10)
+
+
+class TestConnectionSave(TestCase):
+    def setUp(self):
+        self.history = patch.object(latency, "history", LatencyHistory())
+        self.history.start()
+        self.conn = Connection("test", "telnet://host", log_session=False)
+
+    def tearDown(self):
+        self.history.stop()
+
+    def test_save_changed(self):
+        """Latency: Test the history stored only if changed"""
+        with patch.object(self.conn, "_cache_open", return_value=None) as cache_open:
+            self.conn._write_cache()
+            self.conn._save_latency()
+            self.assertEqual(cache_open.call_count, 1)
+            cache_open.reset_mock()
+            latency.history.record(latency.command_key("ASR-9904", "6.1.2"), "show version", 1)
+            self.conn._save_latency()
+            self.assertTrue(cache_open.called)
@@ -0,0 +1,149 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+import logging
+import sys
+
+from condoor import controller, pattern_manager
+from condoor.connection import Connection
+from condoor.controller import Controller
+from condoor.messages import MessageDemux, Subscription
+
+IOS_MESSAGE = "*Mar  1 00:01:02.123: %LINK-3-UPDOWN: Interface Gi0/1, changed state to down"
+XR_MESSAGE = "RP/0/RSP0/CPU0:Jan 10 10:10:10.123 UTC: ifmgr[123]: %PKT_INFRA-LINK-3-UPDOWN : Interface Gi0/0/0/0"
+
+SCRIPT = ("import sys, time; sys.stdout.write('show run\\r\\nline 1\\r\\n{message}\\r\\nline 2\\r\\n');"
+          "sys.stdout.flush(); time.sleep(0.2); sys.stdout.write('line 3\\r\\nrouter#')")
+
+
+class TestMessageDemux(TestCase):
+    def setUp(self):
+        self.messages = []
+        self.demux = MessageDemux(pattern_manager.pattern('IOS', 'async_message'))
+        self.demux.subscribe(Subscription(self.messages.append))
+
+    def test_no_pattern(self):
+        """Messages: Test the text unchanged without the pattern"""
+        demux = MessageDemux()
+        text = "line\r\n{}\r\nrouter#".format(IOS_MESSAGE)
+        self.assertEqual(demux.feed(text), text)
+
+    def test_message_removed(self):
+        """Messages: Test the complete message lines removed and published"""
+        text = "show int\r\nline 1\r\n{0}\r\n{0}\r\nline 2\r\nrouter#".format(IOS_MESSAGE)
+        self.assertEqual(self.demux.feed(text), "show int\r\nline 1\r\nline 2\r\nrouter#")
+        self.assertEqual(self.messages, [IOS_MESSAGE, IOS_MESSAGE])
+        self.assertEqual(self.demux.count, 2)
+
+    def test_message_split(self):
+        """Messages: Test the incomplete message held back until the line end"""
+        self.assertEqual(self.demux.feed("line 1\r\n" + IOS_MESSAGE[:50]), "line 1\r\n")
+        self.assertEqual(self.messages, [])
+        self.assertEqual(self.demux.feed(IOS_MESSAGE[50:] + "\r\nline 2\r\n"), "line 2\r\n")
+        self.assertEqual(self.messages, [IOS_MESSAGE])
+
+    def test_not_line_start(self):
+        """Messages: Test the message pattern ignored in the middle of the line"""
+        self.assertEqual(self.demux.feed("echo "), "echo ")
+        self.assertEqual(self.demux.feed(IOS_MESSAGE + "\r\n"), IOS_MESSAGE + "\r\n")
+        self.assertEqual(self.demux.feed(IOS_MESSAGE + "\r\n"), "")
+        self.assertEqual(self.messages, [IOS_MESSAGE])
+
+    def test_pending_limit(self):
+        """Messages: Test the long incomplete line passed as output"""
+        demux = MessageDemux(pattern_manager.pattern('IOS', 'async_message'), max_pending=100)
+        text = IOS_MESSAGE + "x" * 100
+        self.assertEqual(demux.feed(text), text)
+
+    def test_subscription_pattern(self):
+        """Messages: Test the subscription pattern and the unsubscribe"""
+        updown = []
+        subscription = Subscription(updown.append, "UPDOWN")
+        self.demux.subscribe(subscription)
+        self.demux.feed("%SYS-5-CONFIG_I: Configured from console\r\n{}\r\n".format(IOS_MESSAGE))
+        self.assertEqual(updown, [IOS_MESSAGE])
+        self.assertEqual(len(self.messages), 2)
+        self.demux.unsubscribe(subscription)
+        self.demux.feed(IOS_MESSAGE + "\r\n")
+        self.assertEqual(subscription.count, 1)
+
+    def test_subscriber_error(self):
+        """Messages: Test the subscriber error does not break the output"""
+        self.demux.subscribe(Subscription(MagicMock(side_effect=ValueError)))
+        self.assertEqual(self.demux.feed(IOS_MESSAGE + "\r\nline\r\n"), "line\r\n")
+        self.assertEqual(self.messages, [IOS_MESSAGE])
+
+    def test_xr_prompt(self):
+        """Messages: Test the XR message removed and the prompt passed"""
+        demux = MessageDemux(pattern_manager.pattern('XR', 'async_message'))
+        text = "line\r\n{}\r\nRP/0/RSP0/CPU0:router#".format(XR_MESSAGE)
+        self.assertEqual(demux.feed(text), "line\r\nRP/0/RSP0/CPU0:router#")
+
+
+class TestControllerDemux(TestCase):
+    def run_command(self, background_reader):
+        messages = []
+        with patch.dict(controller._C, {"demux_messages": True, "background_reader": background_reader}):
+            ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+            ctrl.demux.subscribe(Subscription(messages.append))
+            ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, SCRIPT.format(message=IOS_MESSAGE)))
+            ctrl.demux.pattern = pattern_manager.pattern('IOS', 'async_message')
+            try:
+                with ctrl.capture_output() as capture:
+                    ctrl.expect("router#", timeout=5)
+            finally:
+                ctrl.disconnect()
+        self.assertEqual(capture.getvalue(skip_first_line=True), "line 1\nline 2\nline 3\n")
+        self.assertEqual(messages, [IOS_MESSAGE])
+
+    def test_demux(self):
+        """Messages: Test the message removed from the command output"""
+        self.run_command(background_reader=False)
+
+    def test_demux_reader(self):
+        """Messages: Test the message removed by the background reader"""
+        self.run_command(background_reader=True)
+
+
+class TestConnectionSubscription(TestCase):
+    def test_subscribe_all_chains(self):
+        """Messages: Test the subscription delivered from every connection chain"""
+        conn = Connection("test", [["telnet://host1"], ["telnet://host2"]], log_session=False,
+                          log_level=logging.ERROR)
+        messages = []
+        subscription = conn.subscribe_messages(messages.append, "UPDOWN")
+        for chain in conn.connection_chains:
+            chain.ctrl.demux.pattern = pattern_manager.pattern('IOS', 'async_message')
+            chain.ctrl.demux.feed(IOS_MESSAGE + "\r\n")
+        self.assertEqual(messages, [IOS_MESSAGE, IOS_MESSAGE])
+        conn.unsubscribe_messages(subscription)
+        conn.connection_chains[0].ctrl.demux.feed(IOS_MESSAGE + "\r\n")
+        self.assertEqual(len(messages), 2)
@@ -0,0 +1,142 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+from threading import Thread
+import sys
+import time
+
+import pexpect
+
+from condoor import controller
+from condoor.controller import Controller
+from condoor.reader import RingBuffer, ReaderSpawn
+
+LINES = 20000
+SCRIPT = "import sys; sys.stdout.write('echo\\n' + ''.join('line %d\\n' % i for i in range({})) + 'host#')"
+
+
+class TestRingBuffer(TestCase):
+    def test_fifo(self):
+        """Reader: Test the ring buffer returns the text in order up to the size"""
+        ring = RingBuffer(100)
+        ring.write("abc")
+        ring.write("defgh")
+        self.assertEqual(ring.read(5, 0), "abcde")
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(ring.read(100, 0), "fgh")
+        self.assertIsNone(ring.read(100, 0.05))
+
+    def test_eof(self):
+        """Reader: Test the remaining text is returned before EOF"""
+        ring = RingBuffer(100)
+        ring.write("abc")
+        ring.close()
+        self.assertEqual(ring.read(100, 0), "abc")
+        self.assertRaises(pexpect.EOF, ring.read, 100, 0)
+
+    def test_drop(self):
+        """Reader: Test the oldest text dropped on overflow"""
+        ring = RingBuffer(10, overflow='drop')
+        ring.write("0123456")
+        ring.write("789ab")
+        self.assertEqual(ring.stats['overflows'], 1)
+        self.assertEqual(ring.stats['dropped'], 2)
+        ring.write("cdefghijklmnop")
+        self.assertEqual(ring.stats['dropped'], 16)
+        self.assertEqual(len(ring), 10)
+        self.assertEqual(ring.read(100, 0), "ghijklmnop")
+
+    def test_backpressure(self):
+        """Reader: Test the writer waits for the free space"""
+        ring = RingBuffer(10)
+        ring.write("0123456789")
+        thread = Thread(target=ring.write, args=("abc",))
+        thread.start()
+        time.sleep(0.2)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(ring.read(5, 0), "01234")
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(ring.read(100, 0), "56789abc")
+        self.assertEqual(ring.stats['backpressure'], 1)
+        self.assertGreater(ring.stats['backpressure_time'], 0.1)
+        self.assertEqual(ring.stats['peak'], 10)
+
+    def test_unknown_policy(self):
+        """Reader: Test the unknown overflow policy"""
+        self.assertRaises(ValueError, RingBuffer, 10, 'unknown')
+
+
+class TestReaderSpawn(TestCase):
+    def test_drained_without_expect(self):
+        """Reader: Test the output is drained while no expect is running"""
+        session = ReaderSpawn("{} -c \"{}\"".format(sys.executable, SCRIPT.format(LINES)), echo=False)
+        try:
+            time.sleep(1)
+            self.assertTrue(session.ring_buffer.stats['received'] > 100000)
+            session.expect("host#", timeout=5)
+            self.assertIn("line {}".format(LINES - 1), session.before)
+            self.assertRaises(pexpect.EOF, session.expect, "never", timeout=5)
+        finally:
+            session.close()
+
+    def test_timeout(self):
+        """Reader: Test the expect timeout"""
+        session = ReaderSpawn("/bin/sh -c 'sleep 10'", echo=False)
+        try:
+            start = time.time()
+            self.assertRaises(pexpect.TIMEOUT, session.expect, "never", timeout=0.3)
+            self.assertLess(time.time() - start, 1)
+        finally:
+            session.close()
+
+
+class TestControllerReader(TestCase):
+    def setUp(self):
+        self.config = patch.dict(controller._C, {"background_reader": True})
+        self.config.start()
+        self.ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+        self.ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, SCRIPT.format(LINES)))
+
+    def tearDown(self):
+        self.ctrl.disconnect()
+        self.config.stop()
+
+    def test_capture(self):
+        """Reader: Test the output captured through the ring buffer"""
+        with self.ctrl.capture_output() as capture:
+            self.ctrl.expect("host#", timeout=10)
+        lines = capture.getvalue(skip_first_line=True).splitlines()
+        self.assertEqual(len(lines), LINES)
+        self.assertEqual(lines[-1], "line {}".format(LINES - 1))
+        stats = self.ctrl.reader_stats
+        self.assertGreater(stats['received'], 0)
+        self.assertEqual(stats['dropped'], 0)
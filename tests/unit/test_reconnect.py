@@ -0,0 +1,224 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from threading import Timer
+from mock import patch
+import logging
+import socket
+import time
+
+from condoor import connection
+from condoor.connection import Connection
+from condoor.utils import is_port_open, probe_port, backoff_delays, probe_ports, is_reachable
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def listen(port):
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", port))
+    sock.listen(128)
+    return sock
+
+
+class TestBackoff(TestCase):
+    def test_delays(self):
+        """Reconnect: Test the exponential backoff with cap"""
+        delays = backoff_delays(2, 2, 30)
+        self.assertEqual([next(delays) for _ in range(6)], [2, 4, 8, 16, 30, 30])
+
+    def test_jitter(self):
+        """Reconnect: Test the backoff jitter"""
+        delays = backoff_delays(10, 1, 30, jitter=0.2)
+        values = [next(delays) for _ in range(100)]
+        self.assertTrue(all(8 <= value <= 12 for value in values))
+        self.assertGreater(len(set(values)), 1)
+
+
+class TestPortProbe(TestCase):
+    def setUp(self):
+        self.port = free_port()
+        self.sockets = []
+        self.config = patch.dict(connection._C, {"reconnect_probe_interval": 0.05, "probe_release_time": 0})
+        self.config.start()
+        self.conn = Connection("test", "telnet://127.0.0.1:{}".format(self.port), log_session=False,
+                               log_level=logging.ERROR)
+        self.chain = self.conn.connection_chains[0]
+
+    def tearDown(self):
+        self.config.stop()
+        for sock in self.sockets:
+            sock.close()
+
+    def test_is_port_open(self):
+        """Reconnect: Test the TCP port probe"""
+        self.assertFalse(is_port_open("127.0.0.1", self.port))
+        self.sockets.append(listen(self.port))
+        self.assertTrue(is_port_open("127.0.0.1", self.port))
+
+    def test_probe_port(self):
+        """Reconnect: Test the port probe distinguishes unreachable port and unresolved hostname"""
+        self.assertIs(probe_port("127.0.0.1", self.port), False)
+        self.assertIsNone(probe_port("condoor.invalid", self.port))
+        self.sockets.append(listen(self.port))
+        self.assertIs(probe_port("127.0.0.1", self.port), True)
+
+    def test_port_open(self):
+        """Reconnect: Test the whole delay waited if the port accepts connection"""
+        self.sockets.append(listen(self.port))
+        start = time.time()
+        with patch.object(connection, "probe_port", wraps=probe_port) as probe:
+            self.conn._wait_for_first_hop(self.chain, 0.3, start + 10)
+            self.assertEqual(probe.call_count, 1)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertLess(time.time() - start, 1)
+
+    def test_port_reopened(self):
+        """Reconnect: Test the attempt starts when the port starts accepting connection"""
+        timer = Timer(0.5, lambda: self.sockets.append(listen(self.port)))
+        timer.start()
+        start = time.time()
+        self.conn._wait_for_first_hop(self.chain, 0.1, start + 10)
+        elapsed = time.time() - start
+        timer.join()
+        self.assertGreaterEqual(elapsed, 0.5)
+        self.assertLess(elapsed, 2)
+
+    def test_deadline(self):
+        """Reconnect: Test the port probing stops at the deadline"""
+        start = time.time()
+        self.conn._wait_for_first_hop(self.chain, 0.1, start + 0.4)
+        elapsed = time.time() - start
+        self.assertGreaterEqual(elapsed, 0.4)
+        self.assertLess(elapsed, 1)
+
+    def test_probe_timeout(self):
+        """Reconnect: Test the probing continues while the probe times out"""
+        states = [False, False, True]
+        with patch.object(connection, "probe_port", side_effect=lambda *args, **kwargs: states.pop(0)):
+            start = time.time()
+            self.conn._wait_for_first_hop(self.chain, 5, start + 10)
+            elapsed = time.time() - start
+        self.assertEqual(states, [])
+        self.assertLess(elapsed, 1)
+
+    def test_unresolved(self):
+        """Reconnect: Test the plain delay waited if the first hop hostname can not be resolved"""
+        self.chain.devices[0].node_info.hostname = "condoor.invalid"
+        start = time.time()
+        self.conn._wait_for_first_hop(self.chain, 0.3, start + 10)
+        elapsed = time.time() - start
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLess(elapsed, 1)
+
+
+class TestReachability(TestCase):
+    def setUp(self):
+        self.closed_port = free_port()
+        self.open_port = free_port()
+        self.sock = listen(self.open_port)
+        self.config = patch.dict(connection._C, {"probe_release_time": 0})
+        self.config.start()
+
+    def tearDown(self):
+        self.config.stop()
+        self.sock.close()
+
+    def test_probe_ports(self):
+        """Reachability: Test the parallel port probes"""
+        results = probe_ports([("127.0.0.1", self.open_port), ("127.0.0.1", self.closed_port),
+                               ("condoor.invalid", 22), ("127.0.0.1", self.open_port)])
+        self.assertEqual(results, {("127.0.0.1", self.open_port): True, ("127.0.0.1", self.closed_port): False,
+                                   ("condoor.invalid", 22): None})
+
+    def test_unfinished_probe(self):
+        """Reachability: Test the probe not completed within the timeout is reported as unknown"""
+        class SlowSocket(object):
+            def __init__(self, *args):
+                pass
+
+            def settimeout(self, timeout):
+                pass
+
+            def connect(self, address):
+                time.sleep(0.5)
+
+            def close(self):
+                pass
+
+        with patch("condoor.utils.socket.socket", SlowSocket):
+            results = probe_ports([("127.0.0.1", self.open_port)], timeout=0.1)
+        self.assertEqual(results, {("127.0.0.1", self.open_port): None})
+
+    def test_is_reachable(self):
+        """Reachability: Test the reachability check waits only after the port accepted connection"""
+        with patch("condoor.utils.time.sleep") as sleep:
+            start = time.time()
+            self.assertFalse(is_reachable("127.0.0.1", self.closed_port))
+            self.assertFalse(is_reachable("condoor.invalid", 22))
+            self.assertLess(time.time() - start, 1)
+            self.assertFalse(sleep.called)
+            self.assertTrue(is_reachable("127.0.0.1", self.open_port))
+            sleep.assert_called_once_with(2)
+
+    def test_line_release(self):
+        """Reachability: Test the wait for the terminal server line release after the TELNET port probe"""
+        urls = [["telnet://127.0.0.1:{}".format(self.open_port), "telnet://target"],
+                ["ssh://127.0.0.1:{}".format(self.open_port), "telnet://target"]]
+        conn = Connection("test", urls, log_session=False, log_level=logging.ERROR)
+        with patch.dict(connection._C, {"probe_release_time": 2}), patch("condoor.connection.time.sleep") as sleep:
+            conn._unreachable_chains()
+            sleep.assert_called_once_with(2)
+            sleep.reset_mock()
+            conn.connection_chains = conn.connection_chains[1:]
+            conn._unreachable_chains()
+            self.assertFalse(sleep.called)
+
+    def test_chain_order(self):
+        """Reachability: Test the chains with unreachable first hop are tried last"""
+        urls = [["telnet://127.0.0.1:{}".format(self.closed_port), "telnet://target"],
+                ["telnet://127.0.0.1:{}".format(self.open_port), "telnet://target"],
+                ["telnet://condoor.invalid", "telnet://target"]]
+        conn = Connection("test", urls, log_session=False, log_level=logging.ERROR)
+        self.assertEqual(list(conn._chain_indices()), [1, 2, 0])
+
+        conn._last_chain_index = 1
+        conn.connection_chains[1].devices[0].node_info.verify_reachability = lambda host, port: False
+        self.assertEqual(list(conn._chain_indices()), [2, 0, 1])
+
+        with patch.dict(connection._C, {"reachability_check": False}):
+            self.assertEqual(list(conn._chain_indices()), [2, 0, 1])
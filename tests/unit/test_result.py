@@ -0,0 +1,109 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+import pickle
+import re
+
+from condoor.result import CommandResult
+
+
+OUTPUT = """Building configuration...
+interface GigabitEthernet0/0/0/0
+ description uplink
+ ipv4 address 10.0.0.1 255.255.255.0
+!
+interface GigabitEthernet0/0/0/1
+ shutdown
+!
+router bgp 65000
+ neighbor 10.0.0.2
+  remote-as 65001
+!
+end
+"""
+
+
+class TestCommandResult(TestCase):
+    def test_string_compatibility(self):
+        """CommandResult: Test the result behaves as string"""
+        result = CommandResult(OUTPUT, command="show running-config", elapsed=0.5)
+        self.assertEqual(result, OUTPUT)
+        self.assertIsInstance(result, str)
+        self.assertEqual(result.splitlines(), OUTPUT.splitlines())
+        self.assertIn("router bgp", result)
+        self.assertEqual(result.bytes, len(OUTPUT))
+        self.assertEqual(result.command, "show running-config")
+        self.assertEqual(result.pages, 1)
+
+    def test_line_access(self):
+        """CommandResult: Test the line access by number"""
+        lines = OUTPUT.splitlines()
+        result = CommandResult(OUTPUT)
+        self.assertEqual(result.line_count, len(lines))
+        self.assertEqual([result.line(number) for number in range(result.line_count)], lines)
+        self.assertEqual(result.line(-1), "end")
+        self.assertEqual(result.lines(1, 3), lines[1:3])
+        self.assertEqual(result.line_number(result.find("router")), lines.index("router bgp 65000"))
+        with self.assertRaises(IndexError):
+            result.line(len(lines))
+
+    def test_line_edge_cases(self):
+        """CommandResult: Test the line index of the empty lines and the missing trailing new line"""
+        self.assertEqual(CommandResult("").line_count, 0)
+        self.assertEqual(CommandResult("\n").lines(), [""])
+        self.assertEqual(CommandResult("a\n\nb").lines(), ["a", "", "b"])
+
+    def test_grep(self):
+        """CommandResult: Test grep returns the matching lines with the line numbers"""
+        result = CommandResult(OUTPUT)
+        self.assertEqual(result.grep("^interface"), [(1, "interface GigabitEthernet0/0/0/0"),
+                                                     (5, "interface GigabitEthernet0/0/0/1")])
+        self.assertEqual(result.grep("shutdown|remote-as"), [(6, " shutdown"), (10, "  remote-as 65001")])
+        self.assertEqual(result.grep(re.compile("INTERFACE", re.I)), [(1, "interface GigabitEthernet0/0/0/0"),
+                                                                      (5, "interface GigabitEthernet0/0/0/1")])
+        self.assertEqual(result.grep("not found"), [])
+
+    def test_section(self):
+        """CommandResult: Test section returns the matching line and the indented lines"""
+        result = CommandResult(OUTPUT)
+        self.assertEqual(result.section("^router bgp"), "router bgp 65000\n neighbor 10.0.0.2\n  remote-as 65001")
+        self.assertEqual(result.section("^interface").splitlines(), OUTPUT.splitlines()[1:4] +
+                         OUTPUT.splitlines()[5:7])
+
+    def test_pickle(self):
+        """CommandResult: Test the result can be pickled"""
+        result = CommandResult(OUTPUT, command="show running-config", prompt="RP/0/RP0/CPU0:router#", pages=3)
+        result.line(0)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            restored = pickle.loads(pickle.dumps(result, protocol))
+            self.assertEqual(restored, OUTPUT)
+            self.assertEqual(restored.command, result.command)
+            self.assertEqual(restored.pages, 3)
+            self.assertEqual(restored.line(-1), "end")
@@ -0,0 +1,248 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+from unittest import TestCase
+from threading import Thread, Event
+import time
+
+from condoor.scheduler import SingleFlight, CommandQueue, normalize_command, \
+    PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK
+
+
+class TestSingleFlight(TestCase):
+    def test_normalize_command(self):
+        """Scheduler: Test command normalization"""
+        self.assertEqual(normalize_command("  show   running-config \r"), "show running-config")
+
+    def test_coalescing(self):
+        """Scheduler: Test concurrent identical calls executed once"""
+        flight = SingleFlight()
+        started = Event()
+        release = Event()
+        calls = []
+
+        def func():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "output"
+
+        results = []
+
+        def worker():
+            results.append(flight.do("key", func))
+
+        leader = Thread(target=worker)
+        leader.start()
+        started.wait(5)
+        waiters = [Thread(target=worker) for _ in range(3)]
+        for waiter in waiters:
+            waiter.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader] + waiters:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["output"] * 4)
+
+    def test_exception_shared(self):
+        """Scheduler: Test exception propagated to the waiters"""
+        flight = SingleFlight()
+        started = Event()
+        errors = []
+
+        def func():
+            started.set()
+            time.sleep(0.2)
+            raise ValueError("error")
+
+        def worker():
+            try:
+                flight.do("key", func)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = Thread(target=worker)
+        leader.start()
+        started.wait(5)
+        waiter = Thread(target=worker)
+        waiter.start()
+        leader.join(5)
+        waiter.join(5)
+
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+    def test_no_key(self):
+        """Scheduler: Test calls without key are not coalesced"""
+        flight = SingleFlight()
+        self.assertEqual(flight.do(None, lambda x: x * 2, 2), 4)
+
+
+class TestCommandQueue(TestCase):
+    def test_fifo_order(self):
+        """Scheduler: Test the command queue order"""
+        queue = CommandQueue()
+        order = []
+
+        def worker(index):
+            with queue:
+                order.append(index)
+
+        queue.acquire()
+        threads = []
+        for index in range(5):
+            thread = Thread(target=worker, args=(index, ))
+            thread.start()
+            threads.append(thread)
+            while len(queue) < index + 1:
+                time.sleep(0.01)
+        queue.release()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(order, range(5))
+
+    def test_reentrant(self):
+        """Scheduler: Test the command queue is reentrant"""
+        queue = CommandQueue()
+        with queue:
+            with queue:
+                pass
+        with self.assertRaises(RuntimeError):
+            queue.release()
+
+    def test_priority_order(self):
+        """Scheduler: Test the interactive commands jump ahead of the bulk commands"""
+        queue = CommandQueue()
+        order = []
+
+        def worker(name, priority):
+            queue.acquire(priority)
+            order.append(name)
+            queue.release()
+
+        queue.acquire()
+        requests = [("bulk1", PRIORITY_BULK), ("normal", PRIORITY_NORMAL),
+                    ("bulk2", PRIORITY_BULK), ("interactive", PRIORITY_INTERACTIVE)]
+        threads = []
+        for index, (name, priority) in enumerate(requests):
+            thread = Thread(target=worker, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            while len(queue) < index + 1:
+                time.sleep(0.01)
+        queue.release()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(order, ["interactive", "normal", "bulk1", "bulk2"])
+
+    def test_deadline_drop(self):
+        """Scheduler: Test the command dropped when the deadline passes in the queue"""
+        queue = CommandQueue()
+        queue.acquire()
+        results = []
+        thread = Thread(target=lambda: results.append(queue.acquire(PRIORITY_NORMAL, time.time() + 0.1)))
+        thread.start()
+        thread.join(5)
+        queue.release()
+
+        self.assertEqual(results, [False])
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.dropped, 1)
+
+    def test_backpressure(self):
+        """Scheduler: Test the caller blocked when the queue is full"""
+        queue = CommandQueue(maxsize=1)
+        queue.acquire()
+        waiter = Thread(target=lambda: (queue.acquire(), queue.release()))
+        waiter.start()
+        while len(queue) < 1:
+            time.sleep(0.01)
+
+        results = []
+        blocked = Thread(target=lambda: results.append(queue.acquire(PRIORITY_INTERACTIVE, time.time() + 0.1)))
+        blocked.start()
+        blocked.join(5)
+        self.assertEqual(results, [False])
+        self.assertEqual(queue.blocked, 1)
+
+        queue.release()
+        waiter.join(5)
+        self.assertTrue(queue.acquire(PRIORITY_NORMAL, time.time() + 1))
+        queue.release()
+
+    def test_blocked_priority_order(self):
+        """Scheduler: Test the callers blocked on the full queue served in the priority order"""
+        queue = CommandQueue(maxsize=1)
+        order = []
+
+        def worker(name, priority):
+            queue.acquire(priority)
+            order.append(name)
+            queue.release()
+
+        queue.acquire()
+        threads = [Thread(target=worker, args=("first", PRIORITY_NORMAL))]
+        threads[0].start()
+        while len(queue) < 1:
+            time.sleep(0.01)
+        requests = [("bulk", PRIORITY_BULK), ("normal", PRIORITY_NORMAL), ("interactive", PRIORITY_INTERACTIVE)]
+        for index, (name, priority) in enumerate(requests):
+            thread = Thread(target=worker, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            while queue.blocked < index + 1:
+                time.sleep(0.01)
+        queue.release()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(order, ["first", "interactive", "normal", "bulk"])
+
+    def test_expected_run_time_drop(self):
+        """Scheduler: Test the command dropped when it can not complete before the deadline"""
+        queue = CommandQueue()
+        self.assertFalse(queue.acquire(PRIORITY_NORMAL, time.time() + 1, expected=2))
+        self.assertEqual(queue.dropped, 1)
+
+        queue.acquire()
+        results = []
+        thread = Thread(target=lambda: results.append(queue.acquire(PRIORITY_NORMAL, time.time() + 5, expected=4.8)))
+        start = time.time()
+        thread.start()
+        thread.join(5)
+        queue.release()
+
+        self.assertEqual(results, [False])
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(len(queue), 0)
+        self.assertTrue(queue.acquire(PRIORITY_NORMAL, time.time() + 5, expected=1))
+        queue.release()
@@ -0,0 +1,132 @@
+# =============================================================================
+#
+# Copyright (c)  2016, Cisco Systems
+# All rights reserved.
+#
+# # Author: Klaudiusz Staniek
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+# =============================================================================
+
+
+from unittest import TestCase
+from mock import MagicMock, patch
+import logging
+import sys
+
+from condoor import controller
+from condoor.connection import Connection
+from condoor.controller import Controller
+from condoor.tap import SessionTap, TapConsumer
+
+LINES = 20000
+SCRIPT = "import sys; sys.stdout.write('echo\\n' + ''.join('line %d\\n' % i for i in range({})) + 'host#')"
+
+
+class TestSessionTap(TestCase):
+    def test_fan_out(self):
+        """Tap: Test the same chunk object queued for every consumer and the log file"""
+        logfile = MagicMock()
+        tap = SessionTap(logfile)
+        first, second = TapConsumer(), TapConsumer()
+        tap.add(first)
+        tap.add(second)
+        chunk = "output\r\n"
+        tap.write(chunk)
+        tap.flush()
+        logfile.write.assert_called_once_with(chunk)
+        self.assertTrue(logfile.flush.called)
+        self.assertIs(first.get(0), chunk)
+        self.assertIs(second.get(0), chunk)
+
+    def test_drop(self):
+        """Tap: Test the chunks dropped for the slow consumer"""
+        tap = SessionTap()
+        slow, fast = TapConsumer(maxsize=2), TapConsumer(maxsize=10)
+        tap.add(slow)
+        tap.add(fast)
+        for index in range(5):
+            tap.write(str(index))
+        self.assertEqual((slow.received, slow.dropped), (2, 3))
+        self.assertEqual(fast.received, 5)
+        self.assertEqual([slow.get(0), slow.get(0), slow.get(0)], ["0", "1", None])
+
+    def test_detach(self):
+        """Tap: Test the slow consumer detached and its iteration stopped"""
+        tap = SessionTap()
+        consumer = TapConsumer(maxsize=2, overflow='detach', poll_interval=0.01)
+        tap.add(consumer)
+        for index in range(5):
+            tap.write(str(index))
+        self.assertTrue(consumer.closed)
+        self.assertEqual(consumer.dropped, 1)
+        self.assertEqual(list(consumer), ["0", "1"])
+
+    def test_close(self):
+        """Tap: Test the closed consumer removed from all the taps"""
+        taps = [SessionTap(), SessionTap()]
+        consumer = TapConsumer(poll_interval=0.01)
+        for tap in taps:
+            tap.add(consumer)
+        taps[0].write("a")
+        consumer.close()
+        for tap in taps:
+            tap.write("b")
+        self.assertEqual(list(consumer), ["a"])
+
+    def test_unknown_policy(self):
+        """Tap: Test the unknown overflow policy"""
+        self.assertRaises(ValueError, TapConsumer, 10, 'unknown')
+
+
+class TestControllerTap(TestCase):
+    def run_command(self, background_reader):
+        with patch.dict(controller._C, {"background_reader": background_reader}):
+            ctrl = Controller(MagicMock(session_fd=None, hostname="host"))
+            consumers = [ctrl.tap(maxsize=0), ctrl.tap(maxsize=0)]
+            ctrl.spawn_session("{} -c \"{}\"".format(sys.executable, SCRIPT.format(LINES)))
+            try:
+                ctrl.expect("host#", timeout=10)
+            finally:
+                ctrl.disconnect()
+        for consumer in consumers:
+            consumer.close()
+            text = "".join(consumer)
+            self.assertTrue(text.endswith("line {}\r\nhost#".format(LINES - 1)))
+            self.assertEqual(consumer.dropped, 0)
+
+    def test_tap(self):
+        """Tap: Test the session stream received by all the consumers"""
+        self.run_command(background_reader=False)
+
+    def test_tap_reader(self):
+        """Tap: Test the session stream received by all the consumers with the background reader"""
+        self.run_command(background_reader=True)
+
+    def test_connection_tap(self):
+        """Tap: Test the connection consumer attached to all the chains"""
+        conn = Connection("test", [["telnet://host1"], ["telnet://host2"]], log_session=False,
+                          log_level=logging.ERROR)
+        consumer = conn.tap(maxsize=10)
+        for chain in conn.connection_chains:
+            chain.ctrl._tap.write("chunk")
+        consumer.close()
+        self.assertEqual(list(consumer), ["chunk", "chunk"])